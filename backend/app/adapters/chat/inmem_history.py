@@ -1,14 +1,23 @@
-from typing import List, Dict
-from app.domain.ports import ChatHistoryPort
+from typing import List, Dict, Optional
+from app.domain.ports import ChatHistoryPort, ConversationSummary, SummaryStorePort
 import threading
 
 class InMemChatHistory(ChatHistoryPort):
     _data: Dict[str, List[str]] = {}
     _lock = threading.Lock()
 
-    def get(self, chat_id: str) -> List[str]:
+    def get(self, chat_id: str, limit: int | None = None) -> List[str]:
         with self._lock:
-            return list(self._data.get(chat_id, []))
+            turns = self._data.get(chat_id, [])
+            return list(turns[-limit:] if limit else turns)
+
+    def get_range(self, chat_id: str, start: int, stop: int) -> List[str]:
+        with self._lock:
+            return list(self._data.get(chat_id, [])[start:stop])
+
+    def count(self, chat_id: str) -> int:
+        with self._lock:
+            return len(self._data.get(chat_id, []))
 
     def append(self, chat_id: str, q: str, a: str) -> None:
         with self._lock:
@@ -27,3 +36,19 @@ class InMemChatHistory(ChatHistoryPort):
         """Return all active chat IDs."""
         with self._lock:
             return list(self._data.keys())
+
+
+class InMemSummaryStore(SummaryStorePort):
+    _data: Dict[str, ConversationSummary] = {}
+
+    async def get(self, chat_id: str) -> Optional[ConversationSummary]:
+        return self._data.get(chat_id)
+
+    async def save(self, chat_id: str, summary: ConversationSummary) -> None:
+        self._data[chat_id] = summary
+
+    async def reset(self, chat_id: str) -> None:
+        self._data.pop(chat_id, None)
+
+    async def reset_all(self) -> None:
+        self._data.clear()
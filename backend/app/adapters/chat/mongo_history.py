@@ -1,106 +1,305 @@
-from typing import List
-import pymongo
-from app.domain.ports import ChatHistoryPort
+import base64
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from app.adapters.chat.write_behind import Entry, WriteBehindBuffer
 from app.core.config import settings
+from app.domain.ports import AsyncChatHistoryPort
+from app.db.database import db_manager
 from datetime import datetime
-import threading
-
-class MongoChatHistory(ChatHistoryPort):
-    _client = None
-    _db = None
-    _lock = threading.Lock()
-    
-    def __init__(self, collection_name: str = "chat_history"):
+
+class MongoChatHistory(AsyncChatHistoryPort):
+    """
+    Chat history stored in MongoDB through the shared motor client owned by db_manager,
+    so history reads/writes are awaited on the event loop instead of holding a
+    threadpool worker, and the process keeps a single Mongo connection pool.
+
+    Besides one document per message in `chat_history`, a small per-chat document in
+    `chat_history_meta` (last activity, turn count) is kept up to date on append so
+    chats can be listed page by page without scanning the message collection.
+
+    With write_behind=True, append() only queues the turn; a background task bulk-writes
+    queued turns in batches and get() merges still-queued messages, so the caller sees
+    its own writes while the chat response skips the Mongo round-trip.
+    """
+
+    def __init__(self, collection_name: str = "chat_history", write_behind: bool = settings.CHAT_HISTORY_WRITE_BEHIND):
         self.collection_name = collection_name
-        self._init_connection()
-    
-    def _init_connection(self):
-        """Initialize MongoDB connection using pymongo (sync)"""
-        with self._lock:
-            if MongoChatHistory._client is None:
-                try:
-                    MongoChatHistory._client = pymongo.MongoClient(
-                        settings.MONGODB_URL,
-                        serverSelectionTimeoutMS=5000,  # 5 second timeout
-                        connectTimeoutMS=5000,
-                        socketTimeoutMS=5000
-                    )
-                    MongoChatHistory._db = MongoChatHistory._client[settings.MONGODB_DB_NAME]
-                    # Test connection
-                    MongoChatHistory._client.admin.command('ping')
-                    print(f"✅ Connected to MongoDB Atlas: {settings.MONGODB_DB_NAME}")
-                except Exception as e:
-                    print(f"❌ Failed to connect to MongoDB Atlas: {e}")
-                    # Fallback to empty implementation
-                    MongoChatHistory._client = None
-                    MongoChatHistory._db = None
-    
+        self.meta_collection_name = f"{collection_name}_meta"
+        self._buffer: Optional[WriteBehindBuffer] = None
+        if write_behind:
+            self._buffer = WriteBehindBuffer(
+                self._write_batch,
+                max_batch=settings.CHAT_HISTORY_FLUSH_BATCH,
+                flush_interval=settings.CHAT_HISTORY_FLUSH_INTERVAL_MS / 1000,
+                max_queue=settings.CHAT_HISTORY_QUEUE_MAX,
+            )
+
     def _get_collection(self):
-        """Get the chat history collection"""
-        if self._db is not None:
-            return self._db[self.collection_name]
+        """Get the chat history collection (None until db_manager has connected)"""
+        if db_manager.mongodb_db is not None:
+            return db_manager.mongodb_db[self.collection_name]
+        return None
+
+    def _get_meta_collection(self):
+        if db_manager.mongodb_db is not None:
+            return db_manager.mongodb_db[self.meta_collection_name]
         return None
-    
-    def get(self, chat_id: str) -> List[str]:
-        """Get chat history for a given chat_id"""
+
+    async def ensure_indexes(self) -> None:
+        """Create the indexes the queries below rely on (idempotent; called at startup)."""
+        collection = self._get_collection()
+        meta = self._get_meta_collection()
+        if collection is None or meta is None:
+            return
+
+        # get(): equality on chat_id, sort on (timestamp, _id)
+        await collection.create_index(
+            [("chat_id", ASCENDING), ("timestamp", ASCENDING), ("_id", ASCENDING)],
+            name="chat_id_timestamp",
+        )
+        await meta.create_index([("chat_id", ASCENDING)], name="chat_id", unique=True)
+        # list_chats(): keyset pagination, most recently active first
+        await meta.create_index(
+            [("last_activity", DESCENDING), ("chat_id", DESCENDING)],
+            name="last_activity_chat_id",
+        )
+
+        if await meta.estimated_document_count() == 0 and await collection.estimated_document_count() > 0:
+            await self._backfill_meta()
+
+    async def _backfill_meta(self) -> None:
+        """One-off aggregation for chats written before the meta collection existed."""
+        print(f"🔧 Backfilling {self.meta_collection_name} from {self.collection_name}...")
+        pipeline = [
+            {"$group": {
+                "_id": "$chat_id",
+                "last_activity": {"$max": "$timestamp"},
+                "created_at": {"$min": "$timestamp"},
+                "turns": {"$sum": {"$cond": [{"$eq": ["$type", "question"]}, 1, 0]}},
+            }},
+            {"$project": {"_id": 0, "chat_id": "$_id", "last_activity": 1, "created_at": 1, "turns": 1}},
+            {"$merge": {"into": self.meta_collection_name, "on": "chat_id", "whenMatched": "replace"}},
+        ]
+        await self._get_collection().aggregate(pipeline).to_list(length=None)
+
+    async def get(self, chat_id: str, limit: int | None = None) -> List[str]:
+        """Get chat history for a given chat_id, optionally only the newest `limit` messages"""
         try:
             collection = self._get_collection()
             if collection is None:
                 return []
-            
-            # Find chat history for this chat_id, sorted by timestamp
+
+            # Newest first so the limit is applied by Mongo, then flipped back to chronological.
+            # Mongo dates only keep milliseconds, so _id (monotonic per client) breaks ties
+            # between the question and answer of the same turn.
             cursor = collection.find(
-                {"chat_id": chat_id}, 
-                {"_id": 0, "message": 1, "timestamp": 1}
-            ).sort("timestamp", 1)
-            
-            messages = [doc["message"] for doc in cursor]
-            return messages
-            
+                {"chat_id": chat_id},
+                {"_id": 1, "message": 1}
+            ).sort([("timestamp", -1), ("_id", -1)])
+            if limit:
+                cursor = cursor.limit(limit)
+
+            docs = [doc async for doc in cursor]
+            docs.reverse()
+
+            if self._buffer is not None:
+                # Read-your-writes: queued turns are newer than anything stored. A batch
+                # being flushed right now can already be in `docs`, hence the _id check.
+                stored = {doc["_id"] for doc in docs}
+                docs += [doc for doc in self._buffer.pending(chat_id) if doc["_id"] not in stored]
+                if limit:
+                    docs = docs[-limit:]
+
+            return [doc["message"] for doc in docs]
+
         except Exception as e:
             print(f"Error getting chat history: {e}")
             return []
-    
-    def append(self, chat_id: str, question: str, answer: str):
+
+    async def _unflushed(self, collection, chat_id: str) -> List[dict]:
+        """Queued messages of chat_id that are not stored yet, oldest first."""
+        pending = self._buffer.pending(chat_id) if self._buffer is not None else []
+        if not pending:
+            return []
+        stored = set(await collection.distinct("_id", {"_id": {"$in": [doc["_id"] for doc in pending]}}))
+        return [doc for doc in pending if doc["_id"] not in stored]
+
+    async def get_range(self, chat_id: str, start: int, stop: int) -> List[str]:
+        """Messages [start:stop] of a chat in chronological order (skip/limit on the chat_id index)"""
+        collection = self._get_collection()
+        if collection is None or stop <= start:
+            return []
+
+        docs = await collection.find(
+            {"chat_id": chat_id}, {"_id": 1, "message": 1}
+        ).sort([("timestamp", 1), ("_id", 1)]).skip(start).limit(stop - start).to_list(length=stop - start)
+
+        if len(docs) < stop - start and self._buffer is not None:
+            # The range runs past what is stored: continue with queued messages
+            stored = await collection.count_documents({"chat_id": chat_id})
+            offset = max(start - stored, 0)
+            docs += (await self._unflushed(collection, chat_id))[offset:offset + stop - start - len(docs)]
+        return [doc["message"] for doc in docs]
+
+    async def count(self, chat_id: str) -> int:
+        """Number of messages in a chat, queued ones included"""
+        collection = self._get_collection()
+        if collection is None:
+            return 0
+        # Counted before the queue: a batch landing in between is then missed, never counted twice
+        stored = await collection.count_documents({"chat_id": chat_id})
+        return stored + len(await self._unflushed(collection, chat_id))
+
+    async def append(self, chat_id: str, question: str, answer: str) -> None:
         """Add a question-answer pair to chat history"""
         try:
             collection = self._get_collection()
             if collection is None:
                 return
-            
-            # Store the question-answer pair
+
+            now = datetime.utcnow()
+            # Store the question-answer pair. _ids are assigned here so queued
+            # documents can be matched against what has already been flushed.
             documents = [
                 {
+                    "_id": ObjectId(),
                     "chat_id": chat_id,
                     "message": f"User: {question}",
-                    "timestamp": datetime.utcnow(),
+                    "timestamp": now,
                     "type": "question"
                 },
                 {
+                    "_id": ObjectId(),
                     "chat_id": chat_id,
                     "message": f"Assistant: {answer}",
-                    "timestamp": datetime.utcnow(),
+                    "timestamp": now,
                     "type": "answer"
                 }
             ]
-            
-            collection.insert_many(documents)
-            print(f"✅ Chat history saved to Atlas for chat_id: {chat_id}")
-            
+
+            if self._buffer is not None:
+                await self._buffer.put(chat_id, documents)
+            else:
+                await self._write_batch([(chat_id, documents)])
+
         except Exception as e:
             print(f"Error saving chat history: {e}")
-    
-    def list_ids(self) -> List[str]:
-        """List all chat IDs"""
+
+    async def _write_batch(self, entries: List[Entry]) -> None:
+        """Bulk-insert the messages of several turns and update their chats' meta documents."""
+        collection = self._get_collection()
+        if collection is None:
+            return
+
+        documents = [doc for _, docs in entries for doc in docs]
         try:
-            collection = self._get_collection()
-            if collection is None:
+            await collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # A retried batch may already be partly stored; duplicates are fine, anything else is not
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+        turns = Counter(chat_id for chat_id, _ in entries)
+        last_activity = {chat_id: docs[-1]["timestamp"] for chat_id, docs in entries}
+        await self._get_meta_collection().bulk_write(
+            [self._meta_update(chat_id, last_activity[chat_id], n) for chat_id, n in turns.items()],
+            ordered=False,
+        )
+
+    async def flush(self) -> None:
+        """Write all queued turns now (no-op without write-behind)."""
+        if self._buffer is not None:
+            await self._buffer.flush()
+
+    async def close(self) -> None:
+        """Flush queued turns and stop the background writer (shutdown hook)."""
+        if self._buffer is not None:
+            await self._buffer.close()
+
+    @staticmethod
+    def _meta_update(chat_id: str, last_activity: datetime, turns: int) -> UpdateOne:
+        return UpdateOne(
+            {"chat_id": chat_id},
+            {
+                "$max": {"last_activity": last_activity},
+                "$inc": {"turns": turns},
+                "$setOnInsert": {"created_at": last_activity},
+            },
+            upsert=True,
+        )
+
+    async def reset(self, chat_id: str) -> None:
+        """Delete all messages of one chat"""
+        collection = self._get_collection()
+        if collection is None:
+            return
+        if self._buffer is not None:
+            await self._buffer.discard(chat_id)
+        await collection.delete_many({"chat_id": chat_id})
+        await self._get_meta_collection().delete_one({"chat_id": chat_id})
+
+    async def reset_all(self) -> None:
+        """Delete every stored chat"""
+        collection = self._get_collection()
+        if collection is None:
+            return
+        if self._buffer is not None:
+            await self._buffer.discard()
+        await collection.delete_many({})
+        await self._get_meta_collection().delete_many({})
+
+    async def list_chats(self, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of chats, most recently active first: ([{chat_id, last_activity, turns}], next_cursor).
+        next_cursor is None on the last page. Keyset pagination on (last_activity, chat_id),
+        so every page costs the same no matter how deep the client has paged.
+        """
+        meta = self._get_meta_collection()
+        if meta is None:
+            return [], None
+
+        query: Dict[str, Any] = {}
+        if cursor:
+            last_activity, chat_id = _decode_cursor(cursor)
+            query = {"$or": [
+                {"last_activity": {"$lt": last_activity}},
+                {"last_activity": last_activity, "chat_id": {"$lt": chat_id}},
+            ]}
+
+        docs = await meta.find(
+            query, {"_id": 0, "chat_id": 1, "last_activity": 1, "turns": 1}
+        ).sort([("last_activity", DESCENDING), ("chat_id", DESCENDING)]).limit(limit + 1).to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = _encode_cursor(docs[-1]["last_activity"], docs[-1]["chat_id"])
+        return docs, next_cursor
+
+    async def list_ids(self) -> List[str]:
+        """List all chat IDs (prefer list_chats for anything user-facing)"""
+        try:
+            meta = self._get_meta_collection()
+            if meta is None:
                 return []
-            
-            # Get distinct chat_ids
-            chat_ids = collection.distinct("chat_id")
-            return list(chat_ids)
-            
+            return [doc["chat_id"] async for doc in meta.find({}, {"_id": 0, "chat_id": 1})]
+
         except Exception as e:
             print(f"Error listing chat IDs: {e}")
-            return []
\ No newline at end of file
+            return []
+
+
+def _encode_cursor(last_activity: datetime, chat_id: str) -> str:
+    raw = f"{last_activity.isoformat()}|{chat_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        last_activity, chat_id = raw.split("|", 1)
+        return datetime.fromisoformat(last_activity), chat_id
+    except Exception:
+        raise ValueError("Invalid cursor")
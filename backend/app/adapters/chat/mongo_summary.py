@@ -0,0 +1,56 @@
+from typing import Optional
+from datetime import datetime
+from app.domain.ports import ConversationSummary, SummaryStorePort
+from app.db.database import db_manager
+
+class MongoSummaryStore(SummaryStorePort):
+    """One rolling-summary document per chat_id, on the shared motor client."""
+
+    def __init__(self, collection_name: str = "chat_summaries"):
+        self.collection_name = collection_name
+
+    def _get_collection(self):
+        if db_manager.mongodb_db is not None:
+            return db_manager.mongodb_db[self.collection_name]
+        return None
+
+    async def ensure_indexes(self) -> None:
+        collection = self._get_collection()
+        if collection is None:
+            return
+        await collection.create_index("chat_id", name="chat_id", unique=True)
+
+    async def get(self, chat_id: str) -> Optional[ConversationSummary]:
+        try:
+            collection = self._get_collection()
+            if collection is None:
+                return None
+            doc = await collection.find_one({"chat_id": chat_id}, {"_id": 0, "summary": 1, "covered": 1})
+            if doc is None:
+                return None
+            return ConversationSummary(text=doc["summary"], covered=doc["covered"])
+        except Exception as e:
+            print(f"Error getting chat summary: {e}")
+            return None
+
+    async def save(self, chat_id: str, summary: ConversationSummary) -> None:
+        collection = self._get_collection()
+        if collection is None:
+            return
+        await collection.update_one(
+            {"chat_id": chat_id},
+            {"$set": {"summary": summary.text, "covered": summary.covered, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+
+    async def reset(self, chat_id: str) -> None:
+        collection = self._get_collection()
+        if collection is None:
+            return
+        await collection.delete_one({"chat_id": chat_id})
+
+    async def reset_all(self) -> None:
+        collection = self._get_collection()
+        if collection is None:
+            return
+        await collection.delete_many({})
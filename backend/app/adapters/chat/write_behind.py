@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# One appended turn: the chat it belongs to and the documents to insert
+Entry = Tuple[str, List[dict]]
+
+FLUSH_ATTEMPTS = 3
+_STOP = object()  # queued by close() to end the worker loop
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-process queue of pending history writes, flushed in batches by a
+    background task when `max_batch` entries are queued or `flush_interval` seconds
+    have passed since the first one, whichever comes first.
+
+    Entries stay visible through pending(chat_id) until their batch is written, so a
+    reader merging them in gets read-your-writes semantics for the same process.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Entry]], Awaitable[None]],
+        max_batch: int = 200,
+        flush_interval: float = 0.2,
+        max_queue: int = 10000,
+    ):
+        self.flush_fn = flush_fn
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._max_queue = max_queue
+        self._pending: Dict[str, List[Entry]] = {}
+        self._worker: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closed = False
+
+    def _ensure_started(self) -> None:
+        # Created lazily so the queue/lock bind to the running event loop
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self._max_queue)
+            self._flush_lock = asyncio.Lock()
+            self._worker = asyncio.create_task(self._run())
+
+    async def put(self, chat_id: str, documents: List[dict]) -> None:
+        """Queue documents for writing; waits only if the queue is full (backpressure)."""
+        if self._closed:
+            raise RuntimeError("write-behind buffer is closed")
+        self._ensure_started()
+        entry: Entry = (chat_id, documents)
+        self._pending.setdefault(chat_id, []).append(entry)
+        await self._queue.put(entry)
+
+    def pending(self, chat_id: str) -> List[dict]:
+        """Documents for chat_id that are queued but not yet confirmed written, oldest first."""
+        return [doc for _, docs in self._pending.get(chat_id, []) for doc in docs]
+
+    async def discard(self, chat_id: Optional[str] = None) -> None:
+        """
+        Forget pending entries (used when a chat is reset); queued writes are skipped.
+        Returns once a batch already being written has finished, so the caller can
+        delete stored messages knowing nothing queued before this call lands after it.
+        """
+        if chat_id is None:
+            self._pending.clear()
+        else:
+            self._pending.pop(chat_id, None)
+        if self._flush_lock is not None:
+            async with self._flush_lock:
+                pass
+
+    async def flush(self) -> None:
+        """Write everything queued so far, now."""
+        if self._queue is None:
+            return
+        batch: List[Entry] = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+            if len(batch) >= self.max_batch:
+                await self._write(batch)
+                batch = []
+        if batch:
+            await self._write(batch)
+
+    async def close(self) -> None:
+        """Stop the worker once its current batch is written, then flush the rest (shutdown hook)."""
+        self._closed = True
+        if self._worker is None:
+            return
+        await self._queue.put(_STOP)
+        await self._worker
+        await self.flush()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    entry = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if entry is _STOP:
+                    stop = True
+                    break
+                batch.append(entry)
+            await self._write(batch)
+            if stop:
+                return
+
+    async def _write(self, batch: List[Entry]) -> None:
+        async with self._flush_lock:
+            # Skip entries whose chat was reset while they were queued (checked under the
+            # lock, as discard() may have run while this batch waited for the previous one)
+            live = [e for e in batch if any(e is p for p in self._pending.get(e[0], []))]
+            if not live:
+                return
+            try:
+                for attempt in range(1, FLUSH_ATTEMPTS + 1):
+                    try:
+                        await self.flush_fn(live)
+                        break
+                    except Exception as e:
+                        if attempt == FLUSH_ATTEMPTS:
+                            logger.error("Dropping %d chat history writes after flush failure: %s", len(live), e)
+                        else:
+                            await asyncio.sleep(0.1 * 2 ** attempt)
+            finally:
+                for entry in live:
+                    entries = self._pending.get(entry[0])
+                    if entries is None:
+                        continue
+                    entries[:] = [p for p in entries if p is not entry]
+                    if not entries:
+                        self._pending.pop(entry[0], None)
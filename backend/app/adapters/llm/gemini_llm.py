@@ -1,17 +1,23 @@
 # app/adapters/llm/gemini_llm.py
-from app.domain.ports import LLMPort
+from typing import AsyncIterator, Iterator
+from app.domain.ports import AsyncLLMPort
 from app.services.llm.gemini_client import get_client
-from app.core.config import settings
 
-class GeminiLLM(LLMPort):
+class GeminiLLM(AsyncLLMPort):
+    """
+    LLMPort over the shared Gemini client, which pools connections, caps concurrency
+    and applies the deadline/retry policy (see app/services/llm/gemini_client.py).
+    """
+
     def generate(self, prompt: str, model: str | None = None) -> str:
-        client = get_client()
-        model_name = model or settings.DEFAULT_MODEL
-        
-        # Create the generative model instance
-        model_instance = client.GenerativeModel(model_name)
-        
-        # Generate content using the model
-        response = model_instance.generate_content(prompt)
-        
-        return response.text if hasattr(response, 'text') else ""
+        return get_client().generate(prompt, model)
+
+    def stream(self, prompt: str, model: str | None = None) -> Iterator[str]:
+        """Yield answer text pieces as Gemini produces them."""
+        return get_client().stream(prompt, model)
+
+    async def agenerate(self, prompt: str, model: str | None = None) -> str:
+        return await get_client().agenerate(prompt, model)
+
+    def astream(self, prompt: str, model: str | None = None) -> AsyncIterator[str]:
+        return get_client().astream(prompt, model)
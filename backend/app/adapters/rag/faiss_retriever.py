@@ -1,12 +1,102 @@
-from typing import List
-from app.domain.ports import RetrieverPort
-from app.services.rag.vectorstore import similarity_search
+import asyncio
+import sys
+from typing import Dict, List
+from langchain_community.vectorstores import FAISS
+from app.domain.ports import AsyncRetrieverPort, RetrievedChunk
+from app.services.rag.vectorstore import (
+    asimilarity_search_with_score,
+    similarity_search_with_score,
+    similarity_search_many,
+    serving_index,
+    vs_holder,
+)
+from app.core.cache import LRUCache
 from app.core.config import settings
 
-class FaissRetriever(RetrieverPort):
+
+def _normalize(query: str) -> str:
+    # Tokenizers split on whitespace, so runs of it never change the result. Case is kept:
+    # cased embedding models (EMBED_MODEL is configurable) embed "Apple" and "apple" differently
+    return " ".join(query.split())
+
+def _sizeof(chunks: List[RetrievedChunk]) -> int:
+    return sum(sys.getsizeof(c.text) + sys.getsizeof(c.id) + 256 for c in chunks)
+
+
+class FaissRetriever(AsyncRetrieverPort):
     def __init__(self, k: int = settings.TOP_K):  # 👈 default from settings
         self.k = k
+        self.cache: LRUCache[List[RetrievedChunk]] = LRUCache(
+            max_entries=settings.RETRIEVAL_CACHE_MAX_ENTRIES,
+            max_bytes=settings.RETRIEVAL_CACHE_MAX_BYTES,
+            ttl_seconds=settings.RETRIEVAL_CACHE_TTL_SECONDS,
+            sizeof=_sizeof,
+        )
+        # A swapped-in index makes every cached result stale
+        vs_holder.on_change(lambda old, new: self.cache.clear())
 
     def topk(self, query: str, k: int | None = None) -> List[str]:
-        docs = similarity_search(query, k or self.k)
-        return [d.page_content for d in docs]
+        return [c.text for c in self.topk_chunks(query, k)]
+
+    def topk_chunks(self, query: str, k: int | None = None) -> List[RetrievedChunk]:
+        k = k or self.k
+        # One store per search: a swap in the middle must not mix two indexes' results
+        store, version = serving_index()
+        key = (_normalize(query), k, version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached)
+
+        chunks = self._search(query, k, store, version)
+        self.cache.put(key, chunks)
+        return list(chunks)
+
+    async def atopk_chunks(self, query: str, k: int | None = None) -> List[RetrievedChunk]:
+        """topk_chunks for coroutines: only the search itself occupies a CPU_WORKERS thread."""
+        k = k or self.k
+        store, version = vs_holder.current()
+        if store is None:
+            store, version = await asyncio.to_thread(serving_index)
+        key = (_normalize(query), k, version)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return list(cached)
+
+        chunks = await self._asearch(query, k, store, version)
+        self.cache.put(key, chunks)
+        return list(chunks)
+
+    def topk_many(self, queries: List[str], k: int | None = None) -> List[List[RetrievedChunk]]:
+        """topk_chunks for a batch: cache hits are served as usual, all misses are searched together."""
+        k = k or self.k
+        store, version = serving_index()
+        keys = [(_normalize(q), k, version) for q in queries]
+        results: List[List[RetrievedChunk] | None] = [self.cache.get(key) for key in keys]
+
+        misses: Dict[tuple, int] = {}  # one search per distinct normalized query
+        for i, key in enumerate(keys):
+            if results[i] is None and key not in misses:
+                misses[key] = i
+        if misses:
+            found = self._search_many([queries[i] for i in misses.values()], k, store, version)
+            for key, chunks in zip(misses, found):
+                self.cache.put(key, chunks)
+            by_key = dict(zip(misses, found))
+            results = [r if r is not None else by_key[key] for r, key in zip(results, keys)]
+        return [list(r) for r in results]
+
+    def _search(self, query: str, k: int, store: FAISS, version: str) -> List[RetrievedChunk]:
+        return _to_chunks(similarity_search_with_score(query, k, store))
+
+    async def _asearch(self, query: str, k: int, store: FAISS, version: str) -> List[RetrievedChunk]:
+        return _to_chunks(await asimilarity_search_with_score(query, k, store))
+
+    def _search_many(self, queries: List[str], k: int, store: FAISS, version: str) -> List[List[RetrievedChunk]]:
+        return [_to_chunks(results) for results in similarity_search_many(queries, k, store)]
+
+
+def _to_chunks(results) -> List[RetrievedChunk]:
+    return [
+        RetrievedChunk(id=str(d.id), text=d.page_content, metadata=dict(d.metadata), score=float(score))
+        for d, score in results
+    ]
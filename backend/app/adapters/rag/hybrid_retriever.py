@@ -0,0 +1,131 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from app.adapters.rag.faiss_retriever import FaissRetriever
+from app.domain.ports import RetrievedChunk
+from app.services.rag.bm25 import LexicalHit, get_bm25_index, is_decisive
+from app.services.rag.vectorstore import (
+    asimilarity_search_with_score,
+    similarity_search_with_score,
+    similarity_search_many,
+)
+from app.core import metrics
+from app.core.concurrency import run_cpu
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class HybridRetriever(FaissRetriever):
+    """
+    BM25 + dense retrieval fused with reciprocal rank fusion (RRF).
+
+    The lexical lookup runs first. When it is decisive (the best chunk contains every
+    query term and clearly beats the runner-up, as for "section 123" or a defined
+    term), its top-k is returned without the dense search, and without embedding the
+    query (QAService's semantic cache still embeds first-turn questions for its own
+    lookup, so there only the FAISS search is saved). Otherwise both
+    candidate lists are fused by rank, so scores from the two retrievers never need to
+    be on the same scale. Falls back to dense-only when no BM25 index matches the
+    loaded FAISS index. Chunk scores are RRF scores (higher is better), or BM25 scores
+    on the fast path.
+    """
+
+    def __init__(
+        self,
+        k: int = settings.TOP_K,
+        candidates: int = settings.HYBRID_CANDIDATES,
+        rrf_k: int = settings.HYBRID_RRF_K,
+        fast_path: bool = settings.LEXICAL_FAST_PATH,
+    ):
+        super().__init__(k)
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.fast_path = fast_path
+
+    def _lexical(self, query: str, n: int, version: str) -> Optional[Tuple[List[LexicalHit], bool]]:
+        """(top-n BM25 hits, whether they are decisive), or None without a matching BM25 index."""
+        bm25 = get_bm25_index(version)
+        if bm25 is None:
+            return None
+        with metrics.stage(metrics.LEXICAL):
+            hits = bm25.search(query, n)
+        return hits, self.fast_path and is_decisive(hits, len(bm25.query_terms(query)))
+
+    def _search(self, query: str, k: int, store: FAISS, version: str) -> List[RetrievedChunk]:
+        n = max(k, self.candidates)
+        lexical = self._lexical(query, n, version)
+        if lexical is None:
+            return super()._search(query, k, store, version)
+        hits, decisive = lexical
+        if decisive:
+            return self._load_chunks(store, [(hit.id, hit.score) for hit in hits], k)
+        return self._fuse(store, hits, similarity_search_with_score(query, n, store), k)
+
+    async def _asearch(self, query: str, k: int, store: FAISS, version: str) -> List[RetrievedChunk]:
+        n = max(k, self.candidates)
+        lexical = await run_cpu(self._lexical, query, n, version)
+        if lexical is None:
+            return await super()._asearch(query, k, store, version)
+        hits, decisive = lexical
+        if decisive:
+            return await run_cpu(self._load_chunks, store, [(hit.id, hit.score) for hit in hits], k)
+        return await run_cpu(self._fuse, store, hits, await asimilarity_search_with_score(query, n, store), k)
+
+    def _search_many(self, queries: List[str], k: int, store: FAISS, version: str) -> List[List[RetrievedChunk]]:
+        bm25 = get_bm25_index(version)
+        if bm25 is None:
+            return super()._search_many(queries, k, store, version)
+
+        n = max(k, self.candidates)
+        results: List[Optional[List[RetrievedChunk]]] = [None] * len(queries)
+        with metrics.stage(metrics.LEXICAL):
+            lexical = [bm25.search(q, n) for q in queries]
+        dense_needed = []
+        for i, (query, hits) in enumerate(zip(queries, lexical)):
+            if self.fast_path and is_decisive(hits, len(bm25.query_terms(query))):
+                results[i] = self._load_chunks(store, [(hit.id, hit.score) for hit in hits], k)
+            else:
+                dense_needed.append(i)
+
+        # Only the non-decisive queries are embedded, in one batch
+        dense = similarity_search_many([queries[i] for i in dense_needed], n, store)
+        for i, dense_hits in zip(dense_needed, dense):
+            results[i] = self._fuse(store, lexical[i], dense_hits, k)
+        return results
+
+    def _fuse(
+        self, store: FAISS, lexical: List[LexicalHit], dense: List[Tuple[Document, float]], k: int
+    ) -> List[RetrievedChunk]:
+        fused: Dict[str, float] = {}
+        for rank, hit in enumerate(lexical):
+            fused[hit.id] = fused.get(hit.id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        for rank, (doc, _) in enumerate(dense):
+            fused[str(doc.id)] = fused.get(str(doc.id), 0.0) + 1.0 / (self.rrf_k + rank + 1)
+
+        texts = {str(doc.id): doc for doc, _ in dense}
+        ranked = sorted(fused, key=fused.get, reverse=True)
+        return self._load_chunks(store, [(chunk_id, fused[chunk_id]) for chunk_id in ranked], k, texts)
+
+    @staticmethod
+    def _load_chunks(
+        store: FAISS, ranked: List[Tuple[str, float]], k: int, loaded: Optional[Dict[str, Document]] = None
+    ) -> List[RetrievedChunk]:
+        """
+        The first k of (chunk id, score) whose chunk exists, read from the docstore of
+        the store that was searched unless already in `loaded`. Ids the docstore does
+        not know (a BM25 file out of step with the index) are skipped rather than
+        failing the whole query.
+        """
+        docstore = store.docstore
+        chunks: List[RetrievedChunk] = []
+        for chunk_id, score in ranked:
+            if len(chunks) == k:
+                break
+            doc = (loaded or {}).get(chunk_id) or docstore.search(chunk_id)
+            if not isinstance(doc, Document):  # the docstore's "ID ... not found." string
+                logger.warning("Chunk %s from the BM25 index is not in the docstore; skipping it", chunk_id)
+                continue
+            chunks.append(RetrievedChunk(id=chunk_id, text=doc.page_content, metadata=dict(doc.metadata), score=score))
+        return chunks
@@ -0,0 +1,55 @@
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.domain.ports import RetrievedChunk, RetrieverPort
+from app.services.rag.retrieval_ipc import RetrievalClient, decode_chunks, decode_vectors
+
+
+class RemoteRetriever(RetrieverPort):
+    """
+    RetrieverPort over the local retrieval server (app/services/rag/retrieval_server.py),
+    which holds the embedding model and FAISS index once per host instead of once per
+    API worker.
+
+    It also embeds through the server (embed_query / vector / embed_documents), so the
+    semantic cache and the context packer never load a model in this process either.
+    Results are cached by the server, not here.
+    """
+
+    io_bound = True  # calls wait on a socket: run them in asyncio's I/O threads, not the CPU pool
+
+    def __init__(self, k: int = settings.TOP_K, client: Optional[RetrievalClient] = None):
+        self.k = k
+        self.client = client or RetrievalClient()
+
+    def topk(self, query: str, k: int | None = None) -> List[str]:
+        return [c.text for c in self.topk_chunks(query, k)]
+
+    def topk_chunks(self, query: str, k: int | None = None) -> List[RetrievedChunk]:
+        return decode_chunks(self.client.call("topk_chunks", query=query, k=k or self.k))
+
+    def topk_many(self, queries: List[str], k: int | None = None) -> List[List[RetrievedChunk]]:
+        if not queries:
+            return []
+        return [decode_chunks(items) for items in self.client.call("topk_many", queries=queries, k=k or self.k)]
+
+    def vector(self, text: str) -> np.ndarray:
+        """Query embedding (memoized and micro-batched on the server)."""
+        return decode_vectors(self.client.call("embed", texts=[text], query=True))[0]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vector(text).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return decode_vectors(self.client.call("embed", texts=texts, query=False)).tolist()
+
+    def index_version(self) -> Optional[str]:
+        """
+        Version of the server's index as of the last response, None before the first
+        one. Never calls the server, so it is safe on the event loop; warm-up fills it.
+        """
+        return self.client.index_version
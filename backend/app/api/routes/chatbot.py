@@ -1,58 +1,177 @@
-from fastapi import APIRouter, HTTPException
-from app.schemas.chatbot import ChatRequest, ChatResponse
+import json
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from app.schemas.chatbot import BatchChatRequest, BatchChatResponse, BatchChatResult, ChatRequest, ChatResponse
 from app.adapters.chat.mongo_history import MongoChatHistory
+from app.adapters.chat.mongo_summary import MongoSummaryStore
 from app.adapters.llm.gemini_llm import GeminiLLM
 from app.adapters.rag.faiss_retriever import FaissRetriever
+from app.adapters.rag.hybrid_retriever import HybridRetriever
+from app.adapters.rag.remote_retriever import RemoteRetriever
+from app.services.rag.context_packer import ContextPacker
 from app.services.rag.qa_service import QAService
+from app.services.rag.embeddings import get_embedding_service
+from app.services.rag.semantic_cache import SemanticCache
+from app.services.rag.summarizer import ConversationSummarizer
 from app.services.rag.vectorstore import build_or_load_index
 from app.core.config import settings
 
 router = APIRouter(prefix="/chatbot", tags=["Chatbot"])
 
+llm = GeminiLLM()
+history = MongoChatHistory()
+summaries = MongoSummaryStore()
+summarizer = ConversationSummarizer(llm, history, summaries) if settings.SUMMARY_ENABLED else None
+
+# With RETRIEVER=remote the model and index live in the retrieval server, which also
+# embeds for the semantic cache and the context packer
+remote = RemoteRetriever() if settings.RETRIEVER == "remote" else None
+if remote is not None:
+    retriever = remote
+else:
+    retriever = HybridRetriever() if settings.RETRIEVER == "hybrid" else FaissRetriever()
+
+semantic_cache = None
+if settings.SEMANTIC_CACHE_ENABLED:
+    if remote is not None:
+        semantic_cache = SemanticCache(embed=remote.embed_query, version=remote.index_version, io_bound=True)
+    else:
+        semantic_cache = SemanticCache()
+
 qa = QAService(
-    retriever=FaissRetriever(),
-    llm=GeminiLLM(),
-    history=MongoChatHistory(),
+    retriever=retriever,
+    llm=llm,
+    history=history,
+    cache=semantic_cache,
+    summaries=summaries,
+    summarizer=summarizer,
+    packer=ContextPacker(embedder=remote) if remote is not None else None,
 )
 
 @router.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+async def chat(req: ChatRequest):
     try:
-        result = qa.answer(req.chat_id, req.query)
+        result = await qa.answer(req.chat_id, req.query)
         return ChatResponse(
             chat_id=result["chat_id"],
             answer=result["answer"],
             retrieved_chunks=result.get("retrieved_chunks", []),
+            cached=result.get("cached", False),
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Same as /chat but streamed as Server-Sent Events:
+    `chunks` (retrieved context metadata) -> `token`* -> `done`, or `error` on failure.
+    """
+    async def event_source():
+        try:
+            async for item in qa.answer_stream(req.chat_id, req.query):
+                yield _sse(item["event"], item["data"])
+        except Exception as e:
+            yield _sse("error", {"chat_id": req.chat_id, "detail": str(e)})
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _batch_result(index: int, result: dict) -> BatchChatResult:
+    return BatchChatResult(index=index, **result)
+
+
+@router.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(req: BatchChatRequest):
+    """
+    Answer many questions in one request. Retrieval for the whole batch is one
+    embedding pass and one index search; LLM calls run concurrently (BATCH_LLM_CONCURRENCY).
+    Results come back in request order, or with `stream: true` as NDJSON lines
+    (one result with its `index` per line) as soon as each one completes.
+    """
+    if len(req.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_MAX_ITEMS} items per batch")
+    items = [(item.chat_id, item.query) for item in req.items]
+
+    if req.stream:
+        async def lines():
+            async for index, result in qa.answer_many_stream(items):
+                yield _batch_result(index, result).model_dump_json() + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+    try:
+        results = await qa.answer_many(items)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return BatchChatResponse(results=[_batch_result(i, r) for i, r in enumerate(results)])
+
 #  Debug endpoint to view chunks
 @router.get("/debug/chunks")
 def debug_chunks(limit: int = 5):
     try:
         vs = build_or_load_index()
-        docs = list(vs.docstore._dict.values())
-        sample = [d.page_content[:500] for d in docs[:limit]]
+        total = vs.index.ntotal
+        sample = [vs.docstore.search(vs.index_to_docstore_id[i]).page_content[:500] for i in range(min(limit, total))]
         return {
-            "total_chunks": len(docs),
+            "total_chunks": total,
             "sample": sample,
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/cache/stats")
+async def cache_stats():
+    """Semantic cache hit/miss counters, for tuning SEMANTIC_CACHE_THRESHOLD."""
+    retrieval_cache = getattr(qa.retriever, "cache", None)
+    stats = {
+        "retrieval": retrieval_cache.stats() if retrieval_cache is not None else None,
+        "embeddings": get_embedding_service().cache.stats(),
+    }
+    if qa.cache is None:
+        return {"enabled": False, **stats}
+    return {"enabled": True, **await qa.cache.stats(), **stats}
+
+@router.delete("/cache")
+async def clear_cache():
+    if qa.cache is None:
+        return {"ok": True, "deleted": 0}
+    deleted = await qa.cache.invalidate()
+    return {"ok": True, "deleted": deleted, "message": "Semantic cache cleared"}
+
+
 @router.get("/chats")
-def list_chats():
-    ids = qa.history.list_ids()
-    return {"chat_ids": ids, "count": len(ids)}
+async def list_chats(limit: int = Query(50, ge=1, le=500), cursor: Optional[str] = None):
+    """Chats ordered by last activity; pass `next_cursor` back as `cursor` for the next page."""
+    try:
+        chats, next_cursor = await qa.history.list_chats(limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "chats": chats,
+        "chat_ids": [c["chat_id"] for c in chats],
+        "count": len(chats),
+        "next_cursor": next_cursor,
+    }
 
 @router.delete("/chat/{chat_id}")
-def clear_chat(chat_id: str):
-    qa.history.reset(chat_id)
+async def clear_chat(chat_id: str):
+    await qa.history.reset(chat_id)
+    await summaries.reset(chat_id)
     return {"ok": True, "chat_id": chat_id, "message": "Chat cleared"}
 
 @router.delete("/chats")
-def clear_all_chats():
-    qa.history.reset_all()
+async def clear_all_chats():
+    await qa.history.reset_all()
+    await summaries.reset_all()
     return {"ok": True, "message": "All chats cleared"}
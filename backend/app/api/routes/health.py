@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, status
 from datetime import datetime
 from app.db.database import db_manager
+from app.services.rag.warmup import warmup_state
 import asyncio
 
 router = APIRouter()
@@ -16,6 +17,21 @@ async def health_check():
     }
 
 
+@router.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the embedding model and index are loaded and warmed up"""
+    if not warmup_state.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=warmup_state.as_dict()
+        )
+    return {
+        "status": "ready",
+        "warmup": warmup_state.as_dict(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
 @router.get("/health/detailed")
 async def detailed_health_check():
     """Detailed health check including database connections"""
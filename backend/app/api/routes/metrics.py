@@ -0,0 +1,61 @@
+import os
+from typing import Iterator
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from app.api.routes.chatbot import qa
+from app.core.config import settings
+from app.services.rag.embeddings import get_embedding_service
+from app.services.rag.vectorstore import _index_files, vs_holder
+
+router = APIRouter()
+
+
+class RagCollector:
+    """
+    Cache and index gauges read at scrape time from the counters the caches and the
+    vector store already keep, so the request path pays nothing for them.
+    Values are per worker process.
+    """
+
+    def collect(self) -> Iterator[Metric]:
+        requests = CounterMetricFamily("rag_cache_requests", "Cache lookups by cache and result", labels=["cache", "result"])
+        entries = GaugeMetricFamily("rag_cache_entries", "Entries held by in-process caches", labels=["cache"])
+        nbytes = GaugeMetricFamily("rag_cache_bytes", "Approximate bytes held by in-process caches", labels=["cache"])
+
+        lru_caches = {"embeddings": get_embedding_service().cache}
+        retrieval_cache = getattr(qa.retriever, "cache", None)
+        if retrieval_cache is not None:
+            lru_caches["retrieval"] = retrieval_cache
+        for name, cache in lru_caches.items():
+            stats = cache.stats()
+            requests.add_metric([name, "hit"], stats["hits"])
+            requests.add_metric([name, "miss"], stats["misses"])
+            entries.add_metric([name], stats["entries"])
+            nbytes.add_metric([name], stats["bytes"])
+        if qa.cache is not None:  # semantic answer cache: this worker's lookups
+            requests.add_metric(["semantic", "hit"], qa.cache.hits)
+            requests.add_metric(["semantic", "miss"], qa.cache.misses)
+        yield requests
+        yield entries
+        yield nbytes
+
+        store = vs_holder.store
+        if store is None:  # not loaded yet (warm-up still running)
+            return
+        yield GaugeMetricFamily("rag_index_vectors", "Vectors in the loaded FAISS index", value=store.index.ntotal)
+        _, index_file, _ = _index_files()
+        if index_file.exists():
+            yield GaugeMetricFamily("rag_index_bytes", "Size of index.faiss", value=os.path.getsize(index_file))
+        info = GaugeMetricFamily("rag_index_info", "Loaded index version and type", labels=["version", "type"])
+        info.add_metric([vs_holder.version or "", settings.INDEX_TYPE], 1)
+        yield info
+
+
+REGISTRY.register(RagCollector())
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text exposition of the stage histograms, caches and index."""
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,173 @@
+import asyncio
+import functools
+import inspect
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+_cpu_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor_lock = threading.Lock()
+
+
+async def call_maybe_async(fn: Callable[..., Any], *args: Any) -> Any:
+    """Await fn(*args) if it is a coroutine function, otherwise run it in a worker thread."""
+    if inspect.iscoroutinefunction(fn):
+        return await fn(*args)
+    return await asyncio.to_thread(fn, *args)
+
+
+def cpu_executor() -> ThreadPoolExecutor:
+    """
+    The process-wide pool for CPU-bound request work, CPU_WORKERS threads.
+
+    Embedding and FAISS search release the GIL, so threads give real parallelism
+    without a second copy of the model and index per process. Keeping this work off
+    asyncio's default executor means it never waits behind threads blocked on I/O
+    (sync LLM calls, sync history stores), and sizing it to the core count stops
+    hundreds of in-flight chats from oversubscribing the CPU.
+    """
+    global _cpu_executor
+    if _cpu_executor is None:
+        with _cpu_executor_lock:
+            if _cpu_executor is None:
+                workers = settings.CPU_WORKERS or os.cpu_count() or 1
+                _cpu_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu")
+    return _cpu_executor
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a CPU-bound fn(*args, **kwargs) on cpu_executor() and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def run_blocking(fn: Callable[..., T], *args: Any, io_bound: bool = False) -> T:
+    """
+    run_cpu(fn, *args), or asyncio.to_thread() when fn mostly waits on I/O (e.g. a
+    call to the retrieval server) and would only keep a CPU worker idle meanwhile.
+    """
+    if io_bound:
+        return await asyncio.to_thread(fn, *args)
+    return await run_cpu(fn, *args)
+
+
+def shutdown_cpu_executor() -> None:
+    global _cpu_executor
+    with _cpu_executor_lock:
+        executor, _cpu_executor = _cpu_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ConcurrencyLimit:
+    """
+    Counting semaphore shared by threads and coroutines (on any event loop).
+
+    asyncio.Semaphore only works within one loop and threading.Semaphore blocks the
+    loop, but a cap like "at most N LLM calls in flight" has to hold for both kinds of
+    callers. Waiters are served first come, first served; async waiters do not tie up
+    a thread while they wait.
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("limit must be >= 1")
+        self.limit = limit
+        self._free = limit
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[Optional[asyncio.AbstractEventLoop], Any]] = deque()
+
+    @property
+    def in_use(self) -> int:
+        return self.limit - self._free
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now."""
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return True
+            return False
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Blocking acquire for threads."""
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return True
+            event = threading.Event()
+            waiter = (None, event)
+            self._waiters.append(waiter)
+        if event.wait(timeout):
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(waiter)
+                return False
+            except ValueError:
+                pass  # granted between the timeout and taking the lock
+        return True
+
+    async def acquire_async(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free > 0 and not self._waiters:
+                self._free -= 1
+                return
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                    return_slot = False
+                except ValueError:
+                    # Already dequeued: a cancelled future is handled by _grant, but a
+                    # slot granted just before the cancellation landed is ours to return
+                    return_slot = not future.cancelled()
+            if return_slot:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            if not self._waiters:
+                if self._free >= self.limit:
+                    raise ValueError("ConcurrencyLimit released too many times")
+                self._free += 1
+                return
+            loop, waiter = self._waiters.popleft()
+        # The slot passes straight to the next waiter; _free is unchanged
+        if loop is None:
+            waiter.set()
+        else:
+            loop.call_soon_threadsafe(self._grant, waiter)
+
+    def _grant(self, future: "asyncio.Future[None]") -> None:
+        if future.done():  # cancelled after it was dequeued
+            self.release()
+        else:
+            future.set_result(None)
+
+    def __enter__(self) -> "ConcurrencyLimit":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.release()
+
+    async def __aenter__(self) -> "ConcurrencyLimit":
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.release()
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -16,10 +18,25 @@ class Settings(BaseSettings):
     #Gemini API Key
     GEMINI_API_KEY: str
     DEFAULT_MODEL: str = "gemini-1.5-flash"
+    GEMINI_BASE_URL: Optional[str] = None  # e.g. http://127.0.0.1:8090 for the fake server (fake_gemini.py)
+    LLM_MAX_CONCURRENCY: int = 16  # Gemini calls in flight per process
+    LLM_TIMEOUT_SECONDS: float = 30.0  # deadline per call, retries included
+    LLM_MAX_RETRIES: int = 3  # on 429, 5xx and connection errors
+    LLM_RETRY_BASE_SECONDS: float = 0.5  # full-jitter exponential backoff: uniform(0, base * 2^n)
+    LLM_RETRY_MAX_SECONDS: float = 8.0
+    LLM_HEDGE_AFTER_SECONDS: float = 0.0  # send a second request when the first is this slow, 0 = off
 
     # MongoDB
     MONGODB_URL: str = "mongodb://localhost:27017"
     MONGODB_DB_NAME: str = "legalaid"
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 0
+    MONGODB_TIMEOUT_MS: int = 5000
+    # Write-behind for chat history: queue appends and bulk-write them off the request path
+    CHAT_HISTORY_WRITE_BEHIND: bool = False
+    CHAT_HISTORY_FLUSH_BATCH: int = 200  # turns per bulk write
+    CHAT_HISTORY_FLUSH_INTERVAL_MS: int = 200
+    CHAT_HISTORY_QUEUE_MAX: int = 10000
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379"
@@ -27,11 +44,83 @@ class Settings(BaseSettings):
 
     # RAG
     PDF_PATH: str = "data/motor_traffic_law.pdf"
+    SOURCES_DIR: str = "data"  # every PDF under here is indexed (python -m app.services.rag.ingest)
     INDEX_DIR: str = "storage/faiss_index"
     EMBED_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 100
     TOP_K: int = 3
+    RETRIEVER: str = "faiss"  # faiss (dense only) | hybrid (BM25 + dense, RRF fusion) | remote (retrieval server)
+    HYBRID_CANDIDATES: int = 20  # candidates per retriever before fusion
+    HYBRID_RRF_K: int = 60
+    # Skip the dense search when the BM25 match is decisive. The query embedding is only saved
+    # when the semantic cache does not embed it anyway (follow-up turns, or the cache off).
+    LEXICAL_FAST_PATH: bool = True
+    LEXICAL_DECISIVE_RATIO: float = 1.5  # best BM25 score must beat the runner-up by this factor
+    EMBED_CACHE_MAX_ENTRIES: int = 10000  # memoized query embeddings per worker
+    EMBED_CACHE_DTYPE: str = "float16"  # float16 halves cache memory; vectors are returned as float32
+    # Micro-batching of concurrent query embeddings (embed_batcher.py)
+    EMBED_BATCH_MAX_SIZE: int = 32  # queries per forward pass, 1 = embed each query on its own
+    EMBED_BATCH_WINDOW_MS: float = 2.0  # longest a query waits for others to join its batch
+    EMBED_BACKEND: str = "torch"  # torch | onnx (ONNX Runtime, no torch needed at serving time)
+    ONNX_MODEL_DIR: str = "storage/onnx"  # exported models, one subdirectory per EMBED_MODEL
+    ONNX_QUANTIZE: bool = False  # use dynamic int8 weight quantization
+    ONNX_INTRA_OP_THREADS: int = 0  # 0 = onnxruntime default (one per physical core)
+    # FAISS index type: flat | hnsw | ivf_flat | ivf_pq | sq_fp16 | sq_int8 (changing it triggers a rebuild)
+    INDEX_TYPE: str = "flat"
+    INDEX_NLIST: int = 256  # IVF lists (clamped for small corpora)
+    INDEX_NPROBE: int = 16  # IVF lists scanned per query
+    INDEX_PQ_M: int = 48  # PQ sub-quantizers, must divide the embedding dimension (384)
+    INDEX_PQ_NBITS: int = 8
+    INDEX_HNSW_M: int = 32
+    INDEX_HNSW_EF_CONSTRUCTION: int = 200
+    INDEX_EF_SEARCH: int = 64  # HNSW candidate list size per query
+    INDEX_TRAIN_SIZE: int = 20000  # vectors buffered to train IVF/PQ/SQ8 before anything is added
+    INDEX_MMAP: bool = True  # memory-map index.faiss read-only so workers share one copy in the page cache
+    WARMUP_ENABLED: bool = True  # load model + index at startup; /api/v1/health/ready is 503 until done
+    WARMUP_RETRY_MAX_SECONDS: float = 60.0  # a failed warm-up is retried, backing off from 1s up to this
+    # Index build (ingest): pages are parsed in a process pool, chunks embedded in fixed-size batches
+    INGEST_WORKERS: int = 0  # PDF parsing processes of the ingest CLI, 0 = one per CPU (servers parse serially)
+    INGEST_BATCH_SIZE: int = 64  # chunks per embedding forward pass / index insert
+    INGEST_TORCH_THREADS: int = 0  # torch intra-op threads while embedding, 0 = torch default
+
+    # Conversation history in prompts
+    HISTORY_FETCH_LIMIT: int = 20  # newest messages read from the store per turn
+    HISTORY_TOKEN_BUDGET: int = 1000  # max estimated prompt tokens spent on history
+    SUMMARY_ENABLED: bool = True  # fold messages the prompt no longer keeps into a rolling summary
+    SUMMARY_MIN_NEW_MESSAGES: int = 6  # messages folded per summary update at least, so it is not redone every turn
+    SUMMARY_MAX_WORDS: int = 150
+
+    # Retrieved context in prompts (see context_packer.py)
+    CONTEXT_TOKEN_BUDGET: int = 1200  # max estimated prompt tokens spent on retrieved chunks
+    CONTEXT_SENTENCE_FILTER: bool = False  # keep only sentences similar to the question (one extra embedding batch)
+    CONTEXT_SENTENCE_MIN_SIMILARITY: float = 0.25
+
+    # Semantic answer cache (Redis)
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.92  # cosine similarity needed to reuse an answer
+    SEMANTIC_CACHE_TTL_SECONDS: int = 86400
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+
+    # In-process retrieval result cache (per worker)
+    RETRIEVAL_CACHE_MAX_ENTRIES: int = 2048
+    RETRIEVAL_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    RETRIEVAL_CACHE_TTL_SECONDS: int = 3600
+
+    # Batch chat API (POST /chatbot/chat/batch)
+    BATCH_MAX_ITEMS: int = 256  # questions per request
+    BATCH_LLM_CONCURRENCY: int = 8  # LLM calls in flight per batch
+
+    # Dedicated thread pool for CPU-bound request work (query embedding, FAISS/BM25 search),
+    # so it never queues behind blocking I/O in the default to_thread pool
+    CPU_WORKERS: int = 0  # 0 = one per CPU
+
+    # Local retrieval server owning the model and index once per host (RETRIEVER=remote,
+    # python -m app.services.rag.retrieval_server)
+    RETRIEVAL_SOCKET: str = "storage/retrieval.sock"
+    RETRIEVAL_SERVER_RETRIEVER: str = "faiss"  # what the server runs: faiss | hybrid
+    RETRIEVAL_POOL_SIZE: int = 32  # connections per API worker
+    RETRIEVAL_TIMEOUT_SECONDS: float = 10.0
 
     model_config = SettingsConfigDict(env_file=".env",extra="allow")
 
@@ -0,0 +1,78 @@
+# app/core/metrics.py
+"""
+Prometheus metrics for the chat path, exported at GET /metrics.
+
+Hot-path cost is one perf_counter pair and one histogram observe per stage; label
+children are resolved once and reused. Values that already exist as counters
+elsewhere (cache hits, index size) are read by collectors at scrape time instead
+of being counted twice on every request (see app/api/routes/metrics.py).
+
+Stage timings can also be consumed in-process via add_stage_listener(), which is
+how the load-test harness gets per-stage percentiles without scraping.
+"""
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Stage names
+HISTORY_GET = "history_get"
+CACHE_LOOKUP = "cache_lookup"
+RETRIEVE = "retrieve"
+EMBED = "embed"
+SEARCH = "search"
+LEXICAL = "lexical"
+PROMPT_BUILD = "prompt_build"
+LLM = "llm"
+LLM_FIRST_TOKEN = "llm_first_token"
+HISTORY_APPEND = "history_append"
+
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds", "Time spent per stage of answering a question", ["stage"], buckets=STAGE_BUCKETS
+)
+PROMPT_TOKENS = Histogram("rag_prompt_tokens", "Estimated tokens per LLM prompt", buckets=TOKEN_BUCKETS)
+RESPONSE_TOKENS = Histogram("rag_response_tokens", "Estimated tokens per LLM answer", buckets=TOKEN_BUCKETS)
+ANSWERS = Counter("rag_answers_total", "Questions answered", ["source"])  # source: llm | cache
+IN_FLIGHT = Gauge("rag_requests_in_flight", "Questions currently being answered", ["kind"])
+EMBED_BATCH_SIZE = Histogram(
+    "rag_embed_batch_size", "Queries per micro-batched embedding pass", buckets=(1, 2, 4, 8, 16, 32, 64, 128)
+)
+EMBED_QUEUE_SECONDS = Histogram(
+    "rag_embed_queue_seconds", "Time a query waited for its embedding batch to start", buckets=STAGE_BUCKETS
+)
+
+StageListener = Callable[[str, float], None]
+_listeners: List[StageListener] = []
+_stage_children: Dict[str, object] = {}
+
+
+def add_stage_listener(callback: StageListener) -> None:
+    """Register callback(stage, seconds), called after every timed stage (from any thread)."""
+    _listeners.append(callback)
+
+
+def remove_stage_listener(callback: StageListener) -> None:
+    _listeners.remove(callback)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    child = _stage_children.get(name)
+    if child is None:
+        child = _stage_children[name] = STAGE_SECONDS.labels(name)
+    child.observe(seconds)
+    for callback in _listeners:
+        callback(name, seconds)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as stage `name` (also when it raises)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started)
@@ -13,7 +13,13 @@ class DatabaseManager:
     async def connect_mongodb(self):
         """Initialize MongoDB connection"""
         try:
-            self.mongodb_client = AsyncIOMotorClient(settings.MONGODB_URL)
+            self.mongodb_client = AsyncIOMotorClient(
+                settings.MONGODB_URL,
+                maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+                minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+                serverSelectionTimeoutMS=settings.MONGODB_TIMEOUT_MS,
+                connectTimeoutMS=settings.MONGODB_TIMEOUT_MS,
+            )
             self.mongodb_db = self.mongodb_client[settings.MONGODB_DB_NAME]
             # Test connection
             await self.mongodb_client.admin.command('ping')
@@ -51,7 +57,7 @@ class DatabaseManager:
 
     async def get_mongodb_collection(self, collection_name: str):
         """Get MongoDB collection"""
-        if not self.mongodb_db:
+        if self.mongodb_db is None:
             raise Exception("MongoDB not connected")
         return self.mongodb_db[collection_name]
 
@@ -1,13 +1,74 @@
 # app/domain/ports.py
-from typing import Protocol, List, Dict
+from dataclasses import dataclass, field
+from typing import Protocol, List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
+
+
+@dataclass
+class RetrievedChunk:
+    """A retrieved context chunk plus the metadata needed to cite it."""
+    id: str
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    score: Optional[float] = None
+
+    def describe(self, preview_chars: int = 500) -> Dict[str, Any]:
+        """JSON-friendly summary used by API responses."""
+        return {
+            "id": self.id,
+            "source": self.metadata.get("source"),
+            "page": self.metadata.get("page"),
+            "score": self.score,
+            "preview": self.text[:preview_chars],
+        }
+
+@dataclass
+class ConversationSummary:
+    """Rolling summary of the first `covered` messages of a chat."""
+    text: str
+    covered: int
 
 class ChatHistoryPort(Protocol):
-    def get(self, chat_id: str) -> List[str]: ...
+    # limit: only the most recent `limit` messages, oldest first
+    def get(self, chat_id: str, limit: int | None = None) -> List[str]: ...
+    # messages [start:stop] in chronological order, and how many there are
+    def get_range(self, chat_id: str, start: int, stop: int) -> List[str]: ...
+    def count(self, chat_id: str) -> int: ...
     def append(self, chat_id: str, question: str, answer: str) -> None: ...
     def reset(self, chat_id: str) -> None: ...
 
+class AsyncChatHistoryPort(Protocol):
+    async def get(self, chat_id: str, limit: int | None = None) -> List[str]: ...
+    async def get_range(self, chat_id: str, start: int, stop: int) -> List[str]: ...
+    async def count(self, chat_id: str) -> int: ...
+    async def append(self, chat_id: str, question: str, answer: str) -> None: ...
+    async def reset(self, chat_id: str) -> None: ...
+    async def list_ids(self) -> List[str]: ...
+    # One page of {chat_id, last_activity, turns}, newest first, plus the cursor of the next page
+    async def list_chats(self, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]: ...
+
+class SummaryStorePort(Protocol):
+    async def get(self, chat_id: str) -> Optional[ConversationSummary]: ...
+    async def save(self, chat_id: str, summary: ConversationSummary) -> None: ...
+    async def reset(self, chat_id: str) -> None: ...
+
 class RetrieverPort(Protocol):
     def topk(self, query: str, k: int) -> List[str]: ...
+    def topk_chunks(self, query: str, k: int) -> List[RetrievedChunk]: ...
+    def topk_many(self, queries: List[str], k: int) -> List[List[RetrievedChunk]]: ...
+
+class AsyncRetrieverPort(RetrieverPort, Protocol):
+    # Awaits the query embedding on the event loop; without it topk_chunks runs in a worker thread
+    async def atopk_chunks(self, query: str, k: int) -> List[RetrievedChunk]: ...
 
 class LLMPort(Protocol):
     def generate(self, prompt: str, model: str | None = None) -> str: ...
+    def stream(self, prompt: str, model: str | None = None) -> Iterator[str]: ...
+
+class AsyncLLMPort(LLMPort, Protocol):
+    # Native async calls; without them the sync methods run in a worker thread
+    async def agenerate(self, prompt: str, model: str | None = None) -> str: ...
+    def astream(self, prompt: str, model: str | None = None) -> AsyncIterator[str]: ...
+
+class AnswerCachePort(Protocol):
+    async def lookup(self, query: str) -> Optional[Dict[str, Any]]: ...
+    async def store(self, query: str, chunk_ids: List[str], payload: Dict[str, Any]) -> None: ...
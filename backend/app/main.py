@@ -1,8 +1,10 @@
 from fastapi import FastAPI
 from app.api.routes import auth
-from app.api.routes.chatbot import router as chatbot_router
+from app.api.routes.chatbot import router as chatbot_router, history, remote, summaries, summarizer
 from app.api.routes.health import router as health_router
-from app.services.rag.vectorstore import build_or_load_index  # 👈 add this
+from app.api.routes.metrics import router as metrics_router
+from app.services.rag.warmup import start_warmup
+from app.core.concurrency import shutdown_cpu_executor
 from app.core.logging import setup_logging
 from app.db.database import db_manager
 
@@ -13,6 +15,7 @@ app = FastAPI()
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(chatbot_router, prefix="/api/v1")
 app.include_router(health_router, prefix="/api/v1", tags=["Health"])
+app.include_router(metrics_router, tags=["Monitoring"])
 
 
 # Database and service initialization
@@ -23,21 +26,41 @@ async def startup_event():
     
     # Initialize MongoDB connection
     await db_manager.connect_mongodb()
+    await history.ensure_indexes()
+    await summaries.ensure_indexes()
     
     # Initialize Redis connection
     await db_manager.connect_redis()
     
     print("✅ All database connections established successfully!")
 
+    # Load the embedding model and index in the background; /api/v1/health/ready flips once done
+    # (with RETRIEVER=remote: wait for the retrieval server and learn its index version)
+    app.state.warmup_task = start_warmup(client=remote.client if remote is not None else None)
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     print("🛑 Shutting down LegalAid API server...")
+
+    # Stop retrying a warm-up that has not succeeded
+    warmup_task = getattr(app.state, "warmup_task", None)
+    if warmup_task is not None:
+        warmup_task.cancel()
+
+    # Let background conversation summaries finish before the DB goes away
+    if summarizer is not None:
+        await summarizer.drain()
+
+    # Flush write-behind chat history before closing Mongo
+    await history.close()
     
     # Close MongoDB connection
     await db_manager.disconnect_mongodb()
     
     # Close Redis connection  
     await db_manager.disconnect_redis()
+
+    shutdown_cpu_executor()
     
     print("✅ All database connections closed successfully!")
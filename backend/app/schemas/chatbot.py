@@ -11,3 +11,17 @@ class ChatResponse(BaseModel):
     retrieved_chunks: Optional[List[str]] = Field(
         default=None, description="Relevant context chunks retrieved from FAISS"
     )
+    cached: bool = Field(default=False, description="True when served from the semantic answer cache")
+
+
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest] = Field(..., min_length=1, description="Questions to answer; turns of one chat run in order")
+    stream: bool = Field(default=False, description="Stream results as NDJSON lines in completion order")
+
+class BatchChatResult(ChatResponse):
+    index: int = Field(..., description="Position of the item in the request")
+    answer: Optional[str] = None
+    error: Optional[str] = Field(default=None, description="Set instead of answer when this item failed")
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
@@ -0,0 +1,112 @@
+# app/services/llm/fake_gemini.py
+"""
+Local stand-in for the Gemini REST API, for exercising the client's concurrency cap,
+deadline, retries and hedging without a key or quota.
+
+    python -m app.services.llm.fake_gemini --port 8090 --latency-ms 800 --jitter-ms 300 --error-rate 0.05
+    GEMINI_BASE_URL=http://127.0.0.1:8090 uvicorn app.main:app
+
+Implements generateContent and streamGenerateContent (SSE). Answers echo the last
+line of the prompt after a normally distributed delay; a fraction of requests fail with
+429 or 503.
+"""
+import argparse
+import asyncio
+import json
+import random
+from dataclasses import dataclass
+from typing import List, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 500.0
+    jitter_ms: float = 200.0
+    error_rate: float = 0.0
+    stream_chunks: int = 5
+
+
+config = FakeConfig()
+app = FastAPI(title="Fake Gemini")
+
+
+def _delay() -> float:
+    return max(0.0, random.gauss(config.latency_ms, config.jitter_ms)) / 1000
+
+
+def _answer(body: dict) -> str:
+    parts = [p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", [])]
+    lines = "\n".join(parts).strip().splitlines()
+    return f"Fake answer to: {lines[-1] if lines else ''}"
+
+
+def _response(text: str, model: str, finished: bool = True) -> dict:
+    candidate = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return {"candidates": [candidate], "modelVersion": model}
+
+
+def _error() -> Optional[JSONResponse]:
+    if random.random() >= config.error_rate:
+        return None
+    code, status = random.choice([(429, "RESOURCE_EXHAUSTED"), (503, "UNAVAILABLE")])
+    return JSONResponse({"error": {"code": code, "message": "fake failure", "status": status}}, status_code=code)
+
+
+def _split(text: str, n: int) -> List[str]:
+    size = max(1, -(-len(text) // n))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@app.post("/{version}/models/{model_action}")
+async def models(version: str, model_action: str, request: Request):
+    model, _, action = model_action.partition(":")
+    body = await request.json()
+    error = _error()
+    if error is not None:
+        return error
+
+    if action == "generateContent":
+        await asyncio.sleep(_delay())
+        return _response(_answer(body), model)
+
+    if action == "streamGenerateContent":
+        pieces = _split(_answer(body), config.stream_chunks)
+
+        async def events():
+            await asyncio.sleep(_delay())  # time to first token
+            for i, piece in enumerate(pieces):
+                if i:
+                    await asyncio.sleep(config.latency_ms / 1000 / len(pieces))
+                yield f"data: {json.dumps(_response(piece, model, finished=i == len(pieces) - 1))}\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    raise HTTPException(status_code=404, detail=f"Unsupported action {action!r}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run a fake Gemini API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=config.latency_ms)
+    parser.add_argument("--jitter-ms", type=float, default=config.jitter_ms)
+    parser.add_argument("--error-rate", type=float, default=config.error_rate, help="fraction of requests failing with 429/503")
+    parser.add_argument("--stream-chunks", type=int, default=config.stream_chunks)
+    args = parser.parse_args(argv)
+
+    config.latency_ms = args.latency_ms
+    config.jitter_ms = args.jitter_ms
+    config.error_rate = args.error_rate
+    config.stream_chunks = args.stream_chunks
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,234 @@
-from typing import Optional
-import google.generativeai as genai
+# app/services/llm/gemini_client.py
+"""
+The Gemini client layer (google-genai), shared by everything that calls the LLM.
+
+- One `genai.Client` per process: its HTTP connection pools are reused by every
+  call instead of a new model handle being built per request.
+- At most LLM_MAX_CONCURRENCY calls in flight per process, counted across worker
+  threads and the event loop alike.
+- Every call has a deadline (LLM_TIMEOUT_SECONDS) that also bounds its retries.
+- 429, 5xx and transport errors are retried with full-jitter exponential backoff.
+- With LLM_HEDGE_AFTER_SECONDS > 0, an async call still running after that long
+  gets a second, hedged attempt if a slot is free; the first answer wins.
+
+GEMINI_BASE_URL points the client at another endpoint, such as the fake server in
+fake_gemini.py.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional, TypeVar
+
+import aiohttp
+import httpx
+from google import genai
+from google.genai import errors, types
+
+from app.core.concurrency import ConcurrencyLimit
 from app.core.config import settings
 
-_configured = False
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+TRANSIENT_ERRORS = (httpx.TransportError, aiohttp.ClientError, ConnectionError)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, errors.APIError):
+        return exc.code in RETRYABLE_STATUS
+    return isinstance(exc, TRANSIENT_ERRORS)
+
 
-def get_client():
-    global _configured
-    if not _configured:
-        if not settings.GEMINI_API_KEY:
+def _text(response: types.GenerateContentResponse) -> str:
+    # .text is None for chunks without text parts (e.g. safety/finish metadata)
+    return response.text or ""
+
+
+class GeminiClient:
+    def __init__(
+        self,
+        api_key: str = settings.GEMINI_API_KEY,
+        base_url: Optional[str] = settings.GEMINI_BASE_URL,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        timeout: float = settings.LLM_TIMEOUT_SECONDS,
+        max_retries: int = settings.LLM_MAX_RETRIES,
+        retry_base: float = settings.LLM_RETRY_BASE_SECONDS,
+        retry_max: float = settings.LLM_RETRY_MAX_SECONDS,
+        hedge_after: float = settings.LLM_HEDGE_AFTER_SECONDS,
+    ):
+        if not api_key:
             raise RuntimeError("GEMINI_API_KEY not set")
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        _configured = True
-    return genai
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.hedge_after = hedge_after
+        self.limit = ConcurrencyLimit(max_concurrency)
+        http_options = types.HttpOptions(base_url=base_url) if base_url else None
+        self.client = genai.Client(api_key=api_key, http_options=http_options)
+
+    def _config(self, deadline: float) -> types.GenerateContentConfig:
+        # The HTTP timeout (ms) keeps a sync attempt from outliving the call's deadline
+        remaining_ms = max(1, int((deadline - time.monotonic()) * 1000))
+        return types.GenerateContentConfig(http_options=types.HttpOptions(timeout=remaining_ms))
+
+    def _backoff(self, attempt: int, deadline: float, exc: BaseException) -> Optional[float]:
+        """Seconds to sleep before retry number `attempt`, or None when the call should fail."""
+        if attempt > self.max_retries or not is_retryable(exc):
+            return None
+        delay = random.uniform(0, min(self.retry_max, self.retry_base * 2 ** (attempt - 1)))
+        if time.monotonic() + delay >= deadline:
+            return None
+        logger.warning("Gemini call failed (%s), retry %d in %.2fs", exc, attempt, delay)
+        return delay
+
+    # --- sync (worker threads) ---
+
+    def _retrying(self, attempt_fn: Callable[[float], T]) -> T:
+        deadline = time.monotonic() + self.timeout
+        attempt = 0
+        while True:
+            try:
+                return attempt_fn(deadline)
+            except Exception as e:
+                attempt += 1
+                delay = self._backoff(attempt, deadline, e)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        model = model or settings.DEFAULT_MODEL
+
+        def attempt(deadline: float) -> str:
+            response = self.client.models.generate_content(
+                model=model, contents=prompt, config=self._config(deadline)
+            )
+            return _text(response)
+
+        with self.limit:
+            return self._retrying(attempt)
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        """
+        Yield answer text as Gemini produces it. Only opening the stream is retried:
+        once text has been yielded, a failure is raised to the caller.
+        """
+        model = model or settings.DEFAULT_MODEL
+
+        def open_stream(deadline: float):
+            chunks = iter(self.client.models.generate_content_stream(
+                model=model, contents=prompt, config=self._config(deadline)
+            ))
+            return next(chunks, None), chunks
+
+        with self.limit:
+            first, chunks = self._retrying(open_stream)
+            if first is None:
+                return
+            for chunk in _prepend(first, chunks):
+                text = _text(chunk)
+                if text:
+                    yield text
+
+    # --- async ---
+
+    async def _aretrying(self, attempt_fn: Callable[[], Awaitable[T]], deadline: float) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await asyncio.wait_for(attempt_fn(), timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"Gemini call exceeded its {self.timeout}s deadline") from e
+                attempt += 1
+                delay = self._backoff(attempt, deadline, e)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def agenerate(self, prompt: str, model: Optional[str] = None) -> str:
+        model = model or settings.DEFAULT_MODEL
+        deadline = time.monotonic() + self.timeout
+
+        async def attempt() -> str:
+            response = await self.client.aio.models.generate_content(model=model, contents=prompt)
+            return _text(response)
+
+        async with self.limit:
+            if self.hedge_after <= 0:
+                return await self._aretrying(attempt, deadline)
+            return await self._hedged(lambda: self._aretrying(attempt, deadline))
+
+    async def _hedged(self, call: Callable[[], Awaitable[str]]) -> str:
+        """
+        Run call(); if it has not finished after hedge_after seconds, start a second
+        copy (only when a concurrency slot is free) and return whichever succeeds first.
+        """
+        primary = asyncio.ensure_future(call())
+        tasks = {primary}
+        hedge_slot = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done and self.limit.try_acquire():
+                hedge_slot = True
+                logger.info("Gemini call slower than %.2fs, hedging", self.hedge_after)
+                tasks.add(asyncio.ensure_future(call()))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if hedge_slot:
+                self.limit.release()
+
+    async def astream(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        """Async stream(); the deadline applies to opening the stream (time to first chunk)."""
+        model = model or settings.DEFAULT_MODEL
+        deadline = time.monotonic() + self.timeout
+
+        async def open_stream():
+            chunks = await self.client.aio.models.generate_content_stream(model=model, contents=prompt)
+            return await anext(chunks, None), chunks
+
+        async with self.limit:
+            first, chunks = await self._aretrying(open_stream, deadline)
+            if first is None:
+                return
+            text = _text(first)
+            if text:
+                yield text
+            async for chunk in chunks:
+                text = _text(chunk)
+                if text:
+                    yield text
+
+
+def _prepend(first: T, rest: Iterator[T]) -> Iterator[T]:
+    yield first
+    yield from rest
+
+
+_client: Optional[GeminiClient] = None
+_client_lock = threading.Lock()
+
+def get_client() -> GeminiClient:
+    """The process-wide client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GeminiClient()
+    return _client
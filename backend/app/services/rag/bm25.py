@@ -0,0 +1,223 @@
+# app/services/rag/bm25.py
+"""
+Compact BM25 inverted index over the indexed chunks.
+
+Built by the ingest step from the docstore and persisted as `bm25.npz` next to
+`index.faiss`: flat numpy arrays (vocabulary as UTF-8 bytes plus offsets, CSR-style
+postings, document lengths), saved and loaded without pickle. A lookup only touches the postings of the query
+terms, so it costs microseconds where embedding the query costs milliseconds.
+"""
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BM25_FILE = "bm25.npz"
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in into is it its me my no not "
+    "of on or shall should so such than that the their then there these this those to under was "
+    "what when where which who whom why will with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased alphanumeric terms without stopwords; section numbers like "123" are kept."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Variable-length strings as (concatenated UTF-8 bytes, offsets), not a padded str array."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = data.tobytes()
+    return [raw[start:stop].decode("utf-8") for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+@dataclass
+class LexicalHit:
+    id: str
+    score: float
+    matched: int  # distinct query terms found in the chunk
+
+
+class BM25Index:
+    def __init__(
+        self,
+        terms: List[str],
+        offsets: np.ndarray,
+        post_docs: np.ndarray,
+        post_tfs: np.ndarray,
+        doc_len: np.ndarray,
+        doc_ids: np.ndarray,
+        version: str = "",
+    ):
+        self.offsets = offsets
+        self.post_docs = post_docs
+        self.post_tfs = post_tfs
+        self.doc_len = doc_len
+        self.doc_ids = doc_ids
+        self.version = version  # FAISS index version this was built with
+        self._term_ids: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        n_docs = len(doc_ids)
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.avg_len = float(doc_len.mean()) if n_docs else 0.0
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, str]], version: str = "") -> "BM25Index":
+        """Index (chunk_id, text) pairs."""
+        doc_ids: List[str] = []
+        doc_len: List[int] = []
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for doc, (chunk_id, text) in enumerate(chunks):
+            tokens = tokenize(text)
+            doc_ids.append(chunk_id)
+            doc_len.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[t]) for t in terms])
+        flat = [p for t in terms for p in postings[t]]
+        return cls(
+            terms=terms,
+            offsets=offsets,
+            post_docs=np.array([d for d, _ in flat], dtype=np.int32),
+            post_tfs=np.array([tf for _, tf in flat], dtype=np.float32),
+            doc_len=np.array(doc_len, dtype=np.int32),
+            doc_ids=np.array(doc_ids, dtype=str),
+            version=version,
+        )
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    @property
+    def n_terms(self) -> int:
+        return len(self._term_ids)
+
+    def query_terms(self, query: str) -> List[str]:
+        return list(dict.fromkeys(tokenize(query)))
+
+    def search(self, query: str, k: int) -> List[LexicalHit]:
+        """Top-k chunks by BM25 score (only chunks containing at least one query term)."""
+        term_ids = [self._term_ids[t] for t in self.query_terms(query) if t in self._term_ids]
+        if not term_ids or not len(self):
+            return []
+
+        docs, weights = [], []
+        for t in term_ids:
+            start, stop = self.offsets[t], self.offsets[t + 1]
+            d = self.post_docs[start:stop]
+            tf = self.post_tfs[start:stop]
+            norm = K1 * (1 - B + B * self.doc_len[d] / self.avg_len)
+            docs.append(d)
+            weights.append(self.idf[t] * tf * (K1 + 1) / (tf + norm))
+
+        touched, inverse = np.unique(np.concatenate(docs), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        matched = np.bincount(inverse)
+
+        top = np.argsort(-scores)[:k]
+        return [
+            LexicalHit(id=str(self.doc_ids[touched[i]]), score=float(scores[i]), matched=int(matched[i]))
+            for i in top
+        ]
+
+    def save(self, path: Path) -> None:
+        """Write atomically (np.savez, no pickle)."""
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp.npz")
+        term_bytes, term_offsets = _pack_strings(list(self._term_ids))  # in term id order
+        np.savez(
+            tmp,
+            term_bytes=term_bytes,
+            term_offsets=term_offsets,
+            offsets=self.offsets,
+            post_docs=self.post_docs,
+            post_tfs=self.post_tfs,
+            doc_len=self.doc_len,
+            doc_ids=self.doc_ids,
+            version=np.array(self.version),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        arrays["version"] = str(arrays["version"])
+        if "terms" in arrays:  # written before terms were packed
+            arrays["terms"] = arrays["terms"].tolist()
+        else:
+            arrays["terms"] = _unpack_strings(arrays.pop("term_bytes"), arrays.pop("term_offsets"))
+        return cls(**arrays)
+
+
+def bm25_path() -> Path:
+    return Path(settings.INDEX_DIR) / BM25_FILE
+
+
+def stored_version(path: Path) -> Optional[str]:
+    """Index version a persisted BM25 file was built for (reads only that member)."""
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return str(data["version"])
+
+
+def is_decisive(hits: List[LexicalHit], n_query_terms: int, ratio: float = settings.LEXICAL_DECISIVE_RATIO) -> bool:
+    """
+    The lexical match settles the query on its own when the best chunk contains every
+    query term and clearly outscores the runner-up (e.g. "section 123", a defined term).
+    """
+    if not hits or n_query_terms == 0 or hits[0].matched < n_query_terms:
+        return False
+    return len(hits) == 1 or hits[0].score >= ratio * hits[1].score
+
+
+_index: Optional[BM25Index] = None
+_loaded_for: Optional[str] = None  # FAISS index version _index was looked up for
+_lock = threading.Lock()
+
+def _load(version: Optional[str]) -> Optional[BM25Index]:
+    path = bm25_path()
+    if not path.exists():
+        logger.warning("No BM25 index at %s; run the ingest to build it", path)
+        return None
+    index = BM25Index.load(path)
+    if index.version != version:
+        logger.warning("BM25 index was built for index version %s, not %s; ignoring it", index.version, version)
+        return None
+    return index
+
+def get_bm25_index(version: Optional[str]) -> Optional[BM25Index]:
+    """The persisted BM25 index if it was built for FAISS index `version`, else None."""
+    global _index, _loaded_for
+    if _loaded_for != version:
+        with _lock:
+            if _loaded_for != version:
+                _index = _load(version)
+                _loaded_for = version
+    return _index
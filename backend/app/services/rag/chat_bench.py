@@ -0,0 +1,280 @@
+# app/services/rag/chat_bench.py
+"""
+Offline load test of POST /chatbot/chat: the real router, QAService, embedding model
+and FAISS index, with a fake LLM and in-memory chat history, driven in-process at a
+fixed concurrency. No server, Gemini key, Mongo or Redis needed.
+
+    python -m app.services.rag.chat_bench
+    python -m app.services.rag.chat_bench --requests 2000 --concurrency 64 --llm-latency-ms 800 --json run.json
+    python -m app.services.rag.chat_bench --json new.json --baseline run.json   # compare two runs
+
+Reports throughput and p50/p95/p99 of the end-to-end request and of every stage
+recorded by app.core.metrics (history_get, retrieve, embed, search, prompt_build,
+llm, history_append, ...). The fake LLM sleeps for a seeded log-normal delay, so
+runs with the same arguments are comparable.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+from app.adapters.chat.inmem_history import InMemChatHistory
+from app.core import metrics
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.domain.ports import AsyncLLMPort, LLMPort
+from app.services.rag.index_bench import format_table
+from app.services.rag.vectorstore import build_or_load_index, vs_holder
+
+QUESTIONS = (
+    "What is the penalty for driving without a valid driving licence?",
+    "Who can issue a revenue licence for a motor vehicle?",
+    "What is the fine for not wearing a seat belt?",
+    "How long is a learner's permit valid?",
+    "What must a driver do after an accident causing injury?",
+    "Which vehicles are classified as heavy motor lorries?",
+    "Can the police detain a vehicle without a licence?",
+    "What is the maximum speed limit for a motor cycle?",
+    "What are the requirements for a driving licence for a three wheeler?",
+    "What happens if a spot fine is not paid within the period?",
+    "Is it an offence to use a mobile phone while driving?",
+    "What documents must be carried while driving?",
+)
+
+
+class FakeLLM(AsyncLLMPort):
+    """Deterministic LLM: a seeded log-normal latency and a fixed-size answer."""
+
+    def __init__(self, median_ms: float, sigma: float, answer_words: int, seed: int = 0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.answer = " ".join(["answer"] * answer_words)
+        self._rng = random.Random(seed)
+
+    def _delay(self) -> float:
+        return self.median_ms * math.exp(self._rng.gauss(0.0, self.sigma)) / 1000
+
+    def generate(self, prompt: str, model: str | None = None) -> str:
+        time.sleep(self._delay())
+        return self.answer
+
+    async def agenerate(self, prompt: str, model: str | None = None) -> str:
+        await asyncio.sleep(self._delay())
+        return self.answer
+
+    def stream(self, prompt: str, model: str | None = None) -> Iterator[str]:
+        time.sleep(self._delay())
+        yield self.answer
+
+    async def astream(self, prompt: str, model: str | None = None) -> AsyncIterator[str]:
+        await asyncio.sleep(self._delay())
+        yield self.answer
+
+
+class SyncFakeLLM(LLMPort):
+    """FakeLLM without the async methods, so QAService calls it from worker threads."""
+
+    def __init__(self, llm: FakeLLM):
+        self.llm = llm
+
+    def generate(self, prompt: str, model: str | None = None) -> str:
+        return self.llm.generate(prompt, model)
+
+    def stream(self, prompt: str, model: str | None = None) -> Iterator[str]:
+        return self.llm.stream(prompt, model)
+
+
+class SlowHistory(InMemChatHistory):
+    """In-memory history with an artificial round trip, standing in for Mongo."""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.reset_all()
+
+    async def get(self, chat_id: str, limit: int | None = None) -> List[str]:
+        await asyncio.sleep(self.latency)
+        return super().get(chat_id, limit)
+
+    async def get_range(self, chat_id: str, start: int, stop: int) -> List[str]:
+        await asyncio.sleep(self.latency)
+        return super().get_range(chat_id, start, stop)
+
+    async def count(self, chat_id: str) -> int:
+        await asyncio.sleep(self.latency)
+        return super().count(chat_id)
+
+    async def append(self, chat_id: str, q: str, a: str) -> None:
+        await asyncio.sleep(self.latency)
+        super().append(chat_id, q, a)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    ms = np.asarray(values) * 1000
+    return {
+        "n": len(values),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def _histogram_totals(histogram) -> Tuple[float, float]:
+    """(count, sum) of an unlabelled prometheus Histogram."""
+    metric = histogram.collect()[0]
+    samples = {s.name: s.value for s in metric.samples}
+    return samples[f"{metric.name}_count"], samples[f"{metric.name}_sum"]
+
+
+def build_app(args: argparse.Namespace) -> FastAPI:
+    """The chatbot router with its QAService rewired to the fake LLM and in-memory history."""
+    import app.api.routes.chatbot as chatbot
+    from app.services.rag.qa_service import QAService
+
+    llm = FakeLLM(args.llm_latency_ms, args.llm_sigma, args.answer_words, seed=args.seed)
+    chatbot.qa = QAService(
+        retriever=chatbot.qa.retriever,
+        llm=SyncFakeLLM(llm) if args.sync_llm else llm,
+        history=SlowHistory(args.history_latency_ms),
+        cache=None,  # the semantic cache needs Redis
+    )
+    app = FastAPI()
+    app.include_router(chatbot.router, prefix="/api/v1")
+    return app
+
+
+async def run(app: FastAPI, args: argparse.Namespace) -> Dict[str, object]:
+    rng = random.Random(args.seed)
+    questions = list(QUESTIONS)
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    jobs: asyncio.Queue = asyncio.Queue()
+    for n in range(args.requests):
+        question = rng.choice(questions)
+        if args.distinct:  # defeat the embedding and retrieval caches
+            question = f"{question} ({n})"
+        jobs.put_nowait({"chat_id": f"bench-{rng.randrange(args.chats)}", "query": question})
+
+    stages: Dict[str, List[float]] = defaultdict(list)
+    listener = lambda stage, seconds: stages[stage].append(seconds)
+    latencies: List[float] = []
+    errors = 0
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while not jobs.empty():
+            body = jobs.get_nowait()
+            started = time.perf_counter()
+            response = await client.post("/api/v1/chatbot/chat", json=body)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for _ in range(min(args.warmup, args.requests)):  # first requests load the model and fault in the index
+            await client.post("/api/v1/chatbot/chat", json={"chat_id": "bench-warmup", "query": QUESTIONS[0]})
+        metrics.add_stage_listener(listener)
+        batches_before, batched_before = _histogram_totals(metrics.EMBED_BATCH_SIZE)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - started
+        finally:
+            metrics.remove_stage_listener(listener)
+
+    batches, batched = _histogram_totals(metrics.EMBED_BATCH_SIZE)
+    batches -= batches_before
+    batched -= batched_before
+
+    rows = [{"stage": "request", **_percentiles(latencies)}]
+    rows += [{"stage": stage, **_percentiles(values)} for stage, values in stages.items()]
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+        "environment": {
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "index_type": settings.INDEX_TYPE,
+            "index_version": vs_holder.version,  # None with RETRIEVER=remote
+            "index_vectors": vs_holder.store.index.ntotal if vs_holder.store is not None else None,
+            "embed_backend": settings.EMBED_BACKEND,
+            "retriever": settings.RETRIEVER,
+            "embed_batch_max_size": settings.EMBED_BATCH_MAX_SIZE,
+            "embed_batch_window_ms": settings.EMBED_BATCH_WINDOW_MS,
+            "cpu_workers": settings.CPU_WORKERS or os.cpu_count(),
+        },
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "embed_batches": int(batches),
+        "embed_batch_mean": round(batched / batches, 2) if batches else None,
+        "rows": rows,
+    }
+
+
+def compare(report: Dict[str, object], baseline: Dict[str, object]) -> List[Dict[str, object]]:
+    """Per stage p50/p95/p99 of this run as a ratio of the baseline run (> 1 is slower)."""
+    before = {row["stage"]: row for row in baseline["rows"]}
+    rows = []
+    for row in report["rows"]:
+        old = before.get(row["stage"])
+        if old is None:
+            continue
+        rows.append({
+            "stage": row["stage"],
+            **{f"{p}_x": round(row[f"{p}_ms"] / old[f"{p}_ms"], 3) if old[f"{p}_ms"] else None for p in ("p50", "p95", "p99")},
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="In-process load test of /chatbot/chat with a fake LLM.")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--chats", type=int, default=100, help="distinct chat ids (history grows per chat)")
+    parser.add_argument("--llm-latency-ms", type=float, default=500.0, help="median fake LLM latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.5, help="log-normal spread of the LLM latency")
+    parser.add_argument("--answer-words", type=int, default=120)
+    parser.add_argument("--sync-llm", action="store_true", help="blocking LLM calls in worker threads instead of awaited ones")
+    parser.add_argument("--history-latency-ms", type=float, default=2.0, help="simulated history store round trip")
+    parser.add_argument("--questions", help="file with one question per line (default: built-in set)")
+    parser.add_argument("--distinct", action="store_true", help="make every question unique (cold caches)")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests before the run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    setup_logging("WARNING")
+    if settings.RETRIEVER != "remote":  # otherwise the retrieval server holds the index
+        build_or_load_index()
+    report = asyncio.run(run(build_app(args), args))
+
+    print(f"{report['requests']} requests, {report['errors']} errors, "
+          f"{report['throughput_rps']} req/s at concurrency {args.concurrency}, "
+          f"{report['embed_batches']} embedding batches (mean size {report['embed_batch_mean']})")
+    print(format_table(report["rows"]))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\nvs baseline: throughput x{report['throughput_rps'] / baseline['throughput_rps']:.3f}, "
+              "latency ratios (> 1 is slower):")
+        print(format_table(compare(report, baseline)))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+# app/services/rag/context_packer.py
+"""
+Turns retrieved chunks into the context block of the prompt.
+
+Neighbouring chunks of a page share CHUNK_OVERLAP characters, and a top-k often
+contains two or three of them. Packing merges chunks of the same page that overlap
+or contain one another into one passage, drops duplicate passages, optionally keeps
+only the sentences most similar to the question, and stops at a token budget. Every
+token cut here is one Gemini does not have to read.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.domain.ports import RetrievedChunk
+from app.services.rag.embeddings import EmbeddingService, get_embedding_service
+from app.services.rag.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+MIN_OVERLAP_CHARS = 20  # shorter shared prefixes/suffixes are coincidence, not chunk overlap
+MIN_PARTIAL_TOKENS = 50  # don't bother including a truncated passage shorter than this
+OMITTED = " … "
+
+MIN_SENTENCE_CHARS = 40  # shorter pieces (list numbers, headings) stay with the previous sentence
+
+# Legal text ends clauses with ";" and ":" as often as with "."; "6." or "No. 18" do not end one
+_SENTENCE_END = re.compile(r"(?<=[a-z)”\"][.;:!?])\s+")
+
+
+def _normalized(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _overlap(left: str, right: str, max_chars: int) -> int:
+    """Length of the longest suffix of `left` that is a prefix of `right` (0 if < MIN_OVERLAP_CHARS)."""
+    for size in range(min(max_chars, len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _merge(a: str, b: str, max_overlap: int) -> Optional[str]:
+    """a and b as one passage if one contains the other or they overlap, else None."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    size = _overlap(a, b, max_overlap)
+    if size:
+        return a + b[size:]
+    size = _overlap(b, a, max_overlap)
+    if size:
+        return b + a[size:]
+    return None
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences: List[str] = []
+    for piece in _SENTENCE_END.split(text.strip()):
+        if sentences and len(piece) < MIN_SENTENCE_CHARS:
+            sentences[-1] = f"{sentences[-1]} {piece}"
+        elif piece:
+            sentences.append(piece)
+    return sentences
+
+
+class ContextPacker:
+    def __init__(
+        self,
+        token_budget: int = settings.CONTEXT_TOKEN_BUDGET,
+        sentence_filter: bool = settings.CONTEXT_SENTENCE_FILTER,
+        min_similarity: float = settings.CONTEXT_SENTENCE_MIN_SIMILARITY,
+        max_overlap: int = settings.CHUNK_OVERLAP,
+        embedder: Optional[EmbeddingService] = None,
+    ):
+        self.token_budget = token_budget
+        self.sentence_filter = sentence_filter
+        self.min_similarity = min_similarity
+        # The splitter's overlap is at most CHUNK_OVERLAP; allow some slack for whitespace
+        self.max_overlap = max(max_overlap * 2, MIN_OVERLAP_CHARS)
+        self._embedder = embedder
+        self.io_bound = getattr(embedder, "io_bound", False)  # e.g. embedding through RemoteRetriever
+
+    @property
+    def embedder(self) -> EmbeddingService:
+        return self._embedder or get_embedding_service()
+
+    def passages(self, chunks: List[RetrievedChunk]) -> List[str]:
+        """
+        Merge overlapping/contained chunks of the same page and drop duplicates.
+        Passages keep the rank of their best chunk.
+        """
+        groups: Dict[Tuple[object, object], List[int]] = {}
+        passages: List[Optional[str]] = []
+        for chunk in chunks:
+            text = chunk.text.strip()
+            if not text:
+                continue
+            key = (chunk.metadata.get("source"), chunk.metadata.get("page"))
+            members = groups.setdefault(key, [])
+            merged = False
+            for i in members:
+                if passages[i] is None:  # absorbed by an earlier merge
+                    continue
+                combined = _merge(passages[i], text, self.max_overlap)
+                if combined is not None:
+                    passages[i] = combined
+                    merged = True
+                    break
+            if not merged:
+                members.append(len(passages))
+                passages.append(text)
+                continue
+            # A merge can make a passage overlap another one of the same page (A + C, then B)
+            self._merge_group(passages, members)
+
+        seen = set()
+        unique = []
+        for passage in passages:
+            if passage is None:
+                continue
+            key = _normalized(passage)
+            if key in seen:
+                continue
+            seen.add(key)
+            unique.append(passage)
+        return unique
+
+    def _merge_group(self, passages: List[Optional[str]], members: List[int]) -> None:
+        changed = True
+        while changed:
+            changed = False
+            live = [i for i in members if passages[i] is not None]
+            for x, i in enumerate(live):
+                for j in live[x + 1:]:
+                    combined = _merge(passages[i], passages[j], self.max_overlap)
+                    if combined is not None:
+                        passages[i], passages[j] = combined, None
+                        changed = True
+                        break
+                if changed:
+                    break
+
+    def _relevant_sentences(self, question: str, passages: List[str]) -> List[str]:
+        """
+        Keep the sentences whose embedding is at least min_similarity to the question's
+        (at least the best one per passage). The question vector comes from the embedding
+        cache the retriever already filled; all sentences are embedded in one batch.
+        """
+        sentences = [split_sentences(p) for p in passages]
+        flat = [s for group in sentences for s in group]
+        if not flat:
+            return passages
+        query = self.embedder.vector(question)
+        vectors = np.asarray(self.embedder.embed_documents(flat), dtype=np.float32)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        scores = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+        kept_passages = []
+        start = 0
+        for group in sentences:
+            group_scores = scores[start:start + len(group)]
+            start += len(group)
+            if not group:
+                continue
+            keep = group_scores >= self.min_similarity
+            keep[int(np.argmax(group_scores))] = True
+            parts: List[str] = []
+            for sentence, kept in zip(group, keep):
+                if kept:
+                    parts.append(sentence)
+                elif parts[-1:] != [OMITTED.strip()]:
+                    parts.append(OMITTED.strip())
+            kept_passages.append(" ".join(parts))
+        return kept_passages
+
+    def _fit(self, passages: List[str]) -> List[str]:
+        """Passages in rank order until the token budget is used up; the last one may be cut."""
+        packed: List[str] = []
+        used = 0
+        for passage in passages:
+            cost = estimate_tokens(passage) + 1  # + the blank line between passages
+            if used + cost <= self.token_budget:
+                packed.append(passage)
+                used += cost
+                continue
+            remaining = self.token_budget - used - 1  # the cut passage has its blank line too
+            if remaining >= MIN_PARTIAL_TOKENS:
+                cut = passage[: remaining * CHARS_PER_TOKEN - len(OMITTED)]
+                cut = cut[: cut.rfind(" ")] if " " in cut else cut
+                packed.append(cut.rstrip() + OMITTED.rstrip())
+            break
+        return packed
+
+    def pack(self, question: str, chunks: List[RetrievedChunk]) -> List[str]:
+        """Context passages for the prompt, most relevant first."""
+        passages = self.passages(chunks)
+        if self.sentence_filter:
+            passages = self._relevant_sentences(question, passages)
+        return self._fit(passages)
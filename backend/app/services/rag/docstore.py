@@ -0,0 +1,130 @@
+# app/services/rag/docstore.py
+"""
+SQLite-backed docstore for the FAISS vector store.
+
+Chunk text and metadata live in `docstore.sqlite` next to `index.faiss` and are read
+by id only for the hits a search returns, so a worker never holds the corpus in
+memory and loading the store involves no unpickling. The FAISS row -> chunk id
+mapping is stored in the same file (`positions`) and read lazily as well.
+"""
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Union
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS positions (
+    pos INTEGER PRIMARY KEY,
+    id TEXT NOT NULL
+);
+"""
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    LangChain docstore over one SQLite file. Read-only stores (the serving path) open
+    the file with mode=ro; writable stores are only used by the index build.
+
+    The store holds a single connection, opened when it is created and shared by all
+    threads under a lock. Reads therefore keep going to the file that was current at
+    load time, matching the index.faiss loaded alongside it, even after an ingest has
+    replaced docstore.sqlite on disk. A store swapped out of service is not closed
+    explicitly, since searches may still be reading it; the connection closes when
+    the store is garbage collected.
+    """
+
+    def __init__(self, path: Union[str, Path], read_only: bool = True):
+        self.path = Path(path)
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._conn.execute("SELECT 1 FROM positions LIMIT 1")  # open the file now, not on first search
+        else:
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.executescript(SCHEMA)
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def search(self, search: str) -> Union[str, Document]:
+        rows = self._query("SELECT text, metadata FROM chunks WHERE id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=rows[0][0], metadata=json.loads(rows[0][1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                [(id_, doc.page_content, json.dumps(doc.metadata)) for id_, doc in texts.items()],
+            )
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(id_,) for id_ in ids])
+
+    def iter_texts(self, page_size: int = 1000) -> Iterator[Tuple[str, str]]:
+        """(id, text) of every stored chunk, read a page at a time."""
+        last = 0
+        while True:
+            rows = self._query(
+                "SELECT rowid, id, text FROM chunks WHERE rowid > ? ORDER BY rowid LIMIT ?", (last, page_size)
+            )
+            for _, id_, text in rows:
+                yield id_, text
+            if len(rows) < page_size:
+                return
+            last = rows[-1][0]
+
+    def positions(self) -> "PositionMap":
+        return PositionMap(self)
+
+    def save_positions(self, index_to_docstore_id: Mapping) -> None:
+        """Replace the stored FAISS row -> id mapping and commit everything written so far."""
+        with self._lock:
+            self._conn.execute("DELETE FROM positions")
+            self._conn.executemany(
+                "INSERT INTO positions (pos, id) VALUES (?, ?)",
+                ((int(pos), id_) for pos, id_ in index_to_docstore_id.items()),
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        """Close the connection once the current query is done; later reads fail."""
+        with self._lock:
+            self._conn.close()
+
+
+class PositionMap(Mapping):
+    """FAISS row -> chunk id, looked up in SQLite on access instead of held in a dict."""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self._docstore = docstore
+
+    def __getitem__(self, pos: int) -> str:
+        rows = self._docstore._query("SELECT id FROM positions WHERE pos = ?", (int(pos),))
+        if not rows:
+            raise KeyError(pos)
+        return rows[0][0]
+
+    def __len__(self) -> int:
+        return self._docstore._query("SELECT COUNT(*) FROM positions")[0][0]
+
+    def __iter__(self) -> Iterator[int]:
+        for (pos,) in self._docstore._query("SELECT pos FROM positions ORDER BY pos"):
+            yield pos
+
+    def items(self) -> List[Tuple[int, str]]:
+        return self._docstore._query("SELECT pos, id FROM positions ORDER BY pos")
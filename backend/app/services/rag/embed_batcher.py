@@ -0,0 +1,117 @@
+# app/services/rag/embed_batcher.py
+"""
+Dynamic micro-batching of query embeddings.
+
+Under load, many requests each embed one short query, and a forward pass over one
+query costs nearly as much as one over a dozen. The batcher queues queries from any
+thread, and a single background thread embeds whatever has accumulated in one
+embed_documents call and resolves each caller's future.
+
+A batch is sent when it reaches max_batch or when its oldest query has waited
+window_ms. Queries arriving while a batch is being embedded form the next one, so
+batches grow with load on their own; the window only applies after a batch of more
+than one query, so a lone query on an idle worker is embedded at once.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Deque, List, Optional, Tuple
+
+import numpy as np
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EmbedMany = Callable[[List[str]], List[List[float]]]
+
+
+class EmbeddingBatcher:
+    def __init__(
+        self,
+        embed_many: EmbedMany,
+        max_batch: int = settings.EMBED_BATCH_MAX_SIZE,
+        window_ms: float = settings.EMBED_BATCH_WINDOW_MS,
+    ):
+        if max_batch < 1:
+            raise ValueError("max_batch must be >= 1")
+        self.embed_many = embed_many
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._queue: Deque[Tuple[str, "Future[np.ndarray]", float]] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._busy = False  # the last batch had company, so wait for the next one to fill
+
+    def submit(self, text: str) -> "Future[np.ndarray]":
+        """Queue `text`; the future resolves to its float32 embedding."""
+        future: "Future[np.ndarray]" = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EmbeddingBatcher is closed")
+            self._queue.append((text, future, time.perf_counter()))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def embed(self, text: str) -> np.ndarray:
+        """Blocking: the embedding of `text`, computed in a shared batch."""
+        return self.submit(text).result()
+
+    def close(self) -> None:
+        """Embed what is queued, then stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _next_batch(self) -> List[Tuple[str, "Future[np.ndarray]", float]]:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if self._busy:
+                deadline = self._queue[0][2] + self.window if self._queue else 0.0
+                while self._queue and len(self._queue) < self.max_batch and not self._closed:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            return [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:  # closed and drained
+                return
+            self._busy = len(batch) > 1
+            self._embed(batch)
+
+    def _embed(self, batch: List[Tuple[str, "Future[np.ndarray]", float]]) -> None:
+        started = time.perf_counter()
+        live = []
+        for text, future, queued in batch:
+            if future.set_running_or_notify_cancel():  # False if the caller gave up
+                metrics.EMBED_QUEUE_SECONDS.observe(started - queued)
+                live.append((text, future))
+        if not live:
+            return
+        metrics.EMBED_BATCH_SIZE.observe(len(live))
+
+        unique = list(dict.fromkeys(text for text, _ in live))
+        try:
+            vectors = dict(zip(unique, np.asarray(self.embed_many(unique), dtype=np.float32)))
+        except Exception as e:
+            logger.warning("Embedding batch of %d failed: %s", len(unique), e)
+            for _, future in live:
+                future.set_exception(e)
+            return
+        for text, future in live:
+            future.set_result(vectors[text])
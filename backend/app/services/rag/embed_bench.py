@@ -0,0 +1,120 @@
+# app/services/rag/embed_bench.py
+"""
+Compare the embedding backends on CPU: model load time, batch throughput,
+single-query latency and cosine agreement with the torch backend.
+
+    python -m app.services.rag.embed_bench
+    python -m app.services.rag.embed_bench --backends torch,onnx,onnx-int8 --threads 4 --json embed.json
+
+Documents are the indexed chunks (or --texts, one per line); queries are their
+first QUERY_CHARS characters.
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.services.rag.index_bench import QUERY_CHARS, corpus_texts, format_table
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _loader(backend: str, threads: int) -> Callable[[], Embeddings]:
+    if backend == "torch":
+        def load():
+            import torch
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            if threads > 0:
+                torch.set_num_threads(threads)
+            return HuggingFaceEmbeddings(model_name=settings.EMBED_MODEL)
+        return load
+
+    from app.services.rag.onnx_embeddings import OnnxEmbeddings
+    quantize = backend == "onnx-int8"
+    return lambda: OnnxEmbeddings(settings.EMBED_MODEL, quantize=quantize, intra_op_threads=threads)
+
+
+def _normalized(vectors: List[List[float]]) -> np.ndarray:
+    arr = np.asarray(vectors, dtype=np.float32)
+    return arr / np.clip(np.linalg.norm(arr, axis=1, keepdims=True), 1e-12, None)
+
+
+def run_backend(model: Embeddings, docs: List[str], queries: List[str], batch_size: int) -> Dict[str, object]:
+    model.embed_documents(docs[:batch_size])  # first call allocates buffers / warms kernels
+
+    started = time.perf_counter()
+    vectors: List[List[float]] = []
+    for start in range(0, len(docs), batch_size):
+        vectors.extend(model.embed_documents(docs[start:start + batch_size]))
+    elapsed = time.perf_counter() - started
+
+    timings = []
+    for q in queries:
+        t = time.perf_counter()
+        model.embed_query(q)
+        timings.append((time.perf_counter() - t) * 1000)
+
+    return {
+        "docs_per_s": round(len(docs) / elapsed, 1),
+        "query_p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "query_p95_ms": round(float(np.percentile(timings, 95)), 3),
+        "vectors": _normalized(vectors),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Throughput/latency/agreement of the embedding backends.")
+    parser.add_argument("--backends", default=",".join(BACKENDS), help="comma-separated: torch, onnx, onnx-int8")
+    parser.add_argument("--texts", help="file with one document per line (default: indexed chunks)")
+    parser.add_argument("--num-docs", type=int, default=512)
+    parser.add_argument("--num-queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=settings.ONNX_INTRA_OP_THREADS, help="intra-op threads, 0 = default")
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+    backends.sort(key=lambda b: b != "torch")  # torch first: it is the reference for agreement
+
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            docs = [line.strip() for line in f if line.strip()]
+    else:
+        docs = corpus_texts()
+    docs = docs[:args.num_docs]
+    queries = [d[:QUERY_CHARS] for d in docs[:args.num_queries]]
+
+    rows: List[Dict[str, object]] = []
+    reference: Optional[np.ndarray] = None
+    for backend in backends:
+        started = time.perf_counter()
+        model = _loader(backend, args.threads)()
+        load_s = time.perf_counter() - started
+
+        result = run_backend(model, docs, queries, args.batch_size)
+        vectors = result.pop("vectors")
+        if backend == "torch":
+            reference = vectors
+        row = {"backend": backend, "load_s": round(load_s, 2), **result}
+        if reference is not None:
+            cosine = (vectors * reference).sum(axis=1)
+            row.update(cos_mean=round(float(cosine.mean()), 5), cos_min=round(float(cosine.min()), 5))
+        rows.append(row)
+
+    print(format_table(rows))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"docs": len(docs), "queries": len(queries), "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
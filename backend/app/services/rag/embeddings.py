@@ -0,0 +1,159 @@
+# app/services/rag/embeddings.py
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.cache import LRUCache
+from app.core.concurrency import run_cpu
+from app.core.config import settings
+from app.services.rag.embed_batcher import EmbeddingBatcher
+
+
+EMBED_BACKENDS = ("torch", "onnx")
+
+
+class EmbeddingService(Embeddings):
+    """
+    Owns the one loaded embedding model for this process and memoizes query vectors.
+
+    It is also a LangChain `Embeddings`, so the FAISS store uses it directly: the
+    retriever, the semantic cache and anything else embedding the same query text
+    share a single forward pass.
+
+    The model runs on PyTorch via sentence-transformers (backend "torch") or on
+    ONNX Runtime (backend "onnx", see onnx_embeddings.py). Cache misses from
+    concurrent callers are embedded together by an EmbeddingBatcher unless
+    batch_max_size is 1. Coroutines should await avector(): vector() blocks its
+    thread until the batch is done, and called from the CPU_WORKERS pool that caps
+    a batch at CPU_WORKERS queries.
+    """
+
+    def __init__(
+        self,
+        model_name: str = settings.EMBED_MODEL,
+        cache_entries: int = settings.EMBED_CACHE_MAX_ENTRIES,
+        cache_dtype: str = settings.EMBED_CACHE_DTYPE,
+        backend: str = settings.EMBED_BACKEND,
+        batch_max_size: int = settings.EMBED_BATCH_MAX_SIZE,
+        batch_window_ms: float = settings.EMBED_BATCH_WINDOW_MS,
+    ):
+        if backend not in EMBED_BACKENDS:
+            raise ValueError(f"Unknown EMBED_BACKEND {backend!r}, expected one of {', '.join(EMBED_BACKENDS)}")
+        self.model_name = model_name
+        self.backend = backend
+        self.cache_dtype = np.dtype(cache_dtype)
+        self.cache: LRUCache[np.ndarray] = LRUCache(max_entries=cache_entries, sizeof=lambda v: v.nbytes)
+        self._model: Optional[Embeddings] = None
+        self._load_lock = threading.Lock()
+        self.batcher: Optional[EmbeddingBatcher] = None
+        self._pending: Dict[bytes, "Future[np.ndarray]"] = {}  # queued misses, by cache key
+        self._pending_lock = threading.Lock()
+        if batch_max_size > 1:
+            self.batcher = EmbeddingBatcher(lambda texts: self.model.embed_documents(texts), batch_max_size, batch_window_ms)
+
+    @property
+    def model(self) -> Embeddings:
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    self._model = self._load_model()
+        return self._model
+
+    def _load_model(self) -> Embeddings:
+        if self.backend == "onnx":
+            # Imported lazily so the torch backend does not need onnxruntime (and vice versa)
+            from app.services.rag.onnx_embeddings import OnnxEmbeddings
+            return OnnxEmbeddings(self.model_name)
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        return HuggingFaceEmbeddings(model_name=self.model_name)
+
+    def vector(self, text: str) -> np.ndarray:
+        """
+        Query embedding as a float32 array, computed at most once per distinct text.
+        Always the value as stored in the cache (rounded to EMBED_CACHE_DTYPE), so a
+        query scores the same on its first call as on later ones.
+        """
+        key = _key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached.astype(np.float32)
+        if self.batcher is not None:
+            vector = self._batched(key, text).result()
+        else:
+            vector = self.model.embed_query(text)
+        return self._keep(key, vector)
+
+    async def avector(self, text: str) -> np.ndarray:
+        """
+        vector() for coroutines: a miss waits for its batch on the event loop, so any
+        number of concurrent queries can share one forward pass.
+        """
+        key = _key(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached.astype(np.float32)
+        if self.batcher is not None:
+            # Shielded: the batch future may be shared with other callers
+            vector = await asyncio.shield(asyncio.wrap_future(self._batched(key, text)))
+        else:
+            vector = await run_cpu(self.model.embed_query, text)
+        return self._keep(key, vector)
+
+    def _batched(self, key: bytes, text: str) -> "Future[np.ndarray]":
+        """The batcher's future for text, shared with callers already waiting for the same text."""
+        with self._pending_lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self.batcher.submit(text)
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._pending.pop(key, None))
+        return future
+
+    def _keep(self, key: bytes, vector) -> np.ndarray:
+        stored = np.asarray(vector, dtype=np.float32).astype(self.cache_dtype)
+        self.cache.put(key, stored)
+        return stored.astype(np.float32)
+
+    def vectors(self, texts: List[str]) -> np.ndarray:
+        """
+        Query embeddings for many texts as one (n, dim) float32 array. Cached texts are
+        reused and all misses are embedded in a single batched forward pass.
+        """
+        keys = [_key(t) for t in texts]
+        found = [self.cache.get(key) for key in keys]
+        missing = [i for i, v in enumerate(found) if v is None]
+        if missing:
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique, np.asarray(self.model.embed_documents(unique), dtype=np.float32)))
+            for i in missing:
+                found[i] = computed[texts[i]].astype(self.cache_dtype)
+                self.cache.put(keys[i], found[i])
+        return np.vstack([v.astype(np.float32) for v in found]) if found else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vector(text).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Index-build path: documents are embedded once, so they bypass the query cache
+        return self.model.embed_documents(texts)
+
+
+def _key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+_service: Optional[EmbeddingService] = None
+_service_lock = threading.Lock()
+
+def get_embedding_service() -> EmbeddingService:
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = EmbeddingService()
+    return _service
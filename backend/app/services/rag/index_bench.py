@@ -0,0 +1,172 @@
+# app/services/rag/index_bench.py
+"""
+Compare FAISS index types on the current corpus: recall@k against the exact (flat)
+index, single-query search latency, build time and index size.
+
+    python -m app.services.rag.index_bench
+    python -m app.services.rag.index_bench --types flat,hnsw,ivf_pq --nprobe 4,16,64 --ef-search 32,128 --k 5
+    python -m app.services.rag.index_bench --queries questions.txt --json report.json
+
+Chunk vectors are re-embedded from the persisted docstore so every variant sees the
+same float32 vectors. Without --queries, the opening of randomly sampled chunks is
+used as the query set.
+"""
+import argparse
+import json
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.services.rag.index_types import INDEX_TYPES, configure_search, index_nbytes, trained_index
+from app.services.rag.vectorstore import _embedder, build_or_load_index
+
+logger = logging.getLogger(__name__)
+
+QUERY_CHARS = 200  # length of sampled-chunk queries
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _embed(texts: List[str], batch_size: int = settings.INGEST_BATCH_SIZE) -> np.ndarray:
+    embedder = _embedder()
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embedder.embed_documents(texts[start:start + batch_size]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def corpus_texts() -> List[str]:
+    """Chunk texts in index order."""
+    store = build_or_load_index()
+    return [store.docstore.search(doc_id).page_content for _, doc_id in sorted(store.index_to_docstore_id.items())]
+
+
+def sample_queries(texts: List[str], n: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [t[:QUERY_CHARS] for t in rng.sample(texts, min(n, len(texts)))]
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Mean fraction of the exact top-k that the approximate top-k recovered."""
+    k = truth.shape[1]
+    hits = [len(set(f[f >= 0]) & set(t[t >= 0])) / k for f, t in zip(found, truth)]
+    return float(np.mean(hits))
+
+
+def build_index(vectors: np.ndarray, kind: str) -> faiss.Index:
+    """Index of type `kind` holding `vectors`, trained on (a sample of) them."""
+    train = vectors if len(vectors) <= settings.INDEX_TRAIN_SIZE else vectors[
+        np.random.default_rng(0).choice(len(vectors), settings.INDEX_TRAIN_SIZE, replace=False)
+    ]
+    index = trained_index(train, kind)
+    index.add(vectors)
+    return index
+
+
+def _latency_ms(index: faiss.Index, queries: np.ndarray, k: int) -> Dict[str, float]:
+    # One query at a time, as the chat path searches
+    timings = []
+    for q in queries:
+        started = time.perf_counter()
+        index.search(q.reshape(1, -1), k)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 4),
+        "p95_ms": round(float(np.percentile(timings, 95)), 4),
+    }
+
+
+def benchmark(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    types: List[str],
+    nprobes: List[int],
+    ef_searches: List[int],
+) -> List[Dict[str, object]]:
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    rows: List[Dict[str, object]] = []
+    for kind in types:
+        started = time.perf_counter()
+        index = build_index(vectors, kind)
+        build_s = time.perf_counter() - started
+        size = index_nbytes(index)
+
+        if kind in ("ivf_flat", "ivf_pq"):
+            variants = [{"nprobe": n} for n in nprobes]
+        elif kind == "hnsw":
+            variants = [{"ef_search": ef} for ef in ef_searches]
+        else:
+            variants = [{}]
+
+        for params in variants:
+            configure_search(index, **params)
+            _, found = index.search(queries, k)
+            rows.append({
+                "type": kind,
+                "params": params,
+                f"recall@{k}": round(recall_at_k(found, truth), 4),
+                **_latency_ms(index, queries, k),
+                "size_mb": round(size / 2 ** 20, 3),
+                "build_s": round(build_s, 3),
+            })
+    return rows
+
+
+def format_table(rows: List[Dict[str, object]]) -> str:
+    headers = list(rows[0].keys())
+    cells = [[json.dumps(r[h]) if isinstance(r[h], dict) else str(r[h]) for h in headers] for r in rows]
+    widths = [max(len(h), *(len(c[i]) for c in cells)) for i, h in enumerate(headers)]
+    lines = ["  ".join(h.ljust(w) for h, w in zip(headers, widths))]
+    lines += ["  ".join(c.ljust(w) for c, w in zip(row, widths)) for row in cells]
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recall/latency/memory report for the FAISS index types.")
+    parser.add_argument("--types", default=",".join(INDEX_TYPES), help="comma-separated index types")
+    parser.add_argument("--k", type=int, default=settings.TOP_K)
+    parser.add_argument("--nprobe", type=_int_list, default=[settings.INDEX_NPROBE], help="IVF nprobe values, e.g. 1,8,32")
+    parser.add_argument("--ef-search", type=_int_list, default=[settings.INDEX_EF_SEARCH], help="HNSW efSearch values")
+    parser.add_argument("--queries", help="file with one query per line (default: sampled chunk openings)")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--json", help="also write the rows to this file")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = set(types) - set(INDEX_TYPES)
+    if unknown:
+        parser.error(f"unknown index types: {', '.join(sorted(unknown))}")
+
+    texts = corpus_texts()
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            query_texts = [line.strip() for line in f if line.strip()]
+    else:
+        query_texts = sample_queries(texts, args.num_queries)
+
+    logger.info("Embedding %d chunks and %d queries", len(texts), len(query_texts))
+    vectors = _embed(texts)
+    queries = _embed(query_texts)
+
+    rows = benchmark(vectors, queries, min(args.k, len(texts)), types, args.nprobe, args.ef_search)
+    print(format_table(rows))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"chunks": len(texts), "queries": len(query_texts), "rows": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
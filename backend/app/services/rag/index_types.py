@@ -0,0 +1,113 @@
+# app/services/rag/index_types.py
+"""
+FAISS index variants selectable with settings.INDEX_TYPE.
+
+    flat      exact search, float32 vectors (default)
+    hnsw      graph index: fast approximate search, no training, no in-place deletes
+    ivf_flat  inverted lists over float32 vectors, needs training, searched with nprobe
+    ivf_pq    inverted lists over product-quantized codes: smallest, needs training
+    sq_fp16   exact scan over float16 vectors (half the memory of flat)
+    sq_int8   exact scan over 8-bit scalar-quantized vectors, needs training
+
+All variants use L2 distance, like the flat index LangChain creates by default.
+"""
+import math
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+from app.core.config import settings
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "sq_fp16", "sq_int8")
+
+# k-means wants roughly this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def _check(kind: str) -> str:
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown INDEX_TYPE {kind!r}, expected one of {', '.join(INDEX_TYPES)}")
+    return kind
+
+
+def index_spec(kind: str = settings.INDEX_TYPE) -> Dict[str, object]:
+    """Build-time parameters of an index type; a change means stored vectors must be rebuilt."""
+    spec: Dict[str, object] = {"type": _check(kind)}
+    if kind == "hnsw":
+        spec.update(m=settings.INDEX_HNSW_M, ef_construction=settings.INDEX_HNSW_EF_CONSTRUCTION)
+    elif kind in ("ivf_flat", "ivf_pq"):
+        spec.update(nlist=settings.INDEX_NLIST)
+        if kind == "ivf_pq":
+            spec.update(pq_m=settings.INDEX_PQ_M, pq_nbits=settings.INDEX_PQ_NBITS)
+    return spec
+
+
+def factory_string(kind: str, dim: int, n_train: Optional[int] = None) -> str:
+    """
+    faiss.index_factory description for `kind`. With n_train, the number of IVF lists
+    and PQ centroids is clamped so that a small corpus can still be trained.
+    """
+    _check(kind)
+    if kind == "flat":
+        return "Flat"
+    if kind == "hnsw":
+        return f"HNSW{settings.INDEX_HNSW_M}"
+    if kind == "sq_fp16":
+        return "SQfp16"
+    if kind == "sq_int8":
+        return "SQ8"
+
+    nlist = settings.INDEX_NLIST
+    nbits = settings.INDEX_PQ_NBITS
+    if n_train is not None:
+        nlist = max(1, min(nlist, n_train // MIN_POINTS_PER_CENTROID))
+        nbits = max(1, min(nbits, int(math.log2(max(n_train // MIN_POINTS_PER_CENTROID, 2)))))
+    if kind == "ivf_flat":
+        return f"IVF{nlist},Flat"
+
+    if dim % settings.INDEX_PQ_M:
+        raise ValueError(f"INDEX_PQ_M={settings.INDEX_PQ_M} must divide the embedding dimension {dim}")
+    return f"IVF{nlist},PQ{settings.INDEX_PQ_M}x{nbits}"
+
+
+def new_index(dim: int, kind: str = settings.INDEX_TYPE, n_train: Optional[int] = None) -> faiss.Index:
+    """Empty index of the given type. Check `is_trained` before adding vectors."""
+    index = faiss.index_factory(dim, factory_string(kind, dim, n_train), faiss.METRIC_L2)
+    if kind == "hnsw":
+        index.hnsw.efConstruction = settings.INDEX_HNSW_EF_CONSTRUCTION
+    return configure_search(index)
+
+
+def trained_index(vectors: np.ndarray, kind: str = settings.INDEX_TYPE) -> faiss.Index:
+    """Empty index of the given type, trained on `vectors` (n x dim float32)."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = new_index(vectors.shape[1], kind, n_train=len(vectors))
+    if not index.is_trained:
+        index.train(vectors)
+    return index
+
+
+def configure_search(
+    index: faiss.Index,
+    nprobe: int = settings.INDEX_NPROBE,
+    ef_search: int = settings.INDEX_EF_SEARCH,
+) -> faiss.Index:
+    """Apply query-time parameters (nprobe for IVF, efSearch for HNSW); other types are left as is."""
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass  # not an IVF index
+    if hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+    return index
+
+
+def supports_remove(index: faiss.Index) -> bool:
+    """HNSW graphs cannot drop vectors in place; everything else here can."""
+    return not hasattr(index, "hnsw")
+
+
+def index_nbytes(index: faiss.Index) -> int:
+    """Serialized size of the index, a close proxy for its resident memory."""
+    return int(faiss.serialize_index(index).nbytes)
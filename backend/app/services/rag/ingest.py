@@ -0,0 +1,407 @@
+# app/services/rag/ingest.py
+"""
+Incremental ingestion of source documents into the persisted FAISS index.
+
+A manifest next to the index records, per source file, its content hash and the ids
+of the chunks it produced. Chunk ids are content hashes, so on each run only chunks
+that are new (or whose text changed) are embedded; chunks from edited or deleted
+sources are removed from the store in place.
+
+The build streams: pages are extracted in a process pool a few page ranges at a
+time, split into chunks as they arrive, and embedded/added to the index in batches
+of INGEST_BATCH_SIZE, so peak memory depends on the batch size rather than the
+size of the corpus (chunk text still ends up in the store's docstore).
+
+    python -m app.services.rag.ingest            # sync index with SOURCES_DIR
+    python -m app.services.rag.ingest --rebuild  # re-embed everything
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.services.rag.bm25 import BM25Index, bm25_path, stored_version
+from app.services.rag.index_types import index_spec, new_index, supports_remove, trained_index
+from app.services.rag.vectorstore import (
+    _embedder,
+    disk_index_version,
+    index_exists,
+    index_lock,
+    load_index,
+    new_docstore,
+    persist_index,
+    vs_holder,
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 2  # 2: SQLite docstore instead of index.pkl
+PAGES_PER_TASK = 8  # pages extracted per process-pool task
+PROGRESS_EVERY = 10  # log progress every N embedding batches
+
+
+@dataclass
+class IngestReport:
+    added_sources: List[str] = field(default_factory=list)
+    changed_sources: List[str] = field(default_factory=list)
+    removed_sources: List[str] = field(default_factory=list)
+    chunks_added: int = 0
+    chunks_removed: int = 0
+    pages_parsed: int = 0
+    full_rebuild: bool = False
+    seconds: float = 0.0
+
+
+def chunk_id(source: str, text: str) -> str:
+    """Stable id for a chunk: the same text from the same source always maps to the same id."""
+    return hashlib.sha1(f"{source}\n{text}".encode("utf-8")).hexdigest()
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def discover_sources() -> Dict[str, Path]:
+    """All PDFs under SOURCES_DIR (plus PDF_PATH), keyed by their path relative to the backend dir."""
+    sources: Dict[str, Path] = {}
+    root = Path(settings.SOURCES_DIR)
+    if root.is_dir():
+        for path in sorted(root.rglob("*.pdf")):
+            sources[path.as_posix()] = path
+    pdf = Path(settings.PDF_PATH)
+    if pdf.is_file():
+        sources.setdefault(pdf.as_posix(), pdf)
+    return sources
+
+
+def _page_count(path: Path) -> int:
+    return len(PdfReader(str(path)).pages)
+
+
+def _extract_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Process-pool task: text of pages [start, stop) of one PDF."""
+    reader = PdfReader(path)
+    return [(i, reader.pages[i].extract_text() or "") for i in range(start, stop)]
+
+
+def iter_pages(
+    sources: Iterable[Tuple[str, Path]],
+    workers: int = settings.INGEST_WORKERS,
+) -> Iterator[Document]:
+    """
+    Yield one Document per page, in source/page order, while later page ranges are
+    extracted in parallel. At most ~2 tasks per worker are in flight, which bounds
+    how many parsed pages sit in memory at once. With workers=1 pages are parsed in
+    this process, without forking.
+    """
+    tasks = []
+    for source, path in sources:
+        total = _page_count(path)
+        for start in range(0, total, PAGES_PER_TASK):
+            tasks.append((source, str(path), start, min(start + PAGES_PER_TASK, total), total))
+    if not tasks:
+        return
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers == 1:
+        for source, path, start, stop, total in tasks:
+            for page, text in _extract_pages(path, start, stop):
+                yield Document(page_content=text, metadata={"source": source, "page": page, "total_pages": total})
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        queued = iter(tasks)
+        for task in queued:
+            pending.append((task, pool.submit(_extract_pages, *task[1:4])))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            (source, _, _, _, total), future = pending.popleft()
+            for task in queued:  # refill one slot
+                pending.append((task, pool.submit(_extract_pages, *task[1:4])))
+                break
+            for page, text in future.result():
+                yield Document(
+                    page_content=text,
+                    metadata={"source": source, "page": page, "total_pages": total},
+                )
+
+
+def iter_chunks(
+    pages: Iterable[Document],
+    seen: Optional[Dict[str, Set[str]]] = None,
+    chunk_size: Optional[int] = None,
+    chunk_overlap: Optional[int] = None,
+) -> Iterator[Document]:
+    """Split pages into chunks carrying their content-hash id in metadata["chunk_id"]."""
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size or settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap,
+    )
+    seen = {} if seen is None else seen
+    for page in pages:
+        source = page.metadata["source"]
+        source_seen = seen.setdefault(source, set())
+        for doc in splitter.split_documents([page]):
+            cid = chunk_id(source, doc.page_content)
+            if cid in source_seen:  # identical boilerplate (headers, footers) is only indexed once
+                continue
+            source_seen.add(cid)
+            doc.metadata["chunk_id"] = cid
+            yield doc
+
+
+def split_source(source: str, path: Path) -> List[Document]:
+    """All chunks of one source (convenience wrapper over the streaming pipeline)."""
+    return list(iter_chunks(iter_pages([(source, path)])))
+
+
+def _batched(items: Iterable[Document], size: int) -> Iterator[List[Document]]:
+    batch: List[Document] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _configure_torch_threads(threads: int) -> None:
+    if threads <= 0:
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def _manifest_path() -> Path:
+    return Path(settings.INDEX_DIR) / MANIFEST_NAME
+
+
+def _index_params() -> Dict[str, object]:
+    # Any change here invalidates every stored vector/chunk
+    backend = settings.EMBED_BACKEND
+    if backend == "onnx" and settings.ONNX_QUANTIZE:
+        backend += "-int8"  # quantized weights give slightly different vectors
+    return {
+        "embed_model": settings.EMBED_MODEL,
+        "embed_backend": backend,
+        "chunk_size": settings.CHUNK_SIZE,
+        "chunk_overlap": settings.CHUNK_OVERLAP,
+        "index": index_spec(),
+    }
+
+
+def load_manifest() -> Optional[dict]:
+    path = _manifest_path()
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("params") != _index_params():
+        return None
+    return manifest
+
+
+def _write_manifest(manifest: dict) -> None:
+    path = _manifest_path()
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _empty_store() -> FAISS:
+    embedder = _embedder()
+    dim = len(embedder.embed_query("dimension probe"))
+    return FAISS(embedder, new_index(dim), new_docstore(), {})
+
+
+def _add_batch(store: FAISS, batch: List[Document], vectors: List[List[float]]) -> None:
+    store.add_embeddings(
+        list(zip([c.page_content for c in batch], vectors)),
+        metadatas=[c.metadata for c in batch],
+        ids=[c.metadata["chunk_id"] for c in batch],
+    )
+
+
+def _sync_bm25(store: FAISS, version: str) -> None:
+    """(Re)build the lexical index from the docstore unless it already matches this index version."""
+    path = bm25_path()
+    if stored_version(path) == version:
+        return
+    started = time.perf_counter()
+    index = BM25Index.build(store.docstore.iter_texts(), version=version)
+    index.save(path)
+    logger.info("Built BM25 index over %d chunks (%d terms) in %.2fs",
+                len(index), index.n_terms, time.perf_counter() - started)
+
+
+def sync_index(
+    rebuild: bool = False,
+    batch_size: int = settings.INGEST_BATCH_SIZE,
+    workers: int = settings.INGEST_WORKERS,
+) -> IngestReport:
+    """Bring the persisted index in line with the current sources and swap it in."""
+    with index_lock:  # one build at a time per host (threads and processes)
+        return _sync_index(rebuild, batch_size, workers)
+
+
+def _sync_index(rebuild: bool, batch_size: int, workers: int) -> IngestReport:
+    started = time.perf_counter()
+    report = IngestReport()
+
+    manifest = None if rebuild else load_manifest()
+    if manifest is None or not index_exists():
+        # First run, legacy index without a manifest, or changed chunking/model/format
+        manifest = {"version": MANIFEST_VERSION, "params": _index_params(), "sources": {}}
+        report.full_rebuild = True
+
+    known: Dict[str, dict] = manifest["sources"]
+    current = discover_sources()
+
+    to_remove: List[str] = []
+    for source in sorted(set(known) - set(current)):
+        to_remove.extend(known.pop(source)["chunks"])
+        report.removed_sources.append(source)
+
+    # Sources that are new or whose bytes changed, with the chunk ids they had before
+    changed: List[Tuple[str, Path]] = []
+    hashes: Dict[str, str] = {}
+    old_ids: Dict[str, Set[str]] = {}
+    for source, path in current.items():
+        sha = file_sha256(path)
+        previous = known.get(source)
+        if previous is not None and previous["sha256"] == sha:
+            continue
+        changed.append((source, path))
+        hashes[source] = sha
+        old_ids[source] = set(previous["chunks"]) if previous else set()
+        (report.changed_sources if previous else report.added_sources).append(source)
+
+    if not (report.full_rebuild or to_remove or changed):
+        # Up to date: serve the persisted index as is
+        vs_holder.swap(load_index(), disk_index_version())
+        _sync_bm25(vs_holder.store, vs_holder.version)
+        report.seconds = round(time.perf_counter() - started, 2)
+        return report
+
+    store = _empty_store() if report.full_rebuild else load_index(writable=True)
+    if not supports_remove(store.index) and (to_remove or any(old_ids.values())):
+        # HNSW cannot drop vectors in place, so any removal means rebuilding from scratch
+        logger.info("Index type %s cannot delete chunks in place; rebuilding", settings.INDEX_TYPE)
+        store.docstore.close()
+        return _sync_index(True, batch_size, workers)
+
+    if to_remove:
+        store.delete(to_remove)
+
+    if changed:
+        _configure_torch_threads(settings.INGEST_TORCH_THREADS)
+        embedder = _embedder()
+        new_ids: Dict[str, List[str]] = {source: [] for source, _ in changed}
+
+        def counted(pages: Iterator[Document]) -> Iterator[Document]:
+            for page in pages:
+                report.pages_parsed += 1
+                yield page
+
+        def unseen(chunks: Iterator[Document]) -> Iterator[Document]:
+            # Record every chunk for the manifest; only chunks not already indexed need embedding
+            for chunk in chunks:
+                source, cid = chunk.metadata["source"], chunk.metadata["chunk_id"]
+                new_ids[source].append(cid)
+                if cid not in old_ids[source]:
+                    yield chunk
+
+        # IVF/PQ/SQ8 indexes are trained on the first INDEX_TRAIN_SIZE vectors, held back until then
+        untrained: List[Tuple[List[Document], List[List[float]]]] = []
+
+        def train_and_flush() -> None:
+            vectors = np.array([v for _, batch_vectors in untrained for v in batch_vectors], dtype=np.float32)
+            logger.info("Training %s index on %d vectors", settings.INDEX_TYPE, len(vectors))
+            store.index = trained_index(vectors)
+            for batch, batch_vectors in untrained:
+                _add_batch(store, batch, batch_vectors)
+            untrained.clear()
+
+        for n, batch in enumerate(_batched(unseen(iter_chunks(counted(iter_pages(changed, workers)))), batch_size), 1):
+            vectors = embedder.embed_documents([c.page_content for c in batch])
+            if store.index.is_trained:
+                _add_batch(store, batch, vectors)
+            else:
+                untrained.append((batch, vectors))
+                if sum(len(b) for b, _ in untrained) >= settings.INDEX_TRAIN_SIZE:
+                    train_and_flush()
+            report.chunks_added += len(batch)
+            if n % PROGRESS_EVERY == 0:
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    "Indexed %d chunks from %d pages (%.1f chunks/s)",
+                    report.chunks_added, report.pages_parsed, report.chunks_added / elapsed,
+                )
+
+        if untrained:
+            train_and_flush()
+
+        stale: List[str] = []
+        for source, _ in changed:
+            stale.extend(old_ids[source] - set(new_ids[source]))
+            known[source] = {"sha256": hashes[source], "chunks": new_ids[source]}
+        if stale:
+            store.delete(stale)
+        to_remove.extend(stale)
+
+    report.chunks_removed = len(to_remove)
+
+    version = persist_index(store)
+    _write_manifest(manifest)
+    # Serve the persisted files (memory-mapped, lazy docstore), not the build copy
+    vs_holder.swap(load_index(), version)
+    _sync_bm25(vs_holder.store, version)
+
+    report.seconds = round(time.perf_counter() - started, 2)
+    logger.info(
+        "Index sync done: +%d / -%d chunks, %d pages parsed in %.2fs",
+        report.chunks_added, report.chunks_removed, report.pages_parsed, report.seconds,
+    )
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync the FAISS index with the source documents.")
+    parser.add_argument("--rebuild", action="store_true", help="ignore the manifest and re-embed everything")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE, help="chunks per embedding batch")
+    parser.add_argument("--workers", type=int, default=settings.INGEST_WORKERS, help="PDF parsing processes (0 = CPUs)")
+    args = parser.parse_args()
+
+    setup_logging()
+    report = sync_index(rebuild=args.rebuild, batch_size=args.batch_size, workers=args.workers)
+    print(json.dumps(report.__dict__, indent=2))
+
+
+if __name__ == "__main__":
+    main()
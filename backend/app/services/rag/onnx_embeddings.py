@@ -0,0 +1,171 @@
+# app/services/rag/onnx_embeddings.py
+"""
+ONNX Runtime embedding backend (EMBED_BACKEND="onnx").
+
+The sentence-transformers model is exported once to ONNX (optionally with dynamic
+int8 weight quantization) under ONNX_MODEL_DIR; serving then only needs
+onnxruntime and the tokenizer, not torch. Pooling follows the exported model's
+sentence-transformers config: mean pooling over the attention mask, then L2
+normalization when the model ends in a Normalize module (all-MiniLM-L6-v2 does),
+so vectors match the torch backend's.
+
+    python -m app.services.rag.onnx_embeddings             # export EMBED_MODEL
+    python -m app.services.rag.onnx_embeddings --quantize  # export + int8 weights
+"""
+import argparse
+import json
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_INFO = "export.json"
+FP32_MODEL = "model.onnx"
+INT8_MODEL = "model.int8.onnx"
+OPSET = 17
+
+
+def model_dir(model_name: str = settings.EMBED_MODEL) -> Path:
+    return Path(settings.ONNX_MODEL_DIR) / model_name.replace("/", "__")
+
+
+def export_model(model_name: str = settings.EMBED_MODEL, quantize: bool = settings.ONNX_QUANTIZE) -> Path:
+    """
+    Export the transformer of a sentence-transformers model to ONNX next to its tokenizer.
+    Needs torch and sentence-transformers; only run at build/deploy time.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    out = model_dir(model_name)
+    out.mkdir(parents=True, exist_ok=True)
+
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = next((m for m in st if isinstance(m, Pooling)), None)
+    if pooling is None or pooling.get_pooling_mode_str() != "mean":
+        raise ValueError(f"{model_name}: only mean-pooling models are supported by the ONNX backend")
+
+    tokenizer = st.tokenizer
+    tokenizer.save_pretrained(out)
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+
+    class TokenEmbeddings(torch.nn.Module):
+        def __init__(self, transformer):
+            super().__init__()
+            self.transformer = transformer
+
+        def forward(self, *inputs):
+            return self.transformer(**dict(zip(input_names, inputs)))[0]
+
+    axes = {0: "batch", 1: "sequence"}
+    fp32_path = out / FP32_MODEL
+    with torch.no_grad():
+        torch.onnx.export(
+            TokenEmbeddings(st[0].auto_model.eval()),
+            tuple(sample[n] for n in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes={n: axes for n in [*input_names, "token_embeddings"]},
+            opset_version=OPSET,
+            do_constant_folding=True,
+            dynamo=False,  # TorchScript exporter: no onnxscript dependency, stable dynamic axes
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(str(fp32_path), str(out / INT8_MODEL), weight_type=QuantType.QInt8)
+
+    info = {
+        "model": model_name,
+        "max_seq_length": st.get_max_seq_length(),
+        "normalize": any(isinstance(m, Normalize) for m in st),
+        "inputs": input_names,
+    }
+    with open(out / EXPORT_INFO, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+    logger.info("Exported %s to %s%s", model_name, out, " (+int8)" if quantize else "")
+    return out
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings computed with ONNX Runtime on CPU."""
+
+    def __init__(
+        self,
+        model_name: str = settings.EMBED_MODEL,
+        quantize: bool = settings.ONNX_QUANTIZE,
+        intra_op_threads: int = settings.ONNX_INTRA_OP_THREADS,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = model_dir(model_name)
+        onnx_file = path / (INT8_MODEL if quantize else FP32_MODEL)
+        if not onnx_file.exists():
+            logger.info("No ONNX export of %s found, exporting now", model_name)
+            export_model(model_name, quantize=quantize)
+
+        with open(path / EXPORT_INFO, encoding="utf-8") as f:
+            info = json.load(f)
+        self.max_seq_length: int = info["max_seq_length"]
+        self.normalize: bool = info["normalize"]
+        self.input_names: List[str] = info["inputs"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.inter_op_num_threads = 1
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(str(onnx_file), options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(str(path))
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """(n, dim) float32 sentence embeddings."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_seq_length,
+            return_tensors="np",
+        )
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        tokens = self.session.run(None, feeds)[0]
+
+        mask = encoded["attention_mask"][..., None].astype(np.float32)
+        vectors = (tokens * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors.astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX.")
+    parser.add_argument("--model", default=settings.EMBED_MODEL)
+    parser.add_argument("--quantize", action="store_true", default=settings.ONNX_QUANTIZE, help="also write int8 weights")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    print(export_model(args.model, quantize=args.quantize))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,367 @@
 ﻿# app/services/rag/qa_service.py
-from typing import Dict
-from app.domain.ports import ChatHistoryPort, RetrieverPort, LLMPort
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from app.domain.ports import (
+    AnswerCachePort,
+    AsyncChatHistoryPort,
+    AsyncLLMPort,
+    ChatHistoryPort,
+    LLMPort,
+    RetrievedChunk,
+    RetrieverPort,
+    SummaryStorePort,
+)
+from app.core import metrics
+from app.core.concurrency import call_maybe_async, run_blocking
+from app.core.config import settings
+from app.services.rag.context_packer import ContextPacker
+from app.services.rag.summarizer import ConversationSummarizer
+from app.services.rag.tokens import estimate_tokens, fit_history
 
-PROMPT = """You are a friendly legal assistant. Use ONLY the context to answer.
-If not in context, say you don't know.
+logger = logging.getLogger(__name__)
+
+PROMPT = """You are a friendly legal assistant. Use ONLY the context to answer. If not in the context, say you don't know.
 
 Context:
 {ctx}
 
-Conversation so far:
+{summary}Conversation so far:
 {hist}
 
 User question:
 {q}
 
-Answer clearly and concisely:
-"""
+Answer clearly and concisely:"""
 
 class QAService:
-    def __init__(self, retriever: RetrieverPort, llm: LLMPort, history: ChatHistoryPort):
+    def __init__(
+        self,
+        retriever: RetrieverPort,
+        llm: Union[AsyncLLMPort, LLMPort],
+        history: Union[AsyncChatHistoryPort, ChatHistoryPort],
+        cache: Optional[AnswerCachePort] = None,
+        history_limit: int = settings.HISTORY_FETCH_LIMIT,
+        history_token_budget: int = settings.HISTORY_TOKEN_BUDGET,
+        summaries: Optional[SummaryStorePort] = None,
+        summarizer: Optional[ConversationSummarizer] = None,
+        batch_concurrency: int = settings.BATCH_LLM_CONCURRENCY,
+        packer: Optional[ContextPacker] = None,
+    ):
         self.retriever = retriever
         self.llm = llm
         self.history = history
+        self.cache = cache
+        self.history_limit = history_limit
+        self.history_token_budget = history_token_budget
+        self.summaries = summaries
+        self.summarizer = summarizer
+        self.batch_concurrency = batch_concurrency
+        self.packer = packer or ContextPacker()
+        # A remote retriever blocks on a socket rather than the CPU
+        self._remote = getattr(retriever, "io_bound", False)
+
+    async def _history(self, method: str, *args: Any) -> Any:
+        """Call a history method whether the adapter is async (Mongo) or sync (in-memory)."""
+        return await call_maybe_async(getattr(self.history, method), *args)
+
+    async def _conversation(self, chat_id: str) -> Tuple[Optional[str], List[str], bool]:
+        """
+        (rolling summary, recent messages, first turn) for the prompt.
+        Only the newest messages that fit the history token budget are kept, in
+        chronological order. The store only returns the last `history_limit` messages,
+        so the cost of a turn no longer grows with the length of the conversation;
+        anything older, or too long for the budget, is represented by the
+        background-maintained summary.
+        """
+        with metrics.stage(metrics.HISTORY_GET):
+            if self.summaries is None:
+                messages, stored = await self._history("get", chat_id, self.history_limit), None
+            else:
+                messages, stored = await asyncio.gather(
+                    self._history("get", chat_id, self.history_limit), self.summaries.get(chat_id)
+                )
+        summary = stored.text if stored is not None else None
+
+        return summary, fit_history(messages, self.history_token_budget), not messages
+
+    async def _store_turn(self, chat_id: str, question: str, answer: str) -> None:
+        with metrics.stage(metrics.HISTORY_APPEND):
+            await self._history("append", chat_id, question, answer)
+        if self.summarizer is not None:
+            self.summarizer.schedule(chat_id)
+
+    async def _lookup(self, question: str) -> Optional[dict]:
+        with metrics.stage(metrics.CACHE_LOOKUP):
+            return await self.cache.lookup(question)
+
+    async def _retrieve(self, question: str, k: int | None) -> List[RetrievedChunk]:
+        with metrics.stage(metrics.RETRIEVE):
+            # The retriever uses its default depth if k is None
+            if hasattr(self.retriever, "atopk_chunks"):
+                return await self.retriever.atopk_chunks(question, k)
+            return await run_blocking(self.retriever.topk_chunks, question, k, io_bound=self._remote)
+
+    async def _retrieve_many(self, questions: List[str], k: int | None) -> List[List[RetrievedChunk]]:
+        with metrics.stage(metrics.RETRIEVE):
+            return await run_blocking(self.retriever.topk_many, questions, k, io_bound=self._remote)
+
+    async def _context(self, question: str, chunks: List[RetrievedChunk]) -> List[str]:
+        if self.packer.sentence_filter:  # runs the embedding model
+            return await run_blocking(self.packer.pack, question, chunks, io_bound=self.packer.io_bound)
+        return self.packer.pack(question, chunks)
+
+    async def _prompt(
+        self, question: str, chunks: List[RetrievedChunk], history: List[str], summary: Optional[str]
+    ) -> str:
+        with metrics.stage(metrics.PROMPT_BUILD):
+            prompt = self._build_prompt(question, await self._context(question, chunks), history, summary)
+        metrics.PROMPT_TOKENS.observe(estimate_tokens(prompt))
+        return prompt
 
-    def answer(self, chat_id: str, question: str, k: int | None = None) -> dict:
-        ctx_docs = self.retriever.topk(question, k)  # retriever will use its default if k is None
-        hist_text = "\n".join(self.history.get(chat_id)) or "(no prior turns)"
-        ctx_text = '\n\n'.join(ctx_docs) or '(no context)'
-        prompt = (
-            "You are a friendly legal assistant. Use ONLY the context to answer. "
-            "If not in the context, say you don't know.\n\n"
-            f"Context:\n{ctx_text}\n\n"
-            f"Conversation so far:\n{hist_text}\n\n"
-            f"User question:\n{question}\n\n"
-            "Answer clearly and concisely:"
+    async def _generate(self, prompt: str) -> str:
+        with metrics.stage(metrics.LLM):
+            if hasattr(self.llm, "agenerate"):
+                answer = await self.llm.agenerate(prompt)
+            else:
+                answer = await asyncio.to_thread(self.llm.generate, prompt)
+        metrics.RESPONSE_TOKENS.observe(estimate_tokens(answer))
+        return answer
+
+    def _stream(self, prompt: str) -> AsyncIterator[str]:
+        if hasattr(self.llm, "astream"):
+            return self.llm.astream(prompt)
+        return _iterate_in_thread(self.llm.stream(prompt))
+
+    async def _begin_turn(
+        self, chat_id: str, question: str, k: int | None
+    ) -> Tuple[Optional[str], List[str], bool, Optional[dict], List[RetrievedChunk]]:
+        """
+        (summary, history, use_cache, cache hit, chunks) for a new turn.
+        Retrieval does not depend on the conversation, so it starts right away while
+        the conversation is read and the cache is checked. A cache hit cancels it and
+        is returned without chunks, even if retrieval has failed in the meantime.
+        """
+        retrieval = asyncio.create_task(self._retrieve(question, k))
+        try:
+            summary, history, first_turn = await self._conversation(chat_id)
+            use_cache = self._cacheable(first_turn, k)
+            hit = await self._lookup(question) if use_cache else None
+        except BaseException:
+            _abandon(retrieval)
+            raise
+        if hit is not None:
+            _abandon(retrieval)
+            return summary, history, use_cache, hit, []
+        return summary, history, use_cache, None, await retrieval
+
+    def _build_prompt(
+        self, question: str, ctx_docs: List[str], history: List[str], summary: Optional[str] = None
+    ) -> str:
+        return PROMPT.format(
+            ctx="\n\n".join(ctx_docs) or "(no context)",
+            summary=f"Summary of earlier conversation:\n{summary}\n\n" if summary else "",
+            hist="\n".join(history) or "(no prior turns)",
+            q=question,
         )
-        answer = self.llm.generate(prompt)
-        self.history.append(chat_id, question, answer)
-        return {"chat_id": chat_id, "answer": answer, "retrieved_chunks": [c[:500] for c in ctx_docs]}
+
+    def _cacheable(self, first_turn: bool, k: int | None) -> bool:
+        # Cached answers are only valid for a first turn with the default retrieval depth
+        return self.cache is not None and first_turn and k is None
+
+    async def answer(self, chat_id: str, question: str, k: int | None = None) -> dict:
+        with metrics.IN_FLIGHT.labels("answer").track_inprogress():
+            summary, history, use_cache, hit, chunks = await self._begin_turn(chat_id, question, k)
+            if hit is not None:
+                await self._store_turn(chat_id, question, hit["answer"])
+                return _cached_result(chat_id, hit)
+
+            prompt = await self._prompt(question, chunks, history, summary)
+            answer = await self._generate(prompt)
+            return await self._finish_turn(chat_id, question, answer, chunks, use_cache)
+
+    async def _finish_turn(
+        self, chat_id: str, question: str, answer: str, chunks: List[RetrievedChunk], use_cache: bool
+    ) -> dict:
+        await self._store_turn(chat_id, question, answer)
+        metrics.ANSWERS.labels("llm").inc()
+        if use_cache and answer:
+            await self.cache.store(
+                question, [c.id for c in chunks], {"answer": answer, "chunks": [c.describe() for c in chunks]}
+            )
+        return {"chat_id": chat_id, "answer": answer, "retrieved_chunks": [c.text[:500] for c in chunks]}
+
+    async def answer_many(self, items: List[Tuple[str, str]], k: int | None = None) -> List[dict]:
+        """
+        answer() for a batch of (chat_id, question) pairs; results are in input order.
+        Failed items get {"chat_id", "error"} instead of failing the whole batch.
+        """
+        results: List[dict] = [{}] * len(items)
+        async for index, result in self.answer_many_stream(items, k):
+            results[index] = result
+        return results
+
+    async def answer_many_stream(
+        self, items: List[Tuple[str, str]], k: int | None = None
+    ) -> AsyncIterator[Tuple[int, dict]]:
+        """
+        Batch answering, yielding (input index, result) as each item completes.
+
+        Questions are retrieved in batches with topk_many (one batched embedding pass
+        and one multi-query index search each) while the conversations of the first
+        turns are fetched and checked against the cache; only first turns that could be
+        cache hits wait for that check, and are retrieved in a second batch if they miss.
+        Turns of the same chat are answered in input order so each sees the previous
+        one in its history; different chats run concurrently, with at most
+        `batch_concurrency` LLM calls in flight.
+        """
+        chats: Dict[str, List[int]] = {}
+        for index, (chat_id, _) in enumerate(items):
+            chats.setdefault(chat_id, []).append(index)
+
+        async def retrieve(indices: List[int]) -> Dict[int, Any]:
+            """Chunks per item index, or the exception that failed their batch."""
+            if not indices:
+                return {}
+            try:
+                found = await self._retrieve_many([items[i][1] for i in indices], k)
+            except Exception as e:
+                logger.error("Batch retrieval failed", exc_info=e)
+                return {i: e for i in indices}
+            return dict(zip(indices, found))
+
+        async def start_chat(chat_id: str) -> Tuple[Tuple[Optional[str], List[str], bool], Optional[dict]]:
+            conversation = await self._conversation(chat_id)
+            hit = None
+            if self._cacheable(conversation[2], k):
+                hit = await self._lookup(items[chats[chat_id][0]][1])
+            return conversation, hit
+
+        # Later turns of a chat are never cache hits, and nothing is when caching is off
+        maybe_cached = {indices[0] for indices in chats.values()} if self._cacheable(True, k) else set()
+        eager = asyncio.create_task(retrieve([i for i in range(len(items)) if i not in maybe_cached]))
+        try:
+            firsts = await asyncio.gather(*(start_chat(chat_id) for chat_id in chats), return_exceptions=True)
+            misses = [
+                indices[0] for indices, first in zip(chats.values(), firsts)
+                if indices[0] in maybe_cached and not isinstance(first, BaseException) and first[1] is None
+            ]
+            eager_found, late_found = await asyncio.gather(eager, retrieve(misses))
+        except BaseException:
+            _abandon(eager)
+            raise
+        found = {**eager_found, **late_found}
+        firsts_by_chat = dict(zip(chats, firsts))
+
+        queue: asyncio.Queue = asyncio.Queue()
+        in_flight = metrics.IN_FLIGHT.labels("batch")
+        llm_slots = asyncio.Semaphore(self.batch_concurrency)
+
+        async def run_chat(chat_id: str, indices: List[int], first: Any) -> None:
+            for position, index in enumerate(indices):
+                question = items[index][1]
+                in_flight.inc()
+                try:
+                    if position == 0:
+                        if isinstance(first, BaseException):
+                            raise first
+                        (summary, history, first_turn), hit = first
+                    else:
+                        summary, history, first_turn = await self._conversation(chat_id)
+                        hit = None
+                    use_cache = self._cacheable(first_turn, k)
+                    if hit is not None:
+                        await self._store_turn(chat_id, question, hit["answer"])
+                        result = _cached_result(chat_id, hit)
+                    else:
+                        chunks = found[index]
+                        if isinstance(chunks, BaseException):
+                            raise chunks
+                        prompt = await self._prompt(question, chunks, history, summary)
+                        async with llm_slots:
+                            answer = await self._generate(prompt)
+                        result = await self._finish_turn(chat_id, question, answer, chunks, use_cache)
+                except Exception as e:
+                    logger.warning("Batch item %d (chat %s) failed: %s", index, chat_id, e)
+                    result = {"chat_id": chat_id, "error": str(e)}
+                finally:
+                    in_flight.dec()
+                queue.put_nowait((index, result))
+
+        tasks = [
+            asyncio.create_task(run_chat(chat_id, indices, firsts_by_chat[chat_id]))
+            for chat_id, indices in chats.items()
+        ]
+        try:
+            for _ in range(len(items)):
+                yield await queue.get()
+        finally:
+            for task in tasks:  # client went away mid-stream
+                task.cancel()
+
+    async def answer_stream(self, chat_id: str, question: str, k: int | None = None) -> AsyncIterator[dict]:
+        """
+        Streaming variant of answer().
+        Yields a "chunks" event with the retrieved context metadata, then one "token"
+        event per piece of generated text, then "done". History is only written once
+        the whole answer has been generated, so an aborted stream leaves no half turn.
+        """
+        with metrics.IN_FLIGHT.labels("stream").track_inprogress():
+            summary, history, use_cache, hit, chunks = await self._begin_turn(chat_id, question, k)
+            if hit is not None:
+                yield {"event": "chunks", "data": {"chat_id": chat_id, "chunks": hit["chunks"]}}
+                yield {"event": "token", "data": {"text": hit["answer"]}}
+                await self._store_turn(chat_id, question, hit["answer"])
+                metrics.ANSWERS.labels("cache").inc()
+                yield {"event": "done", "data": {"chat_id": chat_id, "cached": True}}
+                return
+
+            chunk_meta = [c.describe() for c in chunks]
+            yield {"event": "chunks", "data": {"chat_id": chat_id, "chunks": chunk_meta}}
+
+            prompt = await self._prompt(question, chunks, history, summary)
+
+            parts: List[str] = []
+            started = time.perf_counter()
+            async for piece in self._stream(prompt):
+                if not parts:
+                    metrics.observe_stage(metrics.LLM_FIRST_TOKEN, time.perf_counter() - started)
+                parts.append(piece)
+                yield {"event": "token", "data": {"text": piece}}
+            metrics.observe_stage(metrics.LLM, time.perf_counter() - started)
+
+            answer = "".join(parts)
+            metrics.RESPONSE_TOKENS.observe(estimate_tokens(answer))
+            await self._store_turn(chat_id, question, answer)
+            metrics.ANSWERS.labels("llm").inc()
+            if use_cache and answer:
+                await self.cache.store(question, [c.id for c in chunks], {"answer": answer, "chunks": chunk_meta})
+            yield {"event": "done", "data": {"chat_id": chat_id}}
+
+
+def _cached_result(chat_id: str, hit: dict) -> dict:
+    metrics.ANSWERS.labels("cache").inc()
+    return {
+        "chat_id": chat_id,
+        "answer": hit["answer"],
+        "retrieved_chunks": [c["preview"] for c in hit["chunks"]],
+        "cached": True,
+    }
+
+
+def _abandon(task: asyncio.Task) -> None:
+    """Cancel a task whose result is no longer needed, without logging its exception."""
+    task.cancel()
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+
+async def _iterate_in_thread(iterable: Iterable[str]) -> AsyncIterator[str]:
+    """Drive a blocking iterator from a worker thread so the event loop stays free."""
+    iterator: Iterator[str] = iter(iterable)
+    sentinel = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, sentinel)
+        if item is sentinel:
+            break
+        yield item
@@ -0,0 +1,231 @@
+# app/services/rag/retrieval_bench.py
+"""
+Retrieval quality and speed over a gold question set, for tuning CHUNK_SIZE,
+CHUNK_OVERLAP, TOP_K, EMBED_MODEL and INDEX_TYPE without silently losing answers.
+
+    python -m app.services.rag.retrieval_bench
+    python -m app.services.rag.retrieval_bench --chunk-sizes 500,1000,1500 --overlaps 50,100 --types flat,hnsw
+    python -m app.services.rag.retrieval_bench --models sentence-transformers/all-MiniLM-L6-v2,BAAI/bge-small-en-v1.5
+    python -m app.services.rag.retrieval_bench --json base.json
+    python -m app.services.rag.retrieval_bench --types hnsw --baseline base.json   # exits 1 on a recall drop
+
+For every combination of model, chunk size, overlap and index type, the sources are
+re-chunked and re-embedded from scratch (pages are parsed once) and the row reports
+embedding/index build time, index size, per-query embedding and search latency, and
+recall@k / MRR. A question counts as answered at k when one of the top-k chunks comes
+from one of its gold pages (data/eval/retrieval_gold.json); sections are recorded there
+for whoever edits the set.
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.services.rag.embeddings import EmbeddingService
+from app.services.rag.index_bench import _int_list, build_index, format_table
+from app.services.rag.index_types import INDEX_TYPES, index_nbytes
+from app.services.rag.ingest import discover_sources, iter_chunks, iter_pages
+
+logger = logging.getLogger(__name__)
+
+GOLD_PATH = "data/eval/retrieval_gold.json"
+DEFAULT_K = (1, 3, 5, 10)
+QUALITY_KEYS = ("recall@", "mrr")  # compared against --baseline
+
+
+def _str_list(value: str) -> List[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def load_gold(path: str = GOLD_PATH) -> List[Tuple[str, Set[Tuple[str, int]]]]:
+    """(question, {(source, 0-based page)}) pairs from a gold file."""
+    with open(path, encoding="utf-8") as f:
+        gold = json.load(f)
+    base = gold.get("page_base", 1)
+    items = []
+    for q in gold["questions"]:
+        source = q.get("source", gold.get("source"))
+        items.append((q["question"], {(source, page - base) for page in q["pages"]}))
+    return items
+
+
+def first_hit_ranks(found: np.ndarray, chunks: List[Document], relevant: List[Set[Tuple[str, int]]]) -> List[Optional[int]]:
+    """1-based rank of the first chunk from a relevant page per question (None if not retrieved)."""
+    ranks: List[Optional[int]] = []
+    for ids, pages in zip(found, relevant):
+        rank = None
+        for position, i in enumerate(ids):
+            if i < 0:
+                continue
+            meta = chunks[i].metadata
+            if (meta["source"], meta["page"]) in pages:
+                rank = position + 1
+                break
+        ranks.append(rank)
+    return ranks
+
+
+def recall_at_k(ranks: List[Optional[int]], k: int) -> float:
+    return float(np.mean([r is not None and r <= k for r in ranks]))
+
+
+def mrr(ranks: List[Optional[int]]) -> float:
+    return float(np.mean([1 / r if r else 0.0 for r in ranks]))
+
+
+def _ms(timings: List[float], q: int) -> float:
+    return round(float(np.percentile(timings, q)) * 1000, 4)
+
+
+def benchmark(
+    pages: List[Document],
+    gold: List[Tuple[str, Set[Tuple[str, int]]]],
+    model: str,
+    chunk_size: int,
+    overlap: int,
+    types: List[str],
+    ks: List[int],
+    batch_size: int = settings.INGEST_BATCH_SIZE,
+) -> List[Dict[str, object]]:
+    embedder = EmbeddingService(model_name=model, batch_max_size=1).model
+    questions = [q for q, _ in gold]
+    relevant = [pages for _, pages in gold]
+
+    chunks = list(iter_chunks(pages, chunk_size=chunk_size, chunk_overlap=overlap))
+    texts = [c.page_content for c in chunks]
+    embedder.embed_documents(texts[:batch_size])  # model load and warm-up are not build time
+    started = time.perf_counter()
+    vectors: List[List[float]] = []
+    for start in range(0, len(texts), batch_size):
+        vectors.extend(embedder.embed_documents(texts[start:start + batch_size]))
+    embed_s = time.perf_counter() - started
+    vectors = np.asarray(vectors, dtype=np.float32)
+
+    # One query at a time, as the chat path embeds (uncached) and searches
+    query_vectors, embed_timings = [], []
+    for question in questions:
+        started = time.perf_counter()
+        query_vectors.append(embedder.embed_query(question))
+        embed_timings.append(time.perf_counter() - started)
+    queries = np.asarray(query_vectors, dtype=np.float32)
+
+    ks = sorted(k for k in ks if k <= len(chunks)) or [len(chunks)]
+    rows: List[Dict[str, object]] = []
+    for kind in types:
+        started = time.perf_counter()
+        index = build_index(vectors, kind)
+        index_s = time.perf_counter() - started
+
+        search: Dict[str, float] = {}
+        for k in ks:
+            timings = []
+            for q in queries:
+                t = time.perf_counter()
+                index.search(q.reshape(1, -1), k)
+                timings.append(time.perf_counter() - t)
+            search[f"search@{k}_p50_ms"] = _ms(timings, 50)
+        _, found = index.search(queries, ks[-1])
+        ranks = first_hit_ranks(found, chunks, relevant)
+
+        rows.append({
+            "model": model.rsplit("/", 1)[-1],
+            "chunk": chunk_size,
+            "overlap": overlap,
+            "type": kind,
+            "chunks": len(chunks),
+            "embed_s": round(embed_s, 3),
+            "index_s": round(index_s, 3),
+            "size_mb": round(index_nbytes(index) / 2 ** 20, 3),
+            "q_embed_p50_ms": _ms(embed_timings, 50),
+            "q_embed_p95_ms": _ms(embed_timings, 95),
+            **search,
+            **{f"recall@{k}": round(recall_at_k(ranks, k), 4) for k in ks},
+            "mrr": round(mrr(ranks), 4),
+        })
+    return rows
+
+
+def _config_key(row: Dict[str, object]) -> Tuple[object, ...]:
+    return row["model"], row["chunk"], row["overlap"], row["type"]
+
+
+def compare(rows: List[Dict[str, object]], baseline: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    """Quality change per configuration present in both runs (negative is worse)."""
+    before = {_config_key(row): row for row in baseline}
+    deltas = []
+    for row in rows:
+        old = before.get(_config_key(row))
+        if old is None:
+            continue
+        quality = {
+            f"d_{key}": round(row[key] - old[key], 4)
+            for key in row if key.startswith(QUALITY_KEYS) and key in old
+        }
+        deltas.append({"model": row["model"], "chunk": row["chunk"], "overlap": row["overlap"], "type": row["type"], **quality})
+    return deltas
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Recall@k/MRR and latency of retrieval over a gold question set.")
+    parser.add_argument("--gold", default=GOLD_PATH, help="gold question file")
+    parser.add_argument("--models", type=_str_list, default=[settings.EMBED_MODEL], help="comma-separated embedding models")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[settings.CHUNK_SIZE])
+    parser.add_argument("--overlaps", type=_int_list, default=[settings.CHUNK_OVERLAP])
+    parser.add_argument("--types", type=_str_list, default=[settings.INDEX_TYPE], help="comma-separated index types")
+    parser.add_argument("--k", type=_int_list, default=list(DEFAULT_K), help="cutoffs for recall@k and search time")
+    parser.add_argument("--json", help="also write the rows to this file")
+    parser.add_argument("--baseline", help="rows of an earlier run; exit 1 if recall@k or MRR dropped")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="allowed drop before --baseline fails")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    unknown = set(args.types) - set(INDEX_TYPES)
+    if unknown:
+        parser.error(f"unknown index types: {', '.join(sorted(unknown))}")
+
+    gold = load_gold(args.gold)
+    sources = discover_sources()
+    missing = {source for _, pages in gold for source, _ in pages} - set(sources)
+    if missing:
+        parser.error(f"gold sources not found under SOURCES_DIR: {', '.join(sorted(missing))}")
+    pages = list(iter_pages(sources.items()))
+    logger.info("%d gold questions over %d pages", len(gold), len(pages))
+
+    rows: List[Dict[str, object]] = []
+    for model in args.models:
+        for chunk_size in args.chunk_sizes:
+            for overlap in args.overlaps:
+                if overlap >= chunk_size:
+                    logger.warning("Skipping chunk size %d with overlap %d", chunk_size, overlap)
+                    continue
+                logger.info("model=%s chunk=%d overlap=%d", model, chunk_size, overlap)
+                rows.extend(benchmark(pages, gold, model, chunk_size, overlap, args.types, args.k))
+    print(format_table(rows))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"gold": args.gold, "questions": len(gold), "rows": rows}, f, indent=2)
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["rows"]
+        deltas = compare(rows, baseline)
+        if not deltas:
+            print("\nno configuration in common with the baseline")
+            return
+        print("\nvs baseline (negative is worse):")
+        print(format_table(deltas))
+        worst = min(v for row in deltas for k, v in row.items() if k.startswith("d_"))
+        if worst < -args.tolerance:
+            print(f"retrieval quality regressed by {-worst:.4f} (tolerance {args.tolerance})")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
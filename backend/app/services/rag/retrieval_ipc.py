@@ -0,0 +1,180 @@
+# app/services/rag/retrieval_ipc.py
+"""
+Wire protocol and client for the local retrieval server (retrieval_server.py).
+
+Frames are a 4-byte big-endian length followed by that many bytes of UTF-8 JSON.
+A connection carries one request at a time:
+
+    request:  {"op": "topk_chunks", "query": "...", "k": 3}
+    response: {"ok": true, "result": ..., "index_version": "..."}
+              {"ok": false, "error": "...", "index_version": "..."}
+
+Ops: info, topk_chunks (query, k), topk_many (queries, k) and embed (texts, query).
+Chunks travel as RetrievedChunk fields; vectors as base64 float32 with their shape.
+"""
+import asyncio
+import base64
+import json
+import logging
+import socket
+import struct
+import threading
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.domain.ports import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+HEADER = struct.Struct("!I")
+MAX_FRAME_BYTES = 64 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """Malformed or oversized frame."""
+
+
+class RemoteRetrievalError(RuntimeError):
+    """The retrieval server failed to handle a request."""
+
+
+def encode_frame(message: Dict[str, Any]) -> bytes:
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    if len(body) > MAX_FRAME_BYTES:
+        raise ProtocolError(f"Frame of {len(body)} bytes exceeds {MAX_FRAME_BYTES}")
+    return HEADER.pack(len(body)) + body
+
+
+def _decode(body: bytes) -> Dict[str, Any]:
+    try:
+        message = json.loads(body)
+    except ValueError as e:
+        raise ProtocolError(f"Invalid frame: {e}") from e
+    if not isinstance(message, dict):
+        raise ProtocolError("Frame is not a JSON object")
+    return message
+
+
+def _check_size(size: int) -> int:
+    if size > MAX_FRAME_BYTES:
+        raise ProtocolError(f"Frame of {size} bytes exceeds {MAX_FRAME_BYTES}")
+    return size
+
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        part = sock.recv(size - len(buf))
+        if not part:
+            raise ConnectionError("Retrieval server closed the connection")
+        buf += part
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> Dict[str, Any]:
+    (size,) = HEADER.unpack(_recv_exactly(sock, HEADER.size))
+    return _decode(_recv_exactly(sock, _check_size(size)))
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[Dict[str, Any]]:
+    """Next frame from the stream, or None once the peer has closed it."""
+    try:
+        header = await reader.readexactly(HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ProtocolError("Truncated frame header") from e
+        return None
+    (size,) = HEADER.unpack(header)
+    return _decode(await reader.readexactly(_check_size(size)))
+
+
+def encode_vectors(vectors: np.ndarray) -> Dict[str, Any]:
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    return {"shape": list(vectors.shape), "data": base64.b64encode(vectors.tobytes()).decode("ascii")}
+
+
+def decode_vectors(payload: Dict[str, Any]) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32).reshape(payload["shape"])
+
+
+def encode_chunks(chunks: List[RetrievedChunk]) -> List[Dict[str, Any]]:
+    return [asdict(c) for c in chunks]
+
+
+def decode_chunks(items: List[Dict[str, Any]]) -> List[RetrievedChunk]:
+    return [RetrievedChunk(**item) for item in items]
+
+
+class RetrievalClient:
+    """
+    Blocking client for the retrieval server, safe to share between threads.
+
+    Keeps up to `pool_size` connections; a caller takes an idle one (or opens a new
+    one), so at most `pool_size` requests are in flight per process. A reused
+    connection that turns out to be dead (server restarted) is replaced and the
+    request retried once.
+    """
+
+    def __init__(
+        self,
+        path: str = settings.RETRIEVAL_SOCKET,
+        pool_size: int = settings.RETRIEVAL_POOL_SIZE,
+        timeout: float = settings.RETRIEVAL_TIMEOUT_SECONDS,
+    ):
+        self.path = path
+        self.timeout = timeout
+        self.index_version: Optional[str] = None  # as of the last response
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._idle: List[socket.socket] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def _roundtrip(self, sock: socket.socket, frame: bytes) -> Dict[str, Any]:
+        sock.sendall(frame)
+        return recv_frame(sock)
+
+    def call(self, op: str, **args: Any) -> Any:
+        frame = encode_frame({"op": op, **args})
+        with self._slots:
+            with self._lock:
+                sock = self._idle.pop() if self._idle else None
+            reused = sock is not None
+            if sock is None:
+                sock = self._connect()
+            try:
+                try:
+                    response = self._roundtrip(sock, frame)
+                except ConnectionError:
+                    if not reused:
+                        raise
+                    sock.close()
+                    sock = self._connect()
+                    response = self._roundtrip(sock, frame)
+            except BaseException:
+                sock.close()  # unknown state (timeout, bad frame): never reuse it
+                raise
+            with self._lock:
+                self._idle.append(sock)
+
+        self.index_version = response.get("index_version") or self.index_version
+        if not response.get("ok"):
+            raise RemoteRetrievalError(response.get("error", "unknown error"))
+        return response.get("result")
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for sock in idle:
+            sock.close()
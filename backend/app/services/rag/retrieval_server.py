@@ -0,0 +1,177 @@
+# app/services/rag/retrieval_server.py
+"""
+Local retrieval server: one process per host that owns the embedding model and the
+FAISS index, serving every API worker over a Unix socket (protocol: retrieval_ipc.py).
+
+    python -m app.services.rag.retrieval_server
+    python -m app.services.rag.retrieval_server --socket /run/legalaid/retrieval.sock --retriever hybrid --metrics-port 9101
+    RETRIEVER=remote uvicorn app.main:app --workers 8
+
+Without it, each uvicorn worker loads its own copy of the model and index. Here,
+requests from all workers share the retrieval and embedding caches, their query
+embeddings are micro-batched together (awaited on the event loop, so a batch is not
+capped by the pool size), and searches run on one CPU_WORKERS thread pool. Stage
+metrics of this process are exported with --metrics-port.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from prometheus_client import start_http_server
+
+from app.adapters.rag.faiss_retriever import FaissRetriever
+from app.adapters.rag.hybrid_retriever import HybridRetriever
+from app.core.concurrency import run_cpu, shutdown_cpu_executor
+from app.core.config import settings
+from app.core.logging import setup_logging
+from app.domain.ports import RetrievedChunk, RetrieverPort
+from app.services.rag.embeddings import EmbeddingService, get_embedding_service
+from app.services.rag.retrieval_ipc import ProtocolError, encode_chunks, encode_frame, encode_vectors, read_frame
+from app.services.rag.vectorstore import vs_holder
+from app.services.rag.warmup import WarmupState, warm_up
+
+logger = logging.getLogger(__name__)
+
+RETRIEVERS = ("faiss", "hybrid")
+
+
+def make_retriever(kind: str = settings.RETRIEVAL_SERVER_RETRIEVER) -> RetrieverPort:
+    if kind not in RETRIEVERS:
+        raise ValueError(f"Unknown retriever {kind!r}, expected one of {', '.join(RETRIEVERS)}")
+    return HybridRetriever() if kind == "hybrid" else FaissRetriever()
+
+
+class RetrievalServer:
+    def __init__(self, retriever: RetrieverPort, embedder: Optional[EmbeddingService] = None):
+        self.retriever = retriever
+        self.embedder = embedder or get_embedding_service()
+        self.started_at = time.time()
+        self.requests = 0
+        self._handlers: Dict[asyncio.Task, asyncio.StreamReader] = {}
+
+    @property
+    def connections(self) -> int:
+        return len(self._handlers)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve one client connection: read a request, answer it, repeat until EOF."""
+        self._handlers[asyncio.current_task()] = reader
+        try:
+            while True:
+                request = await read_frame(reader)
+                if request is None:
+                    break
+                writer.write(encode_frame(await self.dispatch(request)))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away mid-request
+        except ProtocolError as e:
+            logger.warning("Dropping connection: %s", e)
+        finally:
+            self._handlers.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def close_connections(self, timeout: float = 5.0) -> None:
+        """Close client connections once their current request is answered."""
+        for reader in self._handlers.values():
+            reader.feed_eof()  # the handler stops at its next read
+        if self._handlers:
+            await asyncio.wait(list(self._handlers), timeout=timeout)
+
+    async def dispatch(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests += 1
+        op = request.get("op")
+        try:
+            if op == "topk_chunks":
+                result: Any = encode_chunks(await self._topk_chunks(request["query"], request.get("k")))
+            elif op == "topk_many":
+                found = await run_cpu(self.retriever.topk_many, request["queries"], request.get("k"))
+                result = [encode_chunks(chunks) for chunks in found]
+            elif op == "embed":
+                result = encode_vectors(await self._embed(request["texts"], bool(request.get("query"))))
+            elif op == "info":
+                result = self.info()
+            else:
+                raise ValueError(f"Unknown op {op!r}")
+            return {"ok": True, "result": result, "index_version": vs_holder.version}
+        except Exception as e:
+            logger.exception("Request %r failed", op)
+            return {"ok": False, "error": f"{type(e).__name__}: {e}", "index_version": vs_holder.version}
+
+    async def _topk_chunks(self, query: str, k: Optional[int]) -> List[RetrievedChunk]:
+        if hasattr(self.retriever, "atopk_chunks"):  # waits for its embedding batch here, not in a CPU thread
+            return await self.retriever.atopk_chunks(query, k)
+        return await run_cpu(self.retriever.topk_chunks, query, k)
+
+    async def _embed(self, texts: List[str], query: bool) -> np.ndarray:
+        if query and len(texts) == 1:  # memoized and micro-batched across clients
+            return (await self.embedder.avector(texts[0]))[None, :]
+        if query:
+            return await run_cpu(self.embedder.vectors, texts)
+        return np.asarray(await run_cpu(self.embedder.embed_documents, texts), dtype=np.float32)
+
+    def info(self) -> Dict[str, Any]:
+        store = vs_holder.store
+        return {
+            "pid": os.getpid(),
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "retriever": type(self.retriever).__name__,
+            "embed_model": self.embedder.model_name,
+            "index_type": settings.INDEX_TYPE,
+            "index_vectors": store.index.ntotal if store is not None else None,
+            "connections": self.connections,
+            "requests": self.requests,
+        }
+
+
+async def serve(server: RetrievalServer, path: str) -> None:
+    socket_path = Path(path)
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    socket_path.unlink(missing_ok=True)  # left over from a previous run
+    unix_server = await asyncio.start_unix_server(server.handle, path=str(socket_path))
+    os.chmod(socket_path, 0o660)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info("Retrieval server listening on %s (%s)", socket_path, server.info())
+    try:
+        async with unix_server:
+            await stop.wait()
+            unix_server.close()  # stop accepting, then let in-flight requests finish
+            await server.close_connections()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(sig)
+        socket_path.unlink(missing_ok=True)
+        shutdown_cpu_executor()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve retrieval and query embedding to local API workers.")
+    parser.add_argument("--socket", default=settings.RETRIEVAL_SOCKET, help="Unix socket path")
+    parser.add_argument("--retriever", choices=RETRIEVERS, default=settings.RETRIEVAL_SERVER_RETRIEVER)
+    parser.add_argument("--metrics-port", type=int, default=0, help="serve Prometheus metrics on this port (0 = off)")
+    args = parser.parse_args(argv)
+
+    setup_logging()
+    state = WarmupState()
+    # Load the model and index (and BM25 for --retriever hybrid) before accepting connections
+    warm_up(state, remote=False, hybrid=args.retriever == "hybrid")
+    if not state.ready:
+        raise SystemExit(f"Warm-up failed: {state.error}")
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    asyncio.run(serve(RetrievalServer(make_retriever(args.retriever)), args.socket))
+
+
+if __name__ == "__main__":
+    main()
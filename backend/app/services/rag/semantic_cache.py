@@ -0,0 +1,241 @@
+# app/services/rag/semantic_cache.py
+"""
+Redis-backed semantic answer cache.
+
+Entries are (query embedding, retrieved chunk ids, answer) triples. A new query is
+answered from cache when its embedding is within SEMANTIC_CACHE_THRESHOLD cosine
+similarity of a stored one. All keys live under a namespace tied to the FAISS index
+version, so a rebuilt index never serves answers grounded in the old chunks.
+
+Redis layout (ns = "<prefix>:<index_version>"):
+    {ns}:vecs         hash   entry_id -> base64 float32 unit vector
+    {ns}:lru          zset   entry_id -> last access time (eviction order)
+    {ns}:entry:<id>   string JSON payload, expires after the TTL
+    {ns}:gen          int    bumped whenever vecs changes, lets workers refresh lazily
+    <prefix>:stats    hash   hits / misses across all workers
+"""
+import base64
+import inspect
+import json
+import logging
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.concurrency import run_blocking
+from app.core.config import settings
+from app.db.database import db_manager
+from app.services.rag.vectorstore import aembed_query, index_version, vs_holder
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    def __init__(
+        self,
+        embed: Callable[[str], Any] = aembed_query,  # sync or async
+        version: Callable[[], Optional[str]] = index_version,
+        threshold: float = settings.SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: int = settings.SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries: int = settings.SEMANTIC_CACHE_MAX_ENTRIES,
+        prefix: str = "semcache",
+        io_bound: bool = False,
+    ):
+        self.embed = embed
+        self.version = version  # the retrieval server's index version with RETRIEVER=remote
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.io_bound = io_bound  # embed() waits on the retrieval server instead of the CPU
+        self.hits = 0
+        self.misses = 0
+
+        # Local mirror of {ns}:vecs so a lookup costs one GET instead of a full HGETALL
+        self._mirror_ns: Optional[str] = None
+        self._mirror_gen: Optional[str] = None
+        self._ids: List[str] = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+        # Namespaces of replaced indexes, purged on the next cache operation
+        self._stale_versions: List[str] = []
+        vs_holder.on_change(self._on_index_change)
+
+    # --- public API -------------------------------------------------------
+
+    async def lookup(self, query: str) -> Optional[Dict[str, Any]]:
+        """Return the cached payload for a semantically equivalent query, or None."""
+        redis = db_manager.redis_client
+        if redis is None:
+            return None
+        try:
+            vector = await self._vector(query)
+            ns = self._namespace()
+            await self._purge_stale(redis)
+            await self._refresh_mirror(redis, ns)
+
+            if not self._ids:
+                return await self._miss(redis)
+            sims = self._matrix @ vector
+            best = int(np.argmax(sims))
+            if float(sims[best]) < self.threshold:
+                return await self._miss(redis)
+
+            entry_id = self._ids[best]
+            raw = await redis.get(f"{ns}:entry:{entry_id}")
+            if raw is None:
+                # Payload expired; drop the orphaned vector too
+                await self._drop(redis, ns, [entry_id])
+                return await self._miss(redis)
+
+            await redis.zadd(f"{ns}:lru", {entry_id: time.time()})
+            self.hits += 1
+            await redis.hincrby(f"{self.prefix}:stats", "hits", 1)
+            payload = json.loads(raw)
+            payload["similarity"] = float(sims[best])
+            return payload
+        except Exception as e:
+            logger.warning("Semantic cache lookup failed: %s", e)
+            return None
+
+    async def store(self, query: str, chunk_ids: List[str], payload: Dict[str, Any]) -> None:
+        """Cache an answer for query. payload must be JSON-serialisable."""
+        redis = db_manager.redis_client
+        if redis is None:
+            return
+        try:
+            vector = await self._vector(query)
+            ns = self._namespace()
+            entry_id = uuid.uuid4().hex[:16]
+            body = json.dumps({**payload, "query": query, "chunk_ids": chunk_ids}, ensure_ascii=False)
+
+            pipe = redis.pipeline(transaction=False)
+            pipe.hset(f"{ns}:vecs", entry_id, base64.b64encode(vector.tobytes()).decode("ascii"))
+            pipe.zadd(f"{ns}:lru", {entry_id: time.time()})
+            pipe.set(f"{ns}:entry:{entry_id}", body, ex=self.ttl_seconds)
+            pipe.incr(f"{ns}:gen")
+            await pipe.execute()
+
+            await self._evict(redis, ns)
+        except Exception as e:
+            logger.warning("Semantic cache store failed: %s", e)
+
+    async def invalidate(self) -> int:
+        """Drop every cached entry for every index version. Returns the number of keys deleted."""
+        redis = db_manager.redis_client
+        if redis is None:
+            return 0
+        deleted = await self._delete_matching(redis, f"{self.prefix}:*", keep={f"{self.prefix}:stats"})
+        self._reset_mirror()
+        return deleted
+
+    async def stats(self) -> Dict[str, Any]:
+        redis = db_manager.redis_client
+        result: Dict[str, Any] = {
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+            "index_version": self._loaded_version(),
+            "worker": {"hits": self.hits, "misses": self.misses},
+        }
+        if redis is not None and self._loaded_version() is not None:
+            totals = await redis.hgetall(f"{self.prefix}:stats")
+            hits, misses = int(totals.get("hits", 0)), int(totals.get("misses", 0))
+            result["global"] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            }
+            result["entries"] = await redis.zcard(f"{self._namespace()}:lru")
+        return result
+
+    # --- internals --------------------------------------------------------
+
+    def _namespace(self) -> str:
+        version = self.version()
+        if version is None:  # remote index not seen yet; never share a "None" namespace
+            raise RuntimeError("Index version unknown")
+        return f"{self.prefix}:{version}"
+
+    def _loaded_version(self) -> Optional[str]:
+        # Unlike version(), never loads the local index
+        return vs_holder.version if self.version is index_version else self.version()
+
+    async def _vector(self, query: str) -> np.ndarray:
+        if inspect.iscoroutinefunction(self.embed):
+            raw = await self.embed(query)
+        else:
+            raw = await run_blocking(self.embed, query, io_bound=self.io_bound)
+        vector = np.asarray(raw, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    async def _miss(self, redis) -> None:
+        self.misses += 1
+        await redis.hincrby(f"{self.prefix}:stats", "misses", 1)
+        return None
+
+    async def _refresh_mirror(self, redis, ns: str) -> None:
+        gen = await redis.get(f"{ns}:gen")
+        if ns == self._mirror_ns and gen == self._mirror_gen:
+            return
+        raw = await redis.hgetall(f"{ns}:vecs")
+        self._ids = list(raw.keys())
+        if self._ids:
+            self._matrix = np.stack([np.frombuffer(base64.b64decode(raw[i]), dtype=np.float32) for i in self._ids])
+        else:
+            self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._mirror_ns, self._mirror_gen = ns, gen
+
+    def _reset_mirror(self) -> None:
+        self._mirror_ns = self._mirror_gen = None
+        self._ids = []
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+    async def _drop(self, redis, ns: str, entry_ids: List[str]) -> None:
+        if not entry_ids:
+            return
+        pipe = redis.pipeline(transaction=False)
+        pipe.hdel(f"{ns}:vecs", *entry_ids)
+        pipe.zrem(f"{ns}:lru", *entry_ids)
+        pipe.delete(*[f"{ns}:entry:{i}" for i in entry_ids])
+        pipe.incr(f"{ns}:gen")
+        await pipe.execute()
+
+    async def _evict(self, redis, ns: str) -> None:
+        # Entries idle for longer than the TTL have lost their payload already
+        expired = await redis.zrangebyscore(f"{ns}:lru", "-inf", time.time() - self.ttl_seconds)
+        # Then least-recently-used entries beyond the size cap
+        overflow = await redis.zcard(f"{ns}:lru") - len(expired) - self.max_entries
+        victims = list(expired)
+        if overflow > 0:
+            victims += await redis.zrange(f"{ns}:lru", len(expired), len(expired) + overflow - 1)
+        await self._drop(redis, ns, victims)
+
+    def _on_index_change(self, old_version: Optional[str], new_version: str) -> None:
+        # Called synchronously from build_or_load_index; the actual purge needs Redis (async)
+        if old_version is not None:
+            self._stale_versions.append(old_version)
+        self._reset_mirror()
+
+    async def _purge_stale(self, redis) -> None:
+        while self._stale_versions:
+            version = self._stale_versions.pop()
+            await self._delete_matching(redis, f"{self.prefix}:{version}:*")
+
+    @staticmethod
+    async def _delete_matching(redis, pattern: str, keep: set = frozenset()) -> int:
+        deleted = 0
+        batch: List[str] = []
+        async for key in redis.scan_iter(match=pattern, count=500):
+            if key in keep:
+                continue
+            batch.append(key)
+            if len(batch) >= 500:
+                deleted += await redis.delete(*batch)
+                batch = []
+        if batch:
+            deleted += await redis.delete(*batch)
+        return deleted
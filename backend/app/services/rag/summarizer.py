@@ -0,0 +1,124 @@
+# app/services/rag/summarizer.py
+import asyncio
+import logging
+from typing import Dict, Set, Union
+
+from app.core.concurrency import call_maybe_async
+from app.core.config import settings
+from app.domain.ports import (
+    AsyncChatHistoryPort,
+    ChatHistoryPort,
+    AsyncLLMPort,
+    ConversationSummary,
+    LLMPort,
+    SummaryStorePort,
+)
+from app.services.rag.tokens import fit_history
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a legal consultation between a user and an assistant.
+Fold the new messages into the existing summary. Keep facts about the user's situation,
+the legal questions asked, and the sections or rules already cited. Drop greetings and repetition.
+Write at most {max_words} words.
+
+Existing summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+
+class ConversationSummarizer:
+    """
+    Folds messages that no longer fit the prompt into a rolling per-chat summary.
+
+    schedule() is called after each turn is stored and returns immediately; the LLM
+    call runs as a background task, so the request path only ever pays for reading
+    the (short) summary on the next turn.
+
+    The prompt keeps the newest of the last `window` messages that fit `token_budget`
+    (fit_history), so the summary has to cover everything older than those. A refresh
+    only calls the LLM once some of those messages are not covered yet, and then folds
+    at least `min_new_messages`, reaching into the kept messages if need be, so the
+    summary is not redone on every turn of a long chat.
+    """
+
+    def __init__(
+        self,
+        llm: Union[AsyncLLMPort, LLMPort],
+        history: Union[AsyncChatHistoryPort, ChatHistoryPort],
+        store: SummaryStorePort,
+        window: int = settings.HISTORY_FETCH_LIMIT,
+        token_budget: int = settings.HISTORY_TOKEN_BUDGET,
+        min_new_messages: int = settings.SUMMARY_MIN_NEW_MESSAGES,
+        max_words: int = settings.SUMMARY_MAX_WORDS,
+    ):
+        self.llm = llm
+        self.history = history
+        self.store = store
+        self.window = window
+        self.token_budget = token_budget
+        self.min_new_messages = min_new_messages
+        self.max_words = max_words
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._rerun: Set[str] = set()
+
+    def schedule(self, chat_id: str) -> None:
+        """Queue a summary refresh for chat_id; at most one runs per chat at a time."""
+        if chat_id in self._tasks:
+            self._rerun.add(chat_id)
+            return
+        self._tasks[chat_id] = asyncio.create_task(self._run(chat_id))
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Wait for in-flight summaries (used on shutdown)."""
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+
+    async def _run(self, chat_id: str) -> None:
+        try:
+            while True:
+                self._rerun.discard(chat_id)
+                await self.refresh(chat_id)
+                if chat_id not in self._rerun:
+                    break
+        except Exception as e:
+            logger.warning("Summarizing chat %s failed: %s", chat_id, e)
+        finally:
+            self._tasks.pop(chat_id, None)
+
+    async def refresh(self, chat_id: str) -> None:
+        recent, total = await asyncio.gather(
+            call_maybe_async(self.history.get, chat_id, self.window),
+            call_maybe_async(self.history.count, chat_id),
+        )
+        kept_from = total - len(fit_history(recent, self.token_budget))  # first message the prompt keeps
+
+        current = await self.store.get(chat_id)
+        if current is None or current.covered > total:
+            # No summary yet, or the history was reset underneath it
+            current = ConversationSummary(text="", covered=0)
+        if kept_from <= current.covered:
+            return  # everything the prompt drops is already summarized
+
+        stop = min(total, max(kept_from, current.covered + self.min_new_messages))
+        new_messages = await call_maybe_async(self.history.get_range, chat_id, current.covered, stop)
+        if not new_messages:
+            return
+
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.max_words,
+            summary=current.text or "(none yet)",
+            messages="\n".join(new_messages),
+        )
+        if hasattr(self.llm, "agenerate"):
+            text = await self.llm.agenerate(prompt)
+        else:
+            text = await asyncio.to_thread(self.llm.generate, prompt)
+        if text:
+            covered = current.covered + len(new_messages)
+            await self.store.save(chat_id, ConversationSummary(text=text.strip(), covered=covered))
@@ -0,0 +1,36 @@
+# app/services/rag/tokens.py
+"""Cheap prompt-size accounting. Exact tokenization would need a Gemini round-trip."""
+from typing import List
+
+CHARS_PER_TOKEN = 4  # rough average for English text with Gemini/SentencePiece tokenizers
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, budget: int, marker: str = " [...]") -> str:
+    """`text` cut at a word boundary so that it, with `marker` appended, fits `budget` tokens."""
+    if estimate_tokens(text) <= budget:
+        return text
+    cut = text[: max(budget * CHARS_PER_TOKEN - len(marker), 0)]
+    cut = cut[: cut.rfind(" ")] if " " in cut else cut
+    return cut.rstrip() + marker
+
+
+def fit_history(messages: List[str], budget: int) -> List[str]:
+    """
+    The newest messages that fit `budget` tokens, in chronological order. The newest
+    message is always kept, cut to the budget if it is longer on its own.
+    """
+    kept: List[str] = []
+    used = 0
+    for message in reversed(messages):
+        cost = estimate_tokens(message)
+        if used + cost > budget:
+            if not kept:
+                kept.append(truncate_to_tokens(message, budget))
+            break
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    return kept
@@ -1,50 +1,292 @@
 # app/services/rag/vectorstore.py
+import asyncio
+import fcntl
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-from typing import Optional
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Callable, Iterator, List, Optional, Tuple
+import faiss
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.documents import Document
+from app.core import metrics
+from app.core.concurrency import run_cpu
 from app.core.config import settings
+from app.services.rag.docstore import SQLiteDocstore
+from app.services.rag.embeddings import get_embedding_service
+from app.services.rag.index_types import configure_search
 
 class VectorStoreHolder:
-    store: Optional[FAISS] = None
+    """
+    The serving store and the version (fingerprint of the persisted index) it was
+    loaded from. Both are replaced together by swap(); a search that needs them to
+    match, or uses the store more than once, reads them once through current().
+    """
+
+    def __init__(self):
+        self._current: Tuple[Optional[FAISS], Optional[str]] = (None, None)
+        self._listeners: List[Callable[[Optional[str], str], None]] = []
+
+    @property
+    def store(self) -> Optional[FAISS]:
+        return self._current[0]
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._current[1]
+
+    def current(self) -> Tuple[Optional[FAISS], Optional[str]]:
+        return self._current
+
+    def on_change(self, callback: Callable[[Optional[str], str], None]) -> None:
+        """Register callback(old_version, new_version), called whenever a new store is swapped in."""
+        self._listeners.append(callback)
+
+    def swap(self, store: FAISS, version: str) -> FAISS:
+        # The old store is not closed here: searches in flight still use it. Its docstore
+        # connection is closed when the last of them drops it (SQLite closes on GC).
+        _, old_version = self._current
+        self._current = (store, version)
+        if old_version != version:
+            for callback in self._listeners:
+                callback(old_version, version)
+        return store
 
 vs_holder = VectorStoreHolder()
 
 def _embedder():
-    return HuggingFaceEmbeddings(model_name=settings.EMBED_MODEL)
+    # Shared process-wide model with a memoized query path (see embeddings.py)
+    return get_embedding_service()
 
-def build_or_load_index():
+def _index_version(faiss_idx: Path) -> str:
+    """Cheap fingerprint of the persisted index, identical across workers loading the same files."""
+    stat = faiss_idx.stat()
+    return hashlib.sha1(f"{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+
+def _index_files():
     index_path = Path(settings.INDEX_DIR)
     index_path.mkdir(parents=True, exist_ok=True)  # 👈 ensure dir exists
+    return index_path, index_path / "index.faiss", index_path / "docstore.sqlite"
 
-    faiss_idx = index_path / "index.faiss"
-    faiss_pkl = index_path / "index.pkl"
+def _building_path(path: Path) -> Path:
+    # Per process, so a build can never remove or overwrite another process's files
+    return path.with_name(f"{path.name}.{os.getpid()}.building")
 
-    if faiss_idx.exists() and faiss_pkl.exists():
-        vs_holder.store = FAISS.load_local(str(index_path), _embedder(), allow_dangerous_deserialization=True)
-        return vs_holder.store
+BUILD_LOCK = ".build.lock"  # held for a whole build (index_lock)
+PERSIST_LOCK = ".persist.lock"  # held while the files are swapped / opened (persist_index, load_index)
 
-    # Build
-    loader = PyPDFLoader(settings.PDF_PATH)
-    docs = loader.load()
+@contextmanager
+def _flock(name: str, mode: int = fcntl.LOCK_EX) -> Iterator[None]:
+    """Hold an flock on INDEX_DIR/name; shared between processes on this host."""
+    index_path, _, _ = _index_files()
+    with open(index_path / name, "a") as f:
+        fcntl.flock(f, mode)
+        yield  # closing the file releases the lock
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=settings.CHUNK_SIZE,
-        chunk_overlap=settings.CHUNK_OVERLAP
-    )
-    chunks = splitter.split_documents(docs)
+def index_exists() -> bool:
+    _, faiss_idx, docstore_db = _index_files()
+    return faiss_idx.exists() and docstore_db.exists()
 
-    vs = FAISS.from_documents(chunks, _embedder())
+def disk_index_version() -> str:
+    _, faiss_idx, _ = _index_files()
+    return _index_version(faiss_idx)
 
-    # Persist
-    vs.save_local(str(index_path))
-    vs_holder.store = vs
-    return vs_holder.store
+def load_index(writable: bool = False) -> Optional[FAISS]:
+    """
+    Load the persisted index, or None if nothing has been built yet.
 
-def similarity_search(query: str, k: int):
-    if vs_holder.store is None:
-        # 👇 last-resort lazy init (in case startup wasn’t called)
+    The serving copy memory-maps index.faiss read-only (INDEX_MMAP), so workers on a
+    host share the vectors through the page cache, and reads chunks from SQLite only
+    for the ids a search returns. writable=True (index builds) reads the vectors into
+    memory and works on a private copy of the docstore that persist_index() moves into place.
+    """
+    _, faiss_idx, docstore_db = _index_files()
+    if not (faiss_idx.exists() and docstore_db.exists()):
+        return None
+
+    if writable:
+        building = _building_path(docstore_db)
+        building.unlink(missing_ok=True)
+        with sqlite3.connect(f"file:{docstore_db}?mode=ro", uri=True) as src, sqlite3.connect(str(building)) as dst:
+            src.backup(dst)
+        docstore = SQLiteDocstore(building, read_only=False)
+        vs = FAISS(_embedder(), faiss.read_index(str(faiss_idx)), docstore, dict(docstore.positions().items()))
+    else:
+        flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if settings.INDEX_MMAP else 0
+        # Open both files between two persists, never one old and one new; once open,
+        # they keep reading what was loaded even if replaced on disk
+        with _flock(PERSIST_LOCK, fcntl.LOCK_SH):
+            docstore = SQLiteDocstore(docstore_db)
+            index = faiss.read_index(str(faiss_idx), flags)
+        vs = FAISS(_embedder(), index, docstore, docstore.positions())
+
+    configure_search(vs.index)  # apply the current nprobe / efSearch settings
+    return vs
+
+def new_docstore() -> SQLiteDocstore:
+    """Empty writable docstore for a full rebuild; persist_index() moves it into place."""
+    _, _, docstore_db = _index_files()
+    building = _building_path(docstore_db)
+    building.unlink(missing_ok=True)
+    return SQLiteDocstore(building, read_only=False)
+
+def persist_index(vs: FAISS) -> str:
+    """
+    Write a store built on new_docstore() / load_index(writable=True) to INDEX_DIR and
+    return its new version. Both files are replaced by rename. Workers that have loaded
+    the old ones keep reading them until they reload: the index is memory-mapped, and
+    the docstore's single connection was opened at load time (see SQLiteDocstore).
+    """
+    index_path, faiss_idx, docstore_db = _index_files()
+    vs.docstore.save_positions(vs.index_to_docstore_id)
+    vs.docstore.close()
+    tmp = faiss_idx.with_name(f"{faiss_idx.name}.{os.getpid()}.tmp")
+    faiss.write_index(vs.index, str(tmp))
+
+    with _flock(PERSIST_LOCK):  # readers (load_index) see both files replaced or neither
+        os.replace(vs.docstore.path, docstore_db)
+        os.replace(tmp, faiss_idx)
+        version = _index_version(faiss_idx)
+
+    (index_path / "index.pkl").unlink(missing_ok=True)  # pickled docstore of the old format
+    return version
+
+class _IndexLock:
+    """
+    Exclusive right to build or replace the persisted index, held by one thread of
+    one process at a time: an RLock between the threads of this process (the warm-up
+    thread and a request hitting the lazy init below) and an flock on
+    INDEX_DIR/BUILD_LOCK between processes (uvicorn workers starting without an
+    index, the ingest CLI). Reentrant within the holding thread.
+    """
+
+    def __init__(self):
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._file_lock: Optional[ExitStack] = None
+
+    def __enter__(self) -> "_IndexLock":
+        self._rlock.acquire()
+        if self._depth == 0:
+            stack = ExitStack()
+            try:
+                stack.enter_context(_flock(BUILD_LOCK))
+            except BaseException:
+                self._rlock.release()
+                raise
+            self._file_lock = stack
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0:
+            self._file_lock.close()
+            self._file_lock = None
+        self._rlock.release()
+
+index_lock = _IndexLock()
+
+def _load_persisted() -> Optional[Tuple[FAISS, str]]:
+    # The version is read under the same shared lock as the files (shared flocks nest)
+    with _flock(PERSIST_LOCK, fcntl.LOCK_SH):
+        vs = load_index()
+        return (vs, disk_index_version()) if vs is not None else None
+
+_load_lock = threading.Lock()  # one load per process when several threads find no store
+
+def build_or_load_index():
+    """The serving store: the one already loaded, else the persisted index, else a fresh build."""
+    # Loading does not wait for index_lock, so an ingest running elsewhere never holds up startup
+    with _load_lock:
+        if vs_holder.store is not None:
+            return vs_holder.store
+        loaded = _load_persisted()
+        if loaded is not None:
+            return vs_holder.swap(*loaded)
+
+    with index_lock:
+        if vs_holder.store is not None:
+            return vs_holder.store
+        loaded = _load_persisted()  # another thread or worker may have built it while we waited
+        if loaded is not None:
+            return vs_holder.swap(*loaded)
+
+        # Nothing persisted yet: build from the sources (see ingest.py). PDFs are parsed
+        # serially: this runs inside a server process, and forking a parsing pool there
+        # would copy its running torch, FAISS and batcher threads into the children.
+        from app.services.rag.ingest import sync_index
+        sync_index(workers=1)
+        return vs_holder.store
+
+def serving_index() -> Tuple[FAISS, str]:
+    """(store, version) to run one search against, loading the index on first use."""
+    store, version = vs_holder.current()
+    if store is None:
         build_or_load_index()
-    return vs_holder.store.similarity_search(query, k=k)
+        store, version = vs_holder.current()
+    return store, version
+
+def similarity_search(query: str, k: int):
+    store, _ = serving_index()
+    return store.similarity_search(query, k=k)
+
+def similarity_search_with_score(query: str, k: int, store: Optional[FAISS] = None):
+    """Same as similarity_search but keeps the L2 distance for each document."""
+    if store is None:
+        store, _ = serving_index()
+    with metrics.stage(metrics.EMBED):
+        vector = _embedder().vector(query)
+    with metrics.stage(metrics.SEARCH):
+        return store.similarity_search_with_score_by_vector(vector.tolist(), k=k)
+
+async def asimilarity_search_with_score(query: str, k: int, store: Optional[FAISS] = None):
+    """
+    similarity_search_with_score for coroutines: the query embedding is awaited on
+    the event loop, where concurrent queries join one batch, and only the FAISS
+    search runs on the CPU pool.
+    """
+    if store is None:
+        store, _ = vs_holder.current()
+    if store is None:
+        store, _ = await asyncio.to_thread(serving_index)
+    with metrics.stage(metrics.EMBED):
+        vector = await _embedder().avector(query)
+    with metrics.stage(metrics.SEARCH):
+        return await run_cpu(store.similarity_search_with_score_by_vector, vector.tolist(), k=k)
+
+def similarity_search_many(queries: List[str], k: int, store: Optional[FAISS] = None) -> List[List[Tuple[Document, float]]]:
+    """
+    similarity_search_with_score for a batch of queries: one batched embedding pass
+    and one multi-query FAISS search instead of len(queries) of each.
+    """
+    if store is None:
+        store, _ = serving_index()
+    if not queries:
+        return []
+    with metrics.stage(metrics.EMBED):
+        vectors = _embedder().vectors(queries)
+    with metrics.stage(metrics.SEARCH):
+        distances, indices = store.index.search(vectors, k)
+        results = []
+        for row_distances, row_indices in zip(distances, indices):
+            row = []
+            for distance, i in zip(row_distances, row_indices):
+                if i == -1:  # fewer than k vectors in the index
+                    continue
+                row.append((store.docstore.search(store.index_to_docstore_id[int(i)]), float(distance)))
+            results.append(row)
+    return results
+
+def embed_query(query: str) -> List[float]:
+    """Embed a query with the same (memoized) model the index is searched with."""
+    return _embedder().embed_query(query)
+
+async def aembed_query(query: str) -> List[float]:
+    """embed_query for coroutines (see asimilarity_search_with_score)."""
+    return (await _embedder().avector(query)).tolist()
+
+def index_version() -> Optional[str]:
+    return serving_index()[1]
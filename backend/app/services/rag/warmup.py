@@ -0,0 +1,168 @@
+# app/services/rag/warmup.py
+"""
+Startup warm-up for the RAG stack.
+
+Loading the embedding model, opening the index and the first forward passes take
+seconds; without a warm-up the first chat request pays for all of it. start_warmup()
+runs them in a background thread at startup, and /api/v1/health/ready reports 503
+until it has finished, so a load balancer only routes traffic to warm workers. A
+failed warm-up (index build error, retrieval server down) is retried with backoff.
+With RETRIEVER=hybrid the BM25 index is loaded and searched too. With
+RETRIEVER=remote the model and index live in the retrieval server, and warming up
+means waiting until that server answers.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.rag.bm25 import get_bm25_index
+from app.services.rag.embeddings import get_embedding_service
+from app.services.rag.retrieval_ipc import RetrievalClient
+from app.services.rag.vectorstore import serving_index
+
+logger = logging.getLogger(__name__)
+
+SERVER_WAIT_SECONDS = 120  # how long a remote-retrieval worker waits for the retrieval server
+RETRY_MIN_SECONDS = 1.0  # first delay before retrying a failed warm-up, doubled up to WARMUP_RETRY_MAX_SECONDS
+
+# Representative queries; embedded as documents so they never enter the query caches
+WARMUP_QUERIES = (
+    "What is the penalty for driving without a valid driving licence?",
+    "Who can issue a revenue licence for a motor vehicle?",
+    "heavy motor lorry",
+)
+
+
+@dataclass
+class WarmupState:
+    status: str = "pending"  # pending | warming | ready | failed
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    steps: Dict[str, float] = field(default_factory=dict)  # seconds per step
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def as_dict(self) -> dict:
+        return {"status": self.status, "error": self.error, "attempts": self.attempts, "steps": self.steps}
+
+
+warmup_state = WarmupState()
+
+
+def _wait_for_server(state: WarmupState, client: Optional[RetrievalClient] = None) -> None:
+    # The worker's own client, if given, so its index_version is known before the first request
+    own = client is None
+    if own:
+        client = RetrievalClient(timeout=5.0)
+    started = time.perf_counter()
+    while True:
+        try:
+            info = client.call("info")
+            break
+        except OSError as e:
+            if time.perf_counter() - started > SERVER_WAIT_SECONDS:
+                raise RuntimeError(f"Retrieval server at {client.path} not reachable: {e}") from e
+            time.sleep(1.0)
+    if own:
+        client.close()
+    state.steps["retrieval_server"] = round(time.perf_counter() - started, 3)
+    logger.info("Retrieval server is up: %s", info)
+
+
+def warm_up(
+    state: WarmupState = warmup_state,
+    remote: Optional[bool] = None,
+    client: Optional[RetrievalClient] = None,
+    hybrid: Optional[bool] = None,
+) -> None:
+    """
+    Load the model and index and run a few dummy embeddings/searches (blocking), or
+    with `remote` (default: RETRIEVER=remote) wait for the retrieval server instead,
+    through `client` if given. With `hybrid` (default: RETRIEVER=hybrid) the BM25
+    index is loaded and searched as well.
+    """
+    state.status = "warming"
+    state.started_at = time.time()
+    state.error = None
+    state.attempts += 1
+    if remote is None:
+        remote = settings.RETRIEVER == "remote"
+    if hybrid is None:
+        hybrid = settings.RETRIEVER == "hybrid"
+    try:
+        if remote:
+            _wait_for_server(state, client)
+            state.status = "ready"
+            return
+
+        service = get_embedding_service()
+
+        started = time.perf_counter()
+        service.model  # load (and on first run download) the model
+        state.steps["model_load"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        store, version = serving_index()
+        state.steps["index_load"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        vectors = np.asarray(service.embed_documents(list(WARMUP_QUERIES)), dtype=np.float32)
+        state.steps["embed"] = round(time.perf_counter() - started, 3)
+
+        # Searches fault the memory-mapped index pages in and exercise the docstore
+        started = time.perf_counter()
+        for vector in vectors:
+            store.similarity_search_by_vector(vector.tolist(), k=settings.TOP_K)
+        state.steps["search"] = round(time.perf_counter() - started, 3)
+
+        if hybrid:
+            started = time.perf_counter()
+            bm25 = get_bm25_index(version)
+            if bm25 is None:
+                logger.warning("No BM25 index for index version %s; hybrid retrieval falls back to dense", version)
+            else:
+                for query in WARMUP_QUERIES:
+                    bm25.search(query, settings.HYBRID_CANDIDATES)
+            state.steps["bm25"] = round(time.perf_counter() - started, 3)
+
+        state.status = "ready"
+        logger.info("Warm-up finished: %s", state.steps)
+    except Exception as e:
+        state.status = "failed"
+        state.error = str(e)
+        logger.exception("Warm-up failed")
+    finally:
+        state.finished_at = time.time()
+
+
+async def _warm_up_until_ready(state: WarmupState, client: Optional[RetrievalClient]) -> None:
+    delay = RETRY_MIN_SECONDS
+    while True:
+        await asyncio.to_thread(warm_up, state, None, client)
+        if state.ready:
+            return
+        logger.warning("Warm-up attempt %d failed; retrying in %gs", state.attempts, delay)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, settings.WARMUP_RETRY_MAX_SECONDS)
+
+
+def start_warmup(
+    state: WarmupState = warmup_state, client: Optional[RetrievalClient] = None
+) -> Optional[asyncio.Task]:
+    """
+    Schedule warm_up() off the event loop, retried with backoff until it succeeds;
+    with WARMUP_ENABLED=False the worker is ready at once.
+    """
+    if not settings.WARMUP_ENABLED:
+        state.status = "ready"
+        return None
+    return asyncio.create_task(_warm_up_until_ready(state, client))
@@ -2,6 +2,7 @@
 """
 Debug script to test the chat functionality directly
 """
+import asyncio
 import sys
 import os
 from pathlib import Path
@@ -40,7 +41,7 @@ if __name__ == "__main__":
         # Test 4: Test QA Service
         print("4. Testing QA service...")
         qa = QAService(retriever=retriever, llm=llm, history=history)
-        result = qa.answer("test_chat", "What are driving license requirements?")
+        result = asyncio.run(qa.answer("test_chat", "What are driving license requirements?"))
         print(f"✅ QA service response: {result['answer'][:100]}...")
         
         print("🎉 All tests passed!")
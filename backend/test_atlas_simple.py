@@ -11,12 +11,15 @@ backend_dir = Path(__file__).parent
 sys.path.insert(0, str(backend_dir))
 os.chdir(backend_dir)
 
-def test_mongo_atlas():
+async def test_mongo_atlas():
     """Test MongoDB Atlas chat history"""
     try:
         print("🔍 Testing MongoDB Atlas connection...")
         
+        from app.db.database import db_manager
         from app.adapters.chat.mongo_history import MongoChatHistory
+
+        await db_manager.connect_mongodb()
         
         history = MongoChatHistory()
         
@@ -26,20 +29,21 @@ def test_mongo_atlas():
         question = "What are driving license requirements?"
         answer = "You need to be at least 18 years old and pass both written and practical tests."
         
-        history.append(chat_id, question, answer)
+        await history.append(chat_id, question, answer)
         
         # Test retrieving chat history
         print("📖 Testing chat history retrieval...")
-        retrieved = history.get(chat_id)
+        retrieved = await history.get(chat_id)
         print(f"✅ Retrieved {len(retrieved)} messages")
         for i, msg in enumerate(retrieved):
             print(f"  {i+1}. {msg}")
         
         # Test listing chat IDs
         print("📋 Testing chat ID listing...")
-        chat_ids = history.list_ids()
+        chat_ids = await history.list_ids()
         print(f"✅ Found {len(chat_ids)} chat IDs: {chat_ids}")
         
+        await db_manager.disconnect_mongodb()
         print("🎉 MongoDB Atlas test completed!")
         return True
         
@@ -50,4 +54,5 @@ def test_mongo_atlas():
         return False
 
 if __name__ == "__main__":
-    test_mongo_atlas()
\ No newline at end of file
+    import asyncio
+    asyncio.run(test_mongo_atlas())
\ No newline at end of file
@@ -31,19 +31,19 @@ async def test_mongo_chat_history():
         question = "What are driving license requirements?"
         answer = "You need to be at least 18 years old and pass both written and practical tests."
         
-        history.append(chat_id, question, answer)
+        await history.append(chat_id, question, answer)
         print("✅ Chat history stored successfully")
         
         # Test retrieving chat history
         print("📖 Testing chat history retrieval...")
-        retrieved = history.get(chat_id)
+        retrieved = await history.get(chat_id)
         print(f"✅ Retrieved {len(retrieved)} messages")
         for msg in retrieved:
             print(f"  - {msg}")
         
         # Test listing chat IDs
         print("📋 Testing chat ID listing...")
-        chat_ids = history.list_ids()
+        chat_ids = await history.list_ids()
         print(f"✅ Found {len(chat_ids)} chat IDs: {chat_ids}")
         
         # Cleanup
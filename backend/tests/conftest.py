@@ -0,0 +1,5 @@
+import os
+
+# app.core.config reads required settings at import time; unit tests never reach the services
+for _name in ("SECRET_KEY", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB", "GEMINI_API_KEY"):
+    os.environ.setdefault(_name, "test")
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core.concurrency import ConcurrencyLimit
+
+
+def test_limit_must_be_positive():
+    with pytest.raises(ValueError):
+        ConcurrencyLimit(0)
+
+
+def test_threads_never_exceed_the_limit():
+    limit = ConcurrencyLimit(2)
+    active = peak = 0
+    lock = threading.Lock()
+
+    def work():
+        nonlocal active, peak
+        with limit:
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.01)
+            with lock:
+                active -= 1
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak == 2
+    assert limit.in_use == 0
+
+
+def test_acquire_timeout_does_not_take_a_slot():
+    limit = ConcurrencyLimit(1)
+    assert limit.try_acquire()
+    assert not limit.acquire(timeout=0.01)
+    limit.release()
+    assert limit.in_use == 0
+    assert limit.try_acquire()
+
+
+def test_release_without_acquire_raises():
+    limit = ConcurrencyLimit(1)
+    with pytest.raises(ValueError):
+        limit.release()
+
+
+def test_async_waiters_are_served_in_order():
+    async def main():
+        limit = ConcurrencyLimit(1)
+        await limit.acquire_async()
+        order = []
+
+        async def waiter(n):
+            async with limit:
+                order.append(n)
+
+        tasks = [asyncio.create_task(waiter(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        assert order == []
+        limit.release()
+        await asyncio.gather(*tasks)
+        return order, limit.in_use
+
+    assert asyncio.run(main()) == ([0, 1, 2], 0)
+
+
+def test_slot_passes_from_thread_to_coroutine():
+    async def main():
+        limit = ConcurrencyLimit(1)
+        assert limit.acquire()
+        waiting = asyncio.create_task(limit.acquire_async())
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        threading.Thread(target=limit.release).start()
+        await asyncio.wait_for(waiting, 1)
+        assert limit.in_use == 1
+        limit.release()
+        return limit.in_use
+
+    assert asyncio.run(main()) == 0
+
+
+def test_slot_passes_from_coroutine_to_thread():
+    async def main():
+        limit = ConcurrencyLimit(1)
+        await limit.acquire_async()
+        got = threading.Event()
+
+        def worker():
+            with limit:
+                got.set()
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        await asyncio.sleep(0.01)
+        assert not got.is_set()
+        limit.release()
+        await asyncio.to_thread(thread.join)
+        return got.is_set(), limit.in_use
+
+    assert asyncio.run(main()) == (True, 0)
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    async def main():
+        limit = ConcurrencyLimit(1)
+        await limit.acquire_async()
+        waiting = asyncio.create_task(limit.acquire_async())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        limit.release()
+        return limit.in_use
+
+    assert asyncio.run(main()) == 0
+
+
+def test_slot_granted_to_a_waiter_cancelled_meanwhile_is_returned():
+    async def main():
+        limit = ConcurrencyLimit(1)
+        await limit.acquire_async()
+        waiting = asyncio.create_task(limit.acquire_async())
+        await asyncio.sleep(0)
+        limit.release()  # dequeues the waiter; the grant is scheduled on the loop
+        waiting.cancel()  # lands before the grant runs
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await asyncio.sleep(0)
+        return limit.in_use
+
+    assert asyncio.run(main()) == 0
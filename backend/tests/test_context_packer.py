@@ -0,0 +1,122 @@
+import numpy as np
+
+from app.domain.ports import RetrievedChunk
+from app.services.rag.context_packer import (
+    MIN_PARTIAL_TOKENS,
+    OMITTED,
+    ContextPacker,
+    _merge,
+    _overlap,
+    split_sentences,
+)
+from app.services.rag.tokens import estimate_tokens
+
+TEXT = " ".join(f"word{i:03d}" for i in range(60))  # 479 characters, no repeats
+
+
+def chunk(text, page=1, source="law.pdf"):
+    return RetrievedChunk(id=f"{source}:{page}:{text[:12]}", text=text, metadata={"source": source, "page": page})
+
+
+def packer(**kwargs):
+    kwargs.setdefault("sentence_filter", False)
+    kwargs.setdefault("max_overlap", 50)
+    return ContextPacker(**kwargs)
+
+
+def test_overlap_is_the_longest_shared_suffix_prefix():
+    assert _overlap(TEXT[:100], TEXT[70:200], 100) == 30
+    assert _overlap(TEXT[:100], TEXT[70:200], 20) == 0  # longer than max_chars allows
+
+
+def test_short_overlap_is_coincidence():
+    assert _overlap("x" * 50 + "shared", "shared" + "y" * 50, 100) == 0
+
+
+def test_merge_overlap_and_containment():
+    assert _merge(TEXT[:100], TEXT[70:200], 100) == TEXT[:200]
+    assert _merge(TEXT[70:200], TEXT[:100], 100) == TEXT[:200]  # either order
+    assert _merge(TEXT[:200], TEXT[50:150], 100) == TEXT[:200]
+    assert _merge(TEXT[50:150], TEXT[:200], 100) == TEXT[:200]
+    assert _merge(TEXT[:100], TEXT[150:250], 100) is None
+
+
+def test_neighbouring_chunks_of_a_page_become_one_passage():
+    chunks = [chunk(TEXT[:150]), chunk(TEXT[120:300]), chunk(TEXT[270:])]
+    assert packer().passages(chunks) == [TEXT]
+
+
+def test_chunks_of_different_pages_are_not_merged():
+    chunks = [chunk(TEXT[:150], page=1), chunk(TEXT[120:300], page=2)]
+    assert packer().passages(chunks) == [TEXT[:150], TEXT[120:300]]
+
+
+def test_merge_that_bridges_two_passages_regroups_them():
+    # A and C do not touch; B overlaps both, so A + B must then absorb C
+    a, c, b = TEXT[:100], TEXT[150:250], TEXT[70:180]
+    assert packer().passages([chunk(a), chunk(c), chunk(b)]) == [TEXT[:250]]
+
+
+def test_duplicates_are_dropped_and_rank_is_kept():
+    other = "A completely different passage about vehicle registration and fees."
+    chunks = [chunk(other, page=7), chunk(TEXT[:100]), chunk("  " + TEXT[:100].replace(" ", "\n"), page=3)]
+    assert packer().passages(chunks) == [other, TEXT[:100]]
+
+
+def test_split_sentences_keeps_abbreviations_and_numbers():
+    text = (
+        "The licence is issued under section 6. of Act No. 18 of the year; "
+        "it expires after five years unless renewed earlier by the holder. "
+        "See: schedule. Fees apply to every renewal made after the expiry date."
+    )
+    assert split_sentences(text) == [
+        "The licence is issued under section 6. of Act No. 18 of the year;",
+        "it expires after five years unless renewed earlier by the holder. See: schedule.",
+        "Fees apply to every renewal made after the expiry date.",
+    ]
+
+
+def test_passages_that_fit_are_kept_whole():
+    passages = ["a" * 396, "b" * 396]  # 99 + 1 tokens each
+    assert packer(token_budget=200)._fit(passages) == passages
+
+
+def test_last_passage_is_cut_to_the_budget():
+    passages = ["a" * 396, " ".join(["lorem"] * 200)]
+    packed = packer(token_budget=200)._fit(passages)
+    assert packed[0] == passages[0]
+    assert packed[1].endswith(OMITTED.rstrip()) and passages[1].startswith(packed[1][: -len(OMITTED.rstrip())])
+    assert sum(estimate_tokens(p) + 1 for p in packed) <= 200
+
+
+def test_remainder_too_small_for_a_partial_passage_is_dropped():
+    budget = 100 + MIN_PARTIAL_TOKENS - 1
+    assert packer(token_budget=budget)._fit(["a" * 396, "b" * 4000, "c" * 4]) == ["a" * 396]
+
+
+class KeywordEmbedder:
+    """Sentences mentioning "licence" point one way, everything else the other."""
+
+    @staticmethod
+    def _vec(text):
+        return np.array([1.0, 0.0] if "licence" in text.lower() else [0.0, 1.0], dtype=np.float32)
+
+    def vector(self, text):
+        return self._vec(text)
+
+    def embed_documents(self, texts):
+        return [self._vec(t).tolist() for t in texts]
+
+
+def test_sentence_filter_keeps_relevant_sentences_and_marks_gaps():
+    passage = (
+        "Registration of a motor vehicle is done at the divisional office. "
+        "A driving licence is valid for eight years from the date of issue. "
+        "Fees for registration are listed in the third schedule of the act."
+    )
+    packed = packer(sentence_filter=True, min_similarity=0.5, embedder=KeywordEmbedder()).pack(
+        "How long is a driving licence valid?", [chunk(passage)]
+    )
+    assert packed == [
+        f"{OMITTED.strip()} A driving licence is valid for eight years from the date of issue. {OMITTED.strip()}"
+    ]
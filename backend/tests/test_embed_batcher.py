@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.rag.embed_batcher import EmbeddingBatcher
+from app.services.rag.embeddings import EmbeddingService
+
+
+class FakeModel:
+    """embed_many that records its batches and can be held until released."""
+
+    def __init__(self, fail_on=None):
+        self.batches = []
+        self.fail_on = fail_on
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def hold(self):
+        self.gate.clear()
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        self.started.set()
+        self.gate.wait(5)
+        if self.fail_on is not None and self.fail_on in texts:
+            raise RuntimeError("model failed")
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+def blocked_batcher(model, **kwargs):
+    """A batcher whose first batch ("first") is in progress until model.gate is set."""
+    model.hold()
+    batcher = EmbeddingBatcher(model, **kwargs)
+    first = batcher.submit("first")
+    assert model.started.wait(5)
+    return batcher, first
+
+
+def test_max_batch_must_be_positive():
+    with pytest.raises(ValueError):
+        EmbeddingBatcher(FakeModel(), max_batch=0)
+
+
+def test_lone_query_is_not_held_for_the_window():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(model, max_batch=8, window_ms=2000)
+    started = time.perf_counter()
+    vector = batcher.embed("hello")
+    assert time.perf_counter() - started < 1
+    assert vector.dtype == np.float32 and vector.tolist() == [5.0, 1.0]
+    assert model.batches == [["hello"]]
+    batcher.close()
+
+
+def test_queries_waiting_behind_a_batch_are_embedded_together_up_to_max_batch():
+    model = FakeModel()
+    batcher, first = blocked_batcher(model, max_batch=4, window_ms=0)
+    futures = [batcher.submit(f"q{i}") for i in range(10)]
+    model.gate.set()
+    assert first.result(5).tolist() == [5.0, 1.0]
+    assert [f.result(5).tolist() for f in futures] == [[float(len(f"q{i}")), 1.0] for i in range(10)]
+    assert [len(b) for b in model.batches] == [1, 4, 4, 2]
+    batcher.close()
+
+
+def test_duplicate_texts_in_a_batch_are_embedded_once():
+    model = FakeModel()
+    batcher, _ = blocked_batcher(model, max_batch=8, window_ms=0)
+    futures = [batcher.submit(t) for t in ("a", "b", "a", "a")]
+    model.gate.set()
+    assert [f.result(5).tolist()[0] for f in futures] == [1.0, 1.0, 1.0, 1.0]
+    assert model.batches[1] == ["a", "b"]
+    batcher.close()
+
+
+def test_failure_reaches_every_caller_of_the_batch_and_later_batches_still_run():
+    model = FakeModel(fail_on="bad")
+    batcher, first = blocked_batcher(model, max_batch=8, window_ms=0)
+    failing = [batcher.submit("bad"), batcher.submit("other")]
+    model.gate.set()
+    first.result(5)
+    for future in failing:
+        with pytest.raises(RuntimeError, match="model failed"):
+            future.result(5)
+    assert batcher.embed("fine").tolist() == [4.0, 1.0]
+    batcher.close()
+
+
+def test_cancelled_futures_are_not_embedded():
+    model = FakeModel()
+    batcher, _ = blocked_batcher(model, max_batch=8, window_ms=0)
+    gone, kept = batcher.submit("gone"), batcher.submit("kept")
+    assert gone.cancel()
+    model.gate.set()
+    assert kept.result(5).tolist() == [4.0, 1.0]
+    assert model.batches[1] == ["kept"]
+    batcher.close()
+
+
+def test_close_embeds_what_is_queued_then_refuses_new_work():
+    model = FakeModel()
+    batcher, first = blocked_batcher(model, max_batch=2, window_ms=1000)
+    queued = [batcher.submit(f"q{i}") for i in range(5)]
+    closer = threading.Thread(target=batcher.close)
+    closer.start()
+    model.gate.set()
+    closer.join(5)
+    assert not closer.is_alive()
+    assert first.done() and all(f.done() for f in queued)
+    assert sorted(t for b in model.batches for t in b) == sorted(["first"] + [f"q{i}" for i in range(5)])
+    with pytest.raises(RuntimeError):
+        batcher.submit("late")
+
+
+def test_awaited_queries_share_batches_beyond_the_thread_pool_and_duplicates_wait_together():
+    model = FakeModel()
+    service = EmbeddingService(cache_dtype="float32", batch_max_size=64, batch_window_ms=0)
+    service._model = SimpleNamespace(embed_documents=model)
+    model.hold()
+
+    async def scenario():
+        first = asyncio.ensure_future(service.avector("first"))
+        while not model.started.is_set():
+            await asyncio.sleep(0.001)
+        rest = [asyncio.ensure_future(service.avector(f"q{i % 40}")) for i in range(80)]
+        await asyncio.sleep(0.01)
+        queued = len(service.batcher._queue)
+        model.gate.set()
+        return queued, await first, await asyncio.gather(*rest)
+
+    queued, first, rest = asyncio.run(scenario())
+    assert queued == 40  # one batcher entry per distinct text
+    assert first.tolist() == [5.0, 1.0]
+    assert [v.tolist()[0] for v in rest] == [float(len(f"q{i % 40}")) for i in range(80)]
+    assert [len(b) for b in model.batches] == [1, 40]
+    assert service.vector("q7").tolist() == [2.0, 1.0] and len(model.batches) == 2  # cached
+    service.batcher.close()
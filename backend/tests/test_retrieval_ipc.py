@@ -0,0 +1,221 @@
+import asyncio
+import os
+import signal
+import socket
+import tempfile
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.adapters.rag.remote_retriever import RemoteRetriever
+from app.domain.ports import RetrievedChunk
+from app.services.rag import retrieval_ipc, retrieval_server
+from app.services.rag.retrieval_ipc import (
+    HEADER,
+    ProtocolError,
+    RemoteRetrievalError,
+    RetrievalClient,
+    encode_frame,
+    read_frame,
+    recv_frame,
+)
+from app.services.rag.retrieval_server import RetrievalServer, serve
+from app.services.rag.warmup import WarmupState, warm_up
+
+
+class FakeRetriever:
+    def topk_chunks(self, query, k=None):
+        if query == "boom":
+            raise RuntimeError("index unavailable")
+        return [
+            RetrievedChunk(id=f"{query}:{i}", text=f"{query} chunk {i}", metadata={"page": i}, score=1.0 / (i + 1))
+            for i in range(k or 2)
+        ]
+
+    def topk_many(self, queries, k=None):
+        return [self.topk_chunks(q, k) for q in queries]
+
+
+class FakeEmbedder:
+    model_name = "fake-embedder"
+
+    @staticmethod
+    def _vec(text):
+        return np.array([len(text), text.count(" "), 1.0], dtype=np.float32)
+
+    def vector(self, text):
+        return self._vec(text)
+
+    async def avector(self, text):
+        return self._vec(text)
+
+    def vectors(self, texts):
+        return np.stack([self._vec(t) for t in texts])
+
+    def embed_documents(self, texts):
+        return [self._vec(t).tolist() for t in texts]
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to ~100 bytes; pytest's tmp_path can be longer
+    with tempfile.TemporaryDirectory(prefix="ipc") as tmp:
+        yield os.path.join(tmp, "retrieval.sock")
+
+
+@pytest.fixture(autouse=True)
+def index(monkeypatch):
+    holder = SimpleNamespace(store=None, version="v1")
+    monkeypatch.setattr(retrieval_server, "vs_holder", holder)
+    return holder
+
+
+@asynccontextmanager
+async def running(path):
+    """serve() on path until the block exits, then stop it the way the CLI does (SIGTERM)."""
+    handler = signal.getsignal(signal.SIGTERM)
+    task = asyncio.create_task(serve(RetrievalServer(FakeRetriever(), FakeEmbedder()), path))
+    while signal.getsignal(signal.SIGTERM) is handler:  # listening and ready to be stopped
+        assert not task.done(), task.exception()
+        await asyncio.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(task, 5)
+    assert not os.path.exists(path)
+
+
+def test_round_trips_through_the_remote_retriever(socket_path):
+    async def scenario():
+        remote = RemoteRetriever(k=2, client=RetrievalClient(socket_path, pool_size=2, timeout=5))
+        async with running(socket_path):
+            chunks = await asyncio.to_thread(remote.topk_chunks, "licence", 3)
+            many = await asyncio.to_thread(remote.topk_many, ["a", "b c"])
+            vector = await asyncio.to_thread(remote.vector, "hello world")
+            documents = await asyncio.to_thread(remote.embed_documents, ["x", "y z"])
+            info = await asyncio.to_thread(remote.client.call, "info")
+        remote.client.close()
+        return chunks, many, vector, documents, info
+
+    chunks, many, vector, documents, info = asyncio.run(scenario())
+    assert chunks == FakeRetriever().topk_chunks("licence", 3)
+    assert many == FakeRetriever().topk_many(["a", "b c"], 2)
+    assert vector.dtype == np.float32 and vector.tolist() == [11.0, 1.0, 1.0]
+    assert documents == [[1.0, 0.0, 1.0], [3.0, 1.0, 1.0]]
+    assert info["retriever"] == "FakeRetriever" and info["embed_model"] == "fake-embedder"
+    assert info["requests"] == 5
+
+
+def test_warm_up_learns_the_index_version_through_the_workers_client(socket_path):
+    async def scenario():
+        remote = RemoteRetriever(client=RetrievalClient(socket_path, timeout=5))
+        before = remote.index_version()
+        state = WarmupState()
+        async with running(socket_path):
+            await asyncio.to_thread(warm_up, state, True, remote.client)
+        remote.client.close()
+        return before, state, remote.index_version()
+
+    before, state, after = asyncio.run(scenario())
+    assert before is None
+    assert state.ready and "retrieval_server" in state.steps
+    assert after == "v1"
+
+
+def test_failures_and_unknown_ops_raise_remote_retrieval_error(socket_path):
+    async def scenario():
+        client = RetrievalClient(socket_path, pool_size=1, timeout=5)
+        errors = []
+        async with running(socket_path):
+            for op, args in (("topk_chunks", {"query": "boom"}), ("rebuild", {})):
+                try:
+                    await asyncio.to_thread(client.call, op, **args)
+                except RemoteRetrievalError as e:
+                    errors.append(str(e))
+            # The connection survives a failed request
+            chunks = await asyncio.to_thread(client.call, "topk_chunks", query="ok", k=1)
+        client.close()
+        return errors, chunks
+
+    errors, chunks = asyncio.run(scenario())
+    assert errors == ["RuntimeError: index unavailable", "ValueError: Unknown op 'rebuild'"]
+    assert [c["id"] for c in chunks] == ["ok:0"]
+
+
+def test_oversized_frames_are_refused(socket_path, monkeypatch):
+    monkeypatch.setattr(retrieval_ipc, "MAX_FRAME_BYTES", 1024)
+
+    def announce_oversized_frame():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(5)
+            sock.connect(socket_path)
+            sock.sendall(HEADER.pack(1 << 30))
+            return sock.recv(1)  # b"" once the server drops the connection
+
+    async def scenario():
+        client = RetrievalClient(socket_path, pool_size=1, timeout=5)
+        async with running(socket_path):
+            with pytest.raises(ProtocolError):  # never sent
+                await asyncio.to_thread(client.call, "embed", texts=["x" * 2000], query=False)
+            dropped = await asyncio.to_thread(announce_oversized_frame)
+            # A response over the limit closes the connection instead of sending a bad frame
+            with pytest.raises(ConnectionError):
+                await asyncio.to_thread(client.call, "topk_chunks", query="q", k=20)
+            chunks = await asyncio.to_thread(client.call, "topk_chunks", query="q", k=1)
+        client.close()
+        return dropped, chunks
+
+    dropped, chunks = asyncio.run(scenario())
+    assert dropped == b""
+    assert len(chunks) == 1
+
+
+def test_pooled_connection_reconnects_once_after_a_server_restart(socket_path):
+    async def scenario():
+        client = RetrievalClient(socket_path, pool_size=1, timeout=5)
+        async with running(socket_path):
+            await asyncio.to_thread(client.call, "info")
+        pooled = client._idle[0]
+        async with running(socket_path):
+            info = await asyncio.to_thread(client.call, "info")
+        replaced = client._idle[0] is not pooled
+        client.close()
+        return info, replaced
+
+    info, replaced = asyncio.run(scenario())
+    assert info["requests"] == 1  # answered by the new server
+    assert replaced
+
+
+def test_fresh_connection_is_not_retried(socket_path):
+    client = RetrievalClient(socket_path, timeout=1)
+    with pytest.raises(OSError):
+        client.call("info")
+
+
+def test_frames_round_trip_and_eof_is_reported():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(encode_frame({"op": "embed", "texts": ["é"]}) + encode_frame({"op": "info"}))
+        assert recv_frame(right) == {"op": "embed", "texts": ["é"]}
+        assert recv_frame(right) == {"op": "info"}
+        left.close()
+        with pytest.raises(ConnectionError):
+            recv_frame(right)
+
+
+def test_read_frame_tells_clean_eof_from_truncation_and_garbage():
+    async def read(data):
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_frame(reader)
+
+    assert asyncio.run(read(encode_frame({"ok": True}))) == {"ok": True}
+    assert asyncio.run(read(b"")) is None
+    for data in (b"\x00\x00", HEADER.pack(2) + b"[]", HEADER.pack(3) + b"{x}"):
+        with pytest.raises(ProtocolError):
+            asyncio.run(read(data))
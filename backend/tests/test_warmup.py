@@ -0,0 +1,40 @@
+import asyncio
+
+from app.core.config import settings
+from app.services.rag import warmup
+from app.services.rag.warmup import WarmupState, start_warmup
+
+
+def test_failed_warm_up_is_retried_with_backoff_until_ready(monkeypatch):
+    outcomes = ["failed", "failed", "failed", "ready"]
+
+    def fake_warm_up(state, remote=None, client=None):
+        state.attempts += 1
+        state.status = outcomes.pop(0)
+
+    delays = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(seconds):
+        delays.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(warmup, "warm_up", fake_warm_up)
+    monkeypatch.setattr(warmup.asyncio, "sleep", fake_sleep)
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(settings, "WARMUP_RETRY_MAX_SECONDS", 3.0)
+
+    async def scenario():
+        state = WarmupState()
+        await asyncio.wait_for(start_warmup(state), 5)
+        return state
+
+    state = asyncio.run(scenario())
+    assert state.ready and state.attempts == 4
+    assert delays == [1.0, 2.0, 3.0]
+
+
+def test_disabled_warm_up_is_ready_at_once(monkeypatch):
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", False)
+    state = WarmupState()
+    assert start_warmup(state) is None and state.ready